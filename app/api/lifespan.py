@@ -0,0 +1,44 @@
+"""
+Startup and shutdown of the process-local components of the cloud API.
+"""
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from app.core.config import BACKGROUND_TASK_SHUTDOWN_TIMEOUT_S, LOCAL_INFERENCE, LOCAL_INFERENCE_MODEL_LOADER, DEVICE_REGISTRY, LOOP_MONITOR
+from app.core.local_inference import local_inference_engine
+from app.core.tasks import background_tasks
+from app.core.journal import ingest_journal, create_ingest_journal_replayer
+from app.core.lanes import upstream_lanes
+from app.core.channels import gateway_channels
+from app.core.diagnostics import loop_monitor
+from app.api.utils import prediction_batcher, replay_ingest_records, device_registry, command_outbox
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if LOOP_MONITOR:
+        loop_monitor.start()
+    background_tasks.start()
+    if LOCAL_INFERENCE and LOCAL_INFERENCE_MODEL_LOADER == "stand-in":
+        local_inference_engine.load(b"")  # the stand-in model needs no upload
+    if LOCAL_INFERENCE:
+        await local_inference_engine.start()
+    if ingest_journal is not None:
+        ingest_journal.open()
+        app.state.journal_replayer = create_ingest_journal_replayer(replay_ingest_records)
+        app.state.journal_replayer.start()
+    if DEVICE_REGISTRY:
+        await device_registry.load()
+        device_registry.start()
+    yield
+    await gateway_channels.close()
+    await device_registry.stop()
+    await command_outbox.shutdown()
+    await prediction_batcher.shutdown()
+    await background_tasks.shutdown(timeout=BACKGROUND_TASK_SHUTDOWN_TIMEOUT_S)
+    local_inference_engine.shutdown()
+    if ingest_journal is not None:
+        await app.state.journal_replayer.stop()
+        ingest_journal.close()
+    await upstream_lanes.close()
+    await loop_monitor.stop()
@@ -0,0 +1,179 @@
+"""
+Administrative routes of the cloud API.
+"""
+
+import asyncio
+import threading
+from fastapi import APIRouter, Depends, Query, Request, status, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.core.tasks import background_tasks
+from app.api.utils import prediction_batcher, device_registry, export_admission, command_outbox
+from app.core.config import (
+    DEVICE_REGISTRY,
+    EXPORT_RATE_LIMIT,
+    EXPORT_RATE_LIMIT_KEY,
+    COMMAND_OUTBOX,
+    LOOP_MONITOR,
+    SAMPLING_PROFILER,
+    SAMPLING_PROFILER_MAX_SECONDS,
+)
+from app.core.idempotency import export_idempotency
+from app.core.journal import ingest_journal
+from app.core.lanes import upstream_lanes, use_lane
+from app.core.features import inference_gate
+from app.core.channels import gateway_channels
+from app.core.etags import entity_cache
+from app.core.diagnostics import loop_monitor, sampling_profiler
+
+admin_router = APIRouter(prefix="/admin", tags=["Admin Routes"], dependencies=[Depends(use_lane("command"))])
+
+# ----------------- Background Tasks ----------------- #
+
+@admin_router.get("/tasks")
+async def get_background_task_stats():
+    return background_tasks.stats
+
+@admin_router.get("/tasks/dead-letter")
+async def get_dead_letter_tasks():
+    return background_tasks.dead_letters
+
+@admin_router.delete("/tasks/dead-letter")
+async def clear_dead_letter_tasks():
+    return {"cleared": background_tasks.clear_dead_letters()}
+
+# ----------------- Upstream Lanes ----------------- #
+
+@admin_router.get("/upstream/lanes")
+async def get_upstream_lane_stats():
+    return upstream_lanes.stats
+
+# ----------------- Inference Batching ----------------- #
+
+@admin_router.get("/inference/batching")
+async def get_inference_batching_stats():
+    return prediction_batcher.stats
+
+@admin_router.get("/inference/gate")
+async def get_inference_gate_stats():
+    return inference_gate.stats
+
+# ----------------- Export Idempotency ----------------- #
+
+@admin_router.get("/export/idempotency")
+async def get_export_idempotency_stats():
+    return export_idempotency.stats
+
+@admin_router.get("/export/rate-limit")
+async def get_export_rate_limit_stats():
+    return {"enabled": EXPORT_RATE_LIMIT, "key": EXPORT_RATE_LIMIT_KEY, **export_admission.stats}
+
+# ----------------- Ingest Journal ----------------- #
+
+@admin_router.get("/ingest/journal")
+async def get_ingest_journal_stats(request: Request):
+    if ingest_journal is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ingest journal is disabled")
+
+    return {
+        **ingest_journal.stats,
+        "replayer": request.app.state.journal_replayer.stats,
+    }
+
+@admin_router.get("/ingest/journal/dead-letter")
+async def get_ingest_journal_dead_letters(request: Request):
+    if ingest_journal is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ingest journal is disabled")
+
+    return request.app.state.journal_replayer.dead_letters
+
+# ----------------- Command Outbox ----------------- #
+
+@admin_router.get("/commands/outbox")
+async def get_command_outbox_stats():
+    return {"enabled": COMMAND_OUTBOX, **command_outbox.stats}
+
+@admin_router.get("/commands/outbox/dead-letter")
+async def get_command_outbox_dead_letters():
+    return command_outbox.dead_letters
+
+# ----------------- Entity Cache ----------------- #
+
+@admin_router.get("/cache/entities")
+async def get_entity_cache_stats():
+    return entity_cache.stats
+
+@admin_router.delete("/cache/entities")
+async def clear_entity_cache():
+    entity_cache.clear()
+    return entity_cache.stats
+
+# ----------------- Gateway Channels ----------------- #
+
+@admin_router.get("/channels")
+async def get_gateway_channel_stats():
+    return gateway_channels.stats
+
+@admin_router.post("/channels/{gateway_name}/command")
+async def push_gateway_channel_command(gateway_name: str, command: dict):
+    seq = await gateway_channels.push(gateway_name, "command", command)
+    if seq is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Gateway has no channel session")
+
+    return {"seq": seq}
+
+# ----------------- Device Registry ----------------- #
+
+def _check_device_registry():
+    if not DEVICE_REGISTRY:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device registry is disabled")
+
+@admin_router.get("/registry")
+async def get_device_registry_stats():
+    _check_device_registry()
+    return device_registry.stats
+
+@admin_router.get("/registry/consistency")
+async def check_device_registry_consistency():
+    _check_device_registry()
+    return await device_registry.check_consistency()
+
+@admin_router.post("/registry/sync")
+async def sync_device_registry():
+    _check_device_registry()
+    await device_registry.sync(full=True)
+    return device_registry.stats
+
+# ----------------- Event-Loop Diagnostics ----------------- #
+
+@admin_router.get("/diagnostics/loop")
+async def get_event_loop_stats():
+    if not LOOP_MONITOR:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Loop monitor is disabled")
+    return loop_monitor.stats
+
+@admin_router.get("/diagnostics/slow-callbacks")
+async def get_slow_callbacks():
+    if not LOOP_MONITOR:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Loop monitor is disabled")
+    return loop_monitor.slow_callbacks
+
+@admin_router.get("/diagnostics/profile", response_class=PlainTextResponse)
+async def profile_event_loop(
+    seconds: float = Query(5, gt=0, le=SAMPLING_PROFILER_MAX_SECONDS),
+    interval_ms: float = Query(5, gt=0),
+    all_threads: bool = False,
+):
+    """
+    Samples the event loop thread (or every thread) for `seconds` and returns the
+    collapsed stacks, e.g. for flamegraph.pl or speedscope.
+    """
+    if not SAMPLING_PROFILER:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sampling profiler is disabled")
+
+    # Route handlers run on the event loop thread
+    thread_id = None if all_threads else threading.get_ident()
+    try:
+        stacks = await asyncio.to_thread(sampling_profiler.sample, seconds, interval_ms, thread_id)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+    return PlainTextResponse(stacks)
@@ -2,20 +2,34 @@
 Routes for the Application layer of the PdM-ESN System.
 """
 
-from fastapi import APIRouter, UploadFile, File, status, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, UploadFile, File, Query, Request, Response, status, HTTPException
 from app.api.schemas.data_ms import data as data_schemas
 from app.api.schemas.inference_ms import inference as inf_schemas
 from app.api.schemas.command_ms import gateway_cmd as gw_cmd_schemas
 from app.api.schemas.command_ms import sensor_cmd as s_cmd_schemas
 from app.api import utils
-
-application_router = APIRouter(tags=["Application Routes"])
+from app.core.config import LOCAL_INFERENCE, AGGREGATES, COMMAND_OUTBOX, ENTITY_CACHE_CONTROL
+from app.core.local_inference import local_inference_engine
+from app.core.last_known import sensor_properties
+from app.core.lanes import use_lane
+from app.core.aggregates import sensor_aggregates
+from app.core.codecs import decode_values
+from app.core.etags import entity_cache, etag_matches
+from app.core.channels import gateway_channels
+
+# Operator routes: upstream calls use the dedicated command lane
+application_router = APIRouter(tags=["Application Routes"], dependencies=[Depends(use_lane("command"))])
 
 # ----------------- Inference Microservice Routes ----------------- #
 
 @application_router.post("/model", status_code=status.HTTP_202_ACCEPTED)
 async def upload_model(tf_model_file: UploadFile = File(...)):
     tf_model = await utils.serialize_model_file(tf_model_file)
+    if LOCAL_INFERENCE:
+        await local_inference_engine.load_payload(tf_model["tf_model_b64"])
+        return {"message": "Model loaded by the local inference engine"}
+
     response = await utils.set_cloud_model(
         inf_schemas.CloudModel(**tf_model)
     )
@@ -26,41 +40,113 @@ async def upload_model(tf_model_file: UploadFile = File(...)):
 
 # ----------------- Data Microservice Routes ----------------- #
 
+# Gateway and sensor reads are served from the entity cache with an ETag: a
+# matching If-None-Match gets a 304, and neither calls the data ms on a hit.
+async def _conditional_read(request: Request, key: tuple, read) -> Response:
+    entry = entity_cache.get(key)
+    if entry is None:
+        response = await read()
+        if response.status_code != status.HTTP_200_OK:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+        entry = entity_cache.put(key, response.content)
+
+    headers = {"ETag": entry.etag, "Cache-Control": ENTITY_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        entity_cache.count_not_modified()
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+def _invalidate_devices(gateway_name: str, sensor_names: list[str] = ()):
+    entity_cache.invalidate(("sensors", gateway_name), *(("sensor", gateway_name, name) for name in sensor_names))
+
 @application_router.post("/gateway/register")
 async def register_gateway(gateway: data_schemas.CreateEdgeGateway):
     response = await utils.create_edge_gateway(gateway)
     if response.status_code != status.HTTP_201_CREATED:
         raise HTTPException(status_code=response.status_code, detail=response.json())
+    utils.device_registry.put_gateway(gateway)
+    entity_cache.invalidate(("gateway", gateway.device_name))
+    _invalidate_devices(gateway.device_name)
     
     return {"message": "Gateway registered successfully"}
 
 @application_router.get("/gateway/{gateway_name}")
-async def get_gateway(gateway_name: str):
-    response = await utils.read_edge_gateway(gateway_name)
-    if response.status_code != status.HTTP_200_OK:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
-    
-    return response.json() 
+async def get_gateway(gateway_name: str, request: Request):
+    return await _conditional_read(request, ("gateway", gateway_name), lambda: utils.read_edge_gateway(gateway_name))
 
 @application_router.get("/gateway/{gateway_name}/sensor")
-async def get_sensors(gateway_name: str):
-    response = await utils.read_edge_gateway(gateway_name)
-    if response.status_code != status.HTTP_200_OK:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
+async def get_sensors(gateway_name: str, request: Request):
+    await utils.lookup_edge_gateway(gateway_name)
+
+    return await _conditional_read(request, ("sensors", gateway_name), lambda: utils.read_edge_sensors(gateway_name))
+
+@application_router.get("/gateway/{gateway_name}/sensor/{sensor_name}")
+async def get_sensor(gateway_name: str, sensor_name: str, request: Request):
+    return await _conditional_read(
+        request, ("sensor", gateway_name, sensor_name), lambda: utils.read_edge_sensor(gateway_name, sensor_name)
+    )
 
-    response = await utils.read_edge_sensors(gateway_name)
+@application_router.get("/gateway/{gateway_name}/sensor/{sensor_name}/readings")
+async def get_sensor_readings(gateway_name: str, sensor_name: str):
+    response = await utils.read_sensor_readings(gateway_name, sensor_name)
     if response.status_code != status.HTTP_200_OK:
         raise HTTPException(status_code=response.status_code, detail=response.json())
-    
-    return response.json()
 
-@application_router.get("/gateway/{gateway_name}/sensor/{sensor_name}")
-async def get_sensor(gateway_name: str, sensor_name: str):
-    response = await utils.read_edge_sensor(gateway_name, sensor_name)
+    return [{**reading, "values": decode_values(reading["values"])} for reading in response.json()]
+
+@application_router.get("/gateway/{gateway_name}/sensor/{sensor_name}/reading/{reading_uuid}")
+async def get_sensor_reading(gateway_name: str, sensor_name: str, reading_uuid: str):
+    response = await utils.read_sensor_reading(gateway_name, sensor_name, reading_uuid)
     if response.status_code != status.HTTP_200_OK:
         raise HTTPException(status_code=response.status_code, detail=response.json())
-    
-    return response.json()
+
+    reading = response.json()
+    return {**reading, "values": decode_values(reading["values"])}
+
+@application_router.get("/gateway/{gateway_name}/sensor/{sensor_name}/aggregates")
+async def get_sensor_aggregates(gateway_name: str, sensor_name: str, window_s: Optional[int] = None):
+    """
+    Per-channel count, min, max, mean and RMS of the sensor's readings and its
+    prediction class counts over the rolling windows, computed at ingest time.
+    """
+    if not AGGREGATES:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Aggregates are disabled")
+    windows = [window for window, _ in sensor_aggregates.windows]
+    if window_s is not None and window_s not in windows:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid window, must be one of: {windows}")
+
+    await utils.lookup_edge_sensor(gateway_name, sensor_name)
+    return {
+        "gateway_name": gateway_name,
+        "sensor_name": sensor_name,
+        "windows": sensor_aggregates.query(gateway_name, sensor_name, window_s),
+    }
+
+@application_router.get("/gateway/{gateway_name}/sensor/{sensor_name}/last-known")
+async def get_sensor_last_known_values(gateway_name: str, sensor_name: str, max_age_s: Optional[float] = Query(None, gt=0)):
+    """
+    Last-known state, inference layer and config of the sensor, with their age
+    and source. With `max_age_s`, missing or older properties are refreshed
+    with GET commands; their command uuids are returned in `refresh`.
+    """
+    await utils.lookup_edge_sensor(gateway_name, sensor_name)
+    properties = sensor_properties.describe(gateway_name, sensor_name)
+
+    refresh = {}
+    if max_age_s is not None:
+        stale = [
+            name for name in utils.SENSOR_PROPERTY_COMMANDS
+            if name not in properties or properties[name]["age_s"] > max_age_s
+        ]
+        if stale:
+            refresh = await utils.request_sensor_properties(gateway_name, sensor_name, stale)
+
+    return {
+        "gateway_name": gateway_name,
+        "sensor_name": sensor_name,
+        "properties": properties,
+        "refresh": refresh,
+    }
 
 # ----------------- Command Microservice Routes ----------------- #
 
@@ -74,10 +160,7 @@ async def get_available_sensors(gateway_name: str):
     if response.status_code != status.HTTP_202_ACCEPTED:
         raise HTTPException(status_code=response.status_code, detail=response.json())
     
-    return [
-        gw_cmd_schemas.BLEDevice(**device)
-        for device in response.json()
-    ]
+    return gw_cmd_schemas.BLEDeviceList.validate_json(response.content)
 
 @application_router.post("/gateway/command/get/provisioned-sensors")
 async def get_provisioned_sensors(gateway_name: str) -> list[gw_cmd_schemas.BLEDevice]:
@@ -88,10 +171,7 @@ async def get_provisioned_sensors(gateway_name: str) -> list[gw_cmd_schemas.BLED
     if response.status_code != status.HTTP_202_ACCEPTED:
         raise HTTPException(status_code=response.status_code, detail=response.json())
     
-    return [
-        gw_cmd_schemas.BLEDevice(**device)
-        for device in response.json()
-    ]
+    return gw_cmd_schemas.BLEDeviceList.validate_json(response.content)
 
 @application_router.post("/gateway/command/add/provisioned-sensors")
 async def add_provisioned_sensors(gateway_name: str, devices: list[gw_cmd_schemas.BLEDeviceWithPoP]):
@@ -132,6 +212,8 @@ async def add_registered_sensors(gateway_name: str, sensors: list[gw_cmd_schemas
         response = await utils.create_edge_sensor(gateway_name, sensor)
         if response.status_code != status.HTTP_201_CREATED:
             raise HTTPException(status_code=response.status_code, detail=response.json())
+        utils.device_registry.put_sensor(gateway_name, sensor)
+    _invalidate_devices(gateway_name, [sensor.device_name for sensor in sensors])
     
     gateway_api = await utils.get_gateway_api(gateway_name)
     command = gw_cmd_schemas.AddRegisteredSensors(
@@ -148,14 +230,18 @@ async def add_registered_sensors(gateway_name: str, sensors: list[gw_cmd_schemas
     }
 
 # Sensor Commands
+# SET commands are sent right away (down the gateway channel if the gateway is
+# connected), or coalesced and paced by the command outbox if enabled
+def _set_command_message(command: str, gateway_name: str) -> dict:
+    if COMMAND_OUTBOX:
+        return {"message": f"{command} Command queued in the command outbox"}
+    if gateway_channels.connected(gateway_name):
+        return {"message": f"{command} Command sent down the gateway channel"}
+    return {"message": f"{command} Command sent to Command Microservice for processing"}
+
 @application_router.post("/sensor/command/set/sensor-state/{state}")
 async def set_sensor_state(gateway_name: str, sensors: list[str], state: s_cmd_schemas.SensorState):
-    gateway_api_with_sensors = await utils.get_gateway_api_with_sensors(gateway_name, sensors)
-    command = s_cmd_schemas.SetSensorState(
-        target=gateway_api_with_sensors,
-        property_value=state,
-    )
-
+    await utils.get_gateway_api_with_sensors(gateway_name, sensors)
     for sensor_name in sensors:
         response = await utils.update_edge_sensor(
             gateway_name=gateway_name,
@@ -167,15 +253,11 @@ async def set_sensor_state(gateway_name: str, sensors: list[str], state: s_cmd_s
         )
         if response.status_code != status.HTTP_200_OK:
             raise HTTPException(status_code=response.status_code, detail=response.json())
+        utils.record_sensor_properties(gateway_name, sensor_name, "command", state=state)
+    _invalidate_devices(gateway_name, sensors)
 
-
-    response = await utils.set_sensor_state(command)
-    if response.status_code != status.HTTP_202_ACCEPTED:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
-    
-    return {
-        "message": "SET Sensor State Command sent to Command Microservice for processing",
-    }
+    await utils.send_set_command(gateway_name, "sensor-state", sensors, state)
+    return _set_command_message("SET Sensor State", gateway_name)
 
 @application_router.post("/sensor/command/get/sensor-state")
 async def command_get_sensor_state(gateway_name: str, sensors: list[str]):
@@ -209,18 +291,10 @@ async def set_sensor_inference_layer(gateway_name: str, sensors: list[str], laye
     if layer not in inference_layers:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid layer, must be one of: cloud, gateway, sensor")
     
-    gateway_api_with_sensors = await utils.get_gateway_api_with_sensors(gateway_name, sensors)
-    command = s_cmd_schemas.SetInferenceLayer(
-        target=gateway_api_with_sensors,
-        property_value=layer,
-    )
-    response = await utils.set_inference_layer(command)
-    if response.status_code != status.HTTP_202_ACCEPTED:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
-    
-    return {
-        "message": "SET Sensor Inference Layer Command sent to Command Microservice for processing",
-    }
+    # The layer isn't stored in the data ms: it is recorded (and the cached devices
+    # invalidated) once the command is dispatched
+    await utils.send_set_command(gateway_name, "inference-layer", sensors, layer)
+    return _set_command_message("SET Sensor Inference Layer", gateway_name)
 
 @application_router.post("/sensor/command/get/inference-layer")
 async def command_get_sensor_inference_layer(gateway_name: str, sensors: list[str]):
@@ -246,26 +320,18 @@ async def response_get_sensor_inference_layer(command_uuids: list[str]):
 
 @application_router.post("/sensor/command/set/sensor-config")
 async def set_sensor_config(gateway_name: str, sensors: list[str], config: s_cmd_schemas.SensorConfig):
-    gateway_api_with_sensors = await utils.get_gateway_api_with_sensors(gateway_name, sensors)
-    command = s_cmd_schemas.SetSensorConfig(
-        target=gateway_api_with_sensors,
-        property_value=config,
-    )
-
+    await utils.get_gateway_api_with_sensors(gateway_name, sensors)
     for sensor_name in sensors:
         response = await utils.create_or_update_sensor_config(
             gateway_name, sensor_name, config
         )
         if response.status_code != status.HTTP_201_CREATED:
             raise HTTPException(status_code=response.status_code, detail=response.json())
+        utils.record_sensor_properties(gateway_name, sensor_name, "command", config=config)
+    _invalidate_devices(gateway_name, sensors)
     
-    response = await utils.set_sensor_config(command)
-    if response.status_code != status.HTTP_202_ACCEPTED:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
-    
-    return {
-        "message": "SET Sensor Config Command sent to Command Microservice for processing",
-    }
+    await utils.send_set_command(gateway_name, "sensor-config", sensors, config)
+    return _set_command_message("SET Sensor Config", gateway_name)
 
 @application_router.post("/sensor/command/get/sensor-config")
 async def command_get_sensor_config(gateway_name: str, sensors: list[str]):
@@ -0,0 +1,78 @@
+"""
+Fleet-wide sensor queries, answered from the in-memory device registry.
+
+The registry only knows what this worker has seen: state and inference layer
+come from the commands and command responses it handled, last-seen time and
+low battery from the exports it ingested.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import APIRouter, Query, status, HTTPException
+from app.core.config import DEVICE_REGISTRY
+from app.api.schemas.cloud_api import fleet as fleet_schemas
+from app.api.schemas.common import InferenceLayer, SensorState
+from app.api.utils import device_registry
+
+fleet_router = APIRouter(prefix="/fleet", tags=["Fleet Routes"])
+
+
+def _check_device_registry():
+    if not DEVICE_REGISTRY:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device registry is disabled")
+
+
+def _fleet_sensor(sensor) -> fleet_schemas.FleetSensor:
+    last_seen = None
+    if sensor.last_seen is not None:
+        last_seen = datetime.fromtimestamp(sensor.last_seen, tz=timezone.utc)
+    return fleet_schemas.FleetSensor(
+        gateway_name=sensor.gateway_name,
+        device_name=sensor.device_name,
+        device_address=sensor.device_address,
+        state=sensor.state,
+        inference_layer=sensor.inference_layer,
+        config=sensor.config,
+        low_battery=sensor.low_battery,
+        last_seen=last_seen,
+    )
+
+
+@fleet_router.get("/sensors")
+async def query_sensors(
+    gateway_name: Optional[str] = None,
+    state: Optional[SensorState] = None,
+    inference_layer: Optional[InferenceLayer] = None,
+    low_battery: Optional[bool] = None,
+    seen_within_s: Optional[float] = Query(None, gt=0, description="exported within the last seconds"),
+    silent_for_s: Optional[float] = Query(None, gt=0, description="no export for at least these seconds"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+) -> fleet_schemas.FleetSensorPage:
+    _check_device_registry()
+    now = time.time()
+    sensors = device_registry.query(
+        gateway_name=gateway_name,
+        seen_since=None if seen_within_s is None else now - seen_within_s,
+        not_seen_since=None if silent_for_s is None else now - silent_for_s,
+        state=state,
+        inference_layer=inference_layer,
+        low_battery=low_battery,
+    )
+    return fleet_schemas.FleetSensorPage(
+        total=len(sensors),
+        offset=offset,
+        limit=limit,
+        items=[_fleet_sensor(sensor) for sensor in sensors[offset:offset + limit]],
+    )
+
+
+@fleet_router.get("/summary")
+async def get_fleet_summary() -> fleet_schemas.FleetSummary:
+    _check_device_registry()
+    stats = device_registry.stats
+    return fleet_schemas.FleetSummary(
+        gateways=stats["gateways"],
+        sensors=stats["sensors"],
+        **device_registry.summary(),
+    )
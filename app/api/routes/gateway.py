@@ -2,124 +2,188 @@
 Routes for the Gateway layer of the PdM-ESN system.
 """
 import json
-from fastapi import APIRouter, status, HTTPException
-from app.core.config import CLOUD_INFERENCE_LAYER, LATENCY_BENCHMARK, ADAPTIVE_INFERENCE, POLLING_INTERVAL_MS, SENSOR_INFERENCE_LAYER
+import logging
+import time
+from fastapi import APIRouter, Depends, WebSocket, status, HTTPException
+from pydantic import BaseModel, ValidationError
+from app.core.config import CLOUD_INFERENCE_LAYER, LATENCY_BENCHMARK, ADAPTIVE_INFERENCE, SENSOR_INFERENCE_LAYER, EXPORT_IDEMPOTENCY_TTL_S, EXPORT_RATE_LIMIT, AGGREGATES, READING_FEATURES, GATEWAY_CHANNEL
 from app.api.schemas.cloud_api import gateway as gw_schemas
 from app.api.schemas.data_ms import data as data_schemas
+from app.api.schemas.cloud_api import ingest as ingest_schemas
 from app.api.schemas.command_ms import sensor_resp as s_resp_schemas
 from app.api.schemas.command_ms import sensor_cmd as s_cmd_schemas
+from app.api.schemas import conversions
 from app.api import utils
+from app.core.tasks import background_tasks
+from app.core.idempotency import export_idempotency
+from app.core.journal import ingest_journal, JournalFullError
+from app.core.lanes import DEFAULT_LANE, upstream_lane, use_lane
+from app.core.features import feature_extractor, inference_gate
+from app.core.codecs import reading_codec
+from app.core.channels import gateway_channels, POLICY_VIOLATION
+from pydantic_core import to_json
+
+logger = logging.getLogger(__name__)
 
 gateway_router = APIRouter(tags=["Gateway Routes"])
 
 # --- Command Responses ---
+# Callbacks use their own upstream lane, exports use the default (ingest) lane
+
+_callback_lane = [Depends(use_lane("callback"))]
 
-@gateway_router.post("/store/sensor/response/get/sensor-state", status_code=status.HTTP_202_ACCEPTED)
+@gateway_router.post("/store/sensor/response/get/sensor-state", status_code=status.HTTP_202_ACCEPTED, dependencies=_callback_lane)
 async def store_sensor_state_response(response: s_resp_schemas.SensorStateResponse):
+    metadata, state = response.metadata, response.property_value
     response = await utils.store_sensor_state_response(response)
     if response.status_code != status.HTTP_201_CREATED:
         raise HTTPException(status_code=response.status_code, detail=response.json())
+    utils.record_sensor_properties(metadata.gateway_name, metadata.sender, "response", state=state)
 
-@gateway_router.post("/store/sensor/response/get/inference-layer", status_code=status.HTTP_202_ACCEPTED)
+@gateway_router.post("/store/sensor/response/get/inference-layer", status_code=status.HTTP_202_ACCEPTED, dependencies=_callback_lane)
 async def store_sensor_inference_layer_response(response: s_resp_schemas.InferenceLayerResponse):
+    metadata, layer = response.metadata, response.property_value
     response = await utils.store_sensor_inference_layer_response(response)
     if response.status_code != status.HTTP_201_CREATED:
         raise HTTPException(status_code=response.status_code, detail=response.json())
+    utils.record_sensor_properties(metadata.gateway_name, metadata.sender, "response", inference_layer=layer)
 
-@gateway_router.post("/store/sensor/response/get/sensor-config", status_code=status.HTTP_202_ACCEPTED)
+@gateway_router.post("/store/sensor/response/get/sensor-config", status_code=status.HTTP_202_ACCEPTED, dependencies=_callback_lane)
 async def store_sensor_config_response(response: s_resp_schemas.SensorConfigResponse):
+    metadata, config = response.metadata, response.property_value
     response = await utils.store_sensor_config_response(response)
     if response.status_code != status.HTTP_201_CREATED:
         raise HTTPException(status_code=response.status_code, detail=response.json())
+    utils.record_sensor_properties(metadata.gateway_name, metadata.sender, "response", config=config)
 
 # --- Export Routes ---
 
 @gateway_router.post("/export/sensor-data", status_code=status.HTTP_201_CREATED)
 async def export_sensor_data(sensor_data: gw_schemas.SensorDataExport):
-    print("Recv_timestamp is None", sensor_data.export_value.inference_descriptor.recv_timestamp is None)
-    
+    # Gateways retry exports on timeouts: duplicates of a reading join the
+    # in-flight export or get its outcome instead of exporting it again.
+    # Readings without a gateway-provided uuid can't be recognized as retries.
+    reading = sensor_data.export_value.reading
+    if EXPORT_IDEMPOTENCY_TTL_S <= 0 or "uuid" not in reading.model_fields_set:
+        return await _export_sensor_data(sensor_data)
+
+    key = (sensor_data.metadata.gateway_name, sensor_data.metadata.sensor_name, reading.uuid)
+    return await export_idempotency.run(key, lambda: _export_sensor_data(sensor_data))
+
+async def _export_sensor_data(sensor_data: gw_schemas.SensorDataExport):
+    # A flooding gateway gets 429s instead of starving the others; retries joining
+    # or replaying an export above don't count against its rate
+    if EXPORT_RATE_LIMIT:
+        utils.admit_export(sensor_data.metadata.gateway_name, sensor_data.metadata.sensor_name)
+
+    logger.debug("Recv_timestamp is None: %s", sensor_data.export_value.inference_descriptor.recv_timestamp is None)
+
     # Step 1: Make sure that at least both sensor and gateway exist
     gateway_name, sensor_name = sensor_data.metadata.gateway_name, sensor_data.metadata.sensor_name
-    response = await utils.read_edge_sensor(
-        gateway_name, sensor_name
-    )  # Checks both sensor and gateway, see data microservice.
-    if response.status_code != status.HTTP_200_OK:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
+    await utils.lookup_edge_sensor(gateway_name, sensor_name)  # device registry, falls back to the data ms
+    utils.device_registry.update_sensor(
+        gateway_name, sensor_name, last_seen=time.time(), low_battery=sensor_data.export_value.low_battery
+    )
+    utils.record_sensor_properties(
+        gateway_name, sensor_name, "export", inference_layer=sensor_data.export_value.inference_descriptor.inference_layer
+    )
     
     # Step 2: Handle the prediction if needed
     _inference_descriptor: gw_schemas.InferenceDescriptor = sensor_data.export_value.inference_descriptor
     _inference_layer = _inference_descriptor.inference_layer
+    sensor_reading = sensor_data.export_value.reading
+
+    # Step 2.1: Extract the reading features, for the record and the pre-inference gate
+    features = None
+    if READING_FEATURES == "all" or (
+        _inference_layer == gw_schemas.InferenceLayer.CLOUD and (READING_FEATURES == "cloud" or inference_gate.enabled)
+    ):
+        features = feature_extractor.extract(sensor_reading.values)
+
     if _inference_layer == gw_schemas.InferenceLayer.CLOUD:
-        # Step 2.1: send prediction request to cloud-inference-ms
-        response = await utils.send_prediction_request(sensor_data)
-        if response.status_code != status.HTTP_202_ACCEPTED:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
-        
-        # Step 2.2: poll for prediction result
-        task_id = response.json()["task_id"]
-        prediction_result, heuristic_result = None, None
-        while True:
-            response = await utils.get_prediction_result(task_id)
-            if response.status_code == status.HTTP_200_OK:
-                json_response = response.json()
-                if json_response["status"] == "SUCCESS":
-                    prediction_result = json_response["result"]["prediction_result"]
-                    heuristic_result = json_response["result"]["heuristic_result"]
-                    break
-                elif json_response["status"] == "FAILURE":
-                    raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Prediction task failed.")
-                else:   # status == "PENDING"
-                    await utils.async_sleep(POLLING_INTERVAL_MS)
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
+        # Step 2.2: obviously normal readings get a local prediction from the gate,
+        # the others run on cloud-inference-ms (possibly batched with concurrent
+        # requests) and wait for its result
+        prediction_result = inference_gate.decide(features)
+        heuristic_result = None
+        if prediction_result is None:
+            result = await utils.run_cloud_inference(conversions.to_prediction_request(sensor_data))
+            prediction_result = result["prediction_result"]
+            heuristic_result = result["heuristic_result"]
         
         # Step 2.3: Update sensor data with prediction result
         sensor_data.export_value.inference_descriptor.prediction = prediction_result
-
-        # Step 2.4: Export inference latency benchmark if enabled
-        if LATENCY_BENCHMARK:
-            await utils.send_inference_latency_benchmark_command(sensor_data)
-            
-        # Step 2.5: Handle heuristic result if adaptive inference is enabled.
-        if ADAPTIVE_INFERENCE:
-            await utils.handle_heuristic_result(gateway_name, sensor_name, heuristic_result)
-    
-    # Step 3: Create sensor reading
-    sensor_reading = sensor_data.export_value.reading
-    reading = data_schemas.CreateSensorReading(
-        uuid=sensor_reading.uuid, values=json.dumps(sensor_reading.values)
-    )
-    response = await utils.create_sensor_reading(gateway_name, sensor_name, reading)
-    if response.status_code != status.HTTP_201_CREATED:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
     
-    # Step 4: Create prediction result
-    prediction_result = sensor_data.export_value.inference_descriptor.prediction
-    data_prediction_result = data_schemas.PredictionResult(
-        prediction=prediction_result,
-        inference_layer=_inference_layer
+    # Step 3: Build the ingest record: sensor reading (and its features), prediction
+    # result and, if SENSOR_INFERENCE_LAYER, the inference latency benchmark
+    record = ingest_schemas.IngestRecord(
+        gateway_name=gateway_name,
+        sensor_name=sensor_name,
+        reading=data_schemas.CreateSensorReading(
+            uuid=sensor_reading.uuid,
+            values=reading_codec.encode(sensor_reading.values),
+            features=None if features is None else json.dumps(features),
+        ),
+        prediction_result=data_schemas.PredictionResult(
+            prediction=sensor_data.export_value.inference_descriptor.prediction,
+            inference_layer=_inference_layer
+        ),
     )
-    response = await utils.create_prediction_result(gateway_name, sensor_name, sensor_reading.uuid, data_prediction_result)
-    if response.status_code != status.HTTP_201_CREATED:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
-    
-    # Step 5: Create Inference Latency Benchmark entry in data ms if SENSOR_INFERENCE_LAYER
     if LATENCY_BENCHMARK and _inference_layer == gw_schemas.InferenceLayer.SENSOR:
         _inference_latency = _inference_descriptor.recv_timestamp - _inference_descriptor.send_timestamp
-        inf_latency_bench = data_schemas.InferenceLatencyBenchmark(
+        record.inference_latency_benchmark = data_schemas.InferenceLatencyBenchmark(
             sensor_name=sensor_name,
             inference_layer=_inference_descriptor.inference_layer,
             send_timestamp=_inference_descriptor.send_timestamp,
             recv_timestamp=_inference_descriptor.recv_timestamp,
             inference_latency=_inference_latency
         )
-        response = await utils.create_inference_latency_benchmark(
-            gateway_name, sensor_name, inf_latency_bench
-        )
-        if response.status_code != status.HTTP_201_CREATED:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
 
-       
+    # Step 4: Store the record in the data ms, or in the ingest journal if enabled
+    # (the journal replayer drains it into the data ms).
+    if ingest_journal is not None:
+        try:
+            ingest_journal.append(to_json(record))
+        except JournalFullError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(exc),
+                headers={"Retry-After": "1"},
+            )
+    else:
+        await utils.store_ingest_record(record)
+
+    # Step 4.1: Update the rolling aggregates of the sensor (NumPy-backed,
+    # imported on first use so the ingest app doesn't load NumPy at startup).
+    # The record is already stored: failing here would make the gateway retry
+    # it and store a duplicate.
+    if AGGREGATES:
+        from app.core.aggregates import sensor_aggregates
+        try:
+            sensor_aggregates.add(
+                gateway_name, sensor_name, sensor_reading.values, sensor_data.export_value.inference_descriptor.prediction
+            )
+        except Exception:
+            logger.exception("Could not update the aggregates of %s/%s", gateway_name, sensor_name)
+
+    # Step 5: Hand cloud inference side effects to the background executor,
+    # they don't affect the response so the gateway doesn't wait for them.
+    if _inference_layer == gw_schemas.InferenceLayer.CLOUD:
+        # Step 5.1: Export inference latency benchmark if enabled
+        if LATENCY_BENCHMARK:
+            background_tasks.submit(
+                "send_inference_latency_benchmark_command",
+                utils.send_inference_latency_benchmark_command, sensor_data
+            )
+
+        # Step 5.2: Handle heuristic result if adaptive inference is enabled.
+        if ADAPTIVE_INFERENCE:
+            background_tasks.submit(
+                "handle_heuristic_result",
+                utils.handle_heuristic_result, gateway_name, sensor_name, heuristic_result
+            )
+
+
 @gateway_router.post("/export/inference-latency-benchmark", status_code=status.HTTP_201_CREATED)
 async def export_inference_latency_benchmark(inf_latency_bench: gw_schemas.InferenceLatencyBenchmarkExport):
     # Step 1: Make sure that gateway, sensor and reading exist
@@ -133,3 +197,54 @@ async def export_inference_latency_benchmark(inf_latency_bench: gw_schemas.Infer
         )
         if response.status_code != status.HTTP_201_CREATED:
             raise HTTPException(status_code=response.status_code, detail=response.json())
+
+
+# --- Gateway Channel ---
+# Exports, benchmark exports and command responses over one persistent
+# websocket per gateway (see app.core.channels), handled by the routes above
+
+def _channel_handler(route, schema: type[BaseModel], status_code: int, lane: str = DEFAULT_LANE):
+    async def handle(gateway_name: str, body: dict):
+        upstream_lane.set(lane)
+        try:
+            message = schema.model_validate(body)
+        except ValidationError as exc:
+            return status.HTTP_422_UNPROCESSABLE_ENTITY, exc.errors(include_url=False, include_context=False, include_input=False)
+        if message.metadata.gateway_name != gateway_name:
+            return status.HTTP_403_FORBIDDEN, "Message of another gateway"
+        try:
+            return status_code, await route(message)
+        except HTTPException as exc:
+            return exc.status_code, exc.detail
+
+    return handle
+
+gateway_channels.register("export/sensor-data", _channel_handler(
+    export_sensor_data, gw_schemas.SensorDataExport, status.HTTP_201_CREATED
+))
+gateway_channels.register("export/inference-latency-benchmark", _channel_handler(
+    export_inference_latency_benchmark, gw_schemas.InferenceLatencyBenchmarkExport, status.HTTP_201_CREATED
+))
+gateway_channels.register("store/sensor/response/get/sensor-state", _channel_handler(
+    store_sensor_state_response, s_resp_schemas.SensorStateResponse, status.HTTP_202_ACCEPTED, "callback"
+))
+gateway_channels.register("store/sensor/response/get/inference-layer", _channel_handler(
+    store_sensor_inference_layer_response, s_resp_schemas.InferenceLayerResponse, status.HTTP_202_ACCEPTED, "callback"
+))
+gateway_channels.register("store/sensor/response/get/sensor-config", _channel_handler(
+    store_sensor_config_response, s_resp_schemas.SensorConfigResponse, status.HTTP_202_ACCEPTED, "callback"
+))
+
+@gateway_router.websocket("/channel/{gateway_name}")
+async def gateway_channel(websocket: WebSocket, gateway_name: str):
+    await websocket.accept()
+    if not GATEWAY_CHANNEL:
+        await websocket.close(code=POLICY_VIOLATION, reason="Gateway channel is disabled")
+        return
+    try:
+        await utils.lookup_edge_gateway(gateway_name)
+    except HTTPException as exc:
+        await websocket.close(code=POLICY_VIOLATION, reason=str(exc.detail))
+        return
+
+    await gateway_channels.serve(websocket, gateway_name)
@@ -0,0 +1,32 @@
+"""
+Fleet queries: sensors of the whole fleet, served from the device registry.
+"""
+
+from datetime import datetime
+from pydantic import BaseModel
+from typing import Optional
+from app.api.schemas.common import InferenceLayer, SensorState, SensorConfig
+
+
+class FleetSensor(BaseModel):
+    gateway_name: str
+    device_name: str
+    device_address: str
+    state: Optional[SensorState] = None
+    inference_layer: Optional[InferenceLayer] = None
+    config: Optional[SensorConfig] = None
+    low_battery: Optional[bool] = None
+    last_seen: Optional[datetime] = None
+
+class FleetSensorPage(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    items: list[FleetSensor]
+
+class FleetSummary(BaseModel):
+    gateways: int
+    sensors: int
+    state: dict[str, int]
+    inference_layer: dict[str, int]
+    low_battery: dict[str, int]
@@ -0,0 +1,18 @@
+"""
+Ingest records: everything an export stores in the Data Microservice.
+
+Records are stored right away or, when the ingest journal is enabled, written
+to the journal and replayed into the Data Microservice later.
+"""
+
+from pydantic import BaseModel
+from typing import Optional
+from app.api.schemas.data_ms import data as data_schemas
+
+
+class IngestRecord(BaseModel):
+    gateway_name: str
+    sensor_name: str
+    reading: data_schemas.CreateSensorReading
+    prediction_result: data_schemas.PredictionResult
+    inference_latency_benchmark: Optional[data_schemas.InferenceLatencyBenchmark] = None
@@ -1,14 +1,8 @@
 """ Edge Gateway Commands """
 
-import enum
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from typing import Optional
-
-
-class Method(str, enum.Enum):
-    GET = "get"
-    SET = "set"
-    ADD = "add"
+from app.api.schemas.common import Method
 
 class GatewayAPI(BaseModel):
     """
@@ -60,6 +54,8 @@ class GetAvailableSensors(AvailableSensorsCommand):
     method: Method = Method.GET
 
 # --- Property: Provisioned Sensors ---
+BLEDeviceList = TypeAdapter(list[BLEDevice])
+
 class BLEDeviceWithPoP(BLEDevice):
     """
     Schema for the BLE Device with PoP
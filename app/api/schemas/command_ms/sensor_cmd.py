@@ -1,12 +1,8 @@
 """ Edge Sensor Commands """
 
-import enum
 from pydantic import BaseModel
 from typing import Optional
-
-class Method(str, enum.Enum):
-    GET = "get"
-    SET = "set"
+from app.api.schemas.common import Method, SensorState, InferenceLayer, SensorConfig
 
 class GatewayAPIWithSensors(BaseModel):
     """
@@ -25,15 +21,6 @@ class BaseCommand(BaseModel):
 
 # --- Property: Sensor State ---
 
-class SensorState(str, enum.Enum):
-    INITIAL = "initial"
-    UNLOCKED = "unlocked"
-    LOCKED = "locked"
-    WORKING = "working"
-    IDLE = "idle"
-    ERROR = "error"
-
-
 class SensorStateCommand(BaseCommand):
     property_name: str = "sensor-state"
 
@@ -47,12 +34,6 @@ class GetSensorState(SensorStateCommand):
 
 # --- Property: Inference Layer ---
 
-class InferenceLayer(int, enum.Enum):
-    CLOUD = 2
-    GATEWAY = 1
-    SENSOR = 0
-
-
 class InferenceLayerCommand(BaseCommand):
     property_name: str = "inference-layer"
 
@@ -65,9 +46,6 @@ class GetInferenceLayer(InferenceLayerCommand):
 
 # --- Property: Sensor Config ---
 
-class SensorConfig(BaseModel):
-    sleep_interval_ms: int
-
 class SensorConfigCommand(BaseCommand):
     property_name: str = "sensor-config"
 
@@ -10,7 +10,7 @@ mentioned above.
 """
 
 from pydantic import BaseModel
-from app.api.schemas.command_ms.sensor_cmd import SensorConfig, InferenceLayer, SensorState, Method
+from app.api.schemas.common import SensorConfig, InferenceLayer, SensorState, Method
 from typing import Optional
 
 class Metadata(BaseModel):
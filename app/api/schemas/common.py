@@ -0,0 +1,67 @@
+"""
+Schemas shared by the cloud API and the Data, Command and Inference microservices.
+
+The schema modules of each service import these definitions instead of
+redefining them, so models can be handed from one service schema to another
+without being dumped and re-validated.
+"""
+
+import enum
+from pydantic import BaseModel, Field
+from typing import Optional
+from app.core.ids import uuid7
+
+
+# --- Enums ---
+class InferenceLayer(int, enum.Enum):
+    CLOUD = 2
+    GATEWAY = 1
+    SENSOR = 0
+
+class SensorState(str, enum.Enum):
+    INITIAL = "initial"
+    UNLOCKED = "unlocked"
+    LOCKED = "locked"
+    WORKING = "working"
+    IDLE = "idle"
+    ERROR = "error"
+
+class Method(str, enum.Enum):
+    GET = "get"
+    SET = "set"
+    ADD = "add"
+
+
+# --- Exports ---
+class Metadata(BaseModel):
+    gateway_name: str
+    sensor_name: str
+
+class BaseExport(BaseModel):
+    metadata: Metadata
+    export_value: object
+
+class SensorReading(BaseModel):
+    uuid: str = Field(default_factory=uuid7)
+    values: list[list[float]]
+
+
+# --- Sensor Config ---
+class SensorConfig(BaseModel):
+    """
+    Schema for a sensor configuration.
+    """
+
+    sleep_interval_ms: int
+
+
+# --- Inference Latency Benchmark ---
+class InferenceLatencyBenchmark(BaseModel):
+    """
+    Schema for an inference latency benchmark.
+    """
+    sensor_name: str
+    inference_layer: InferenceLayer
+    send_timestamp: Optional[int] = None
+    recv_timestamp: int
+    inference_latency: int
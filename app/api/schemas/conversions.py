@@ -0,0 +1,26 @@
+"""
+Conversions between the schemas of different services.
+
+Both sides share their nested models (see `common`), so conversions assemble
+the target model from already validated parts with `model_construct` instead
+of dumping the source model and validating the result again.
+"""
+
+from app.api.schemas.cloud_api import gateway as gw_schemas
+from app.api.schemas.inference_ms import inference as inf_schemas
+
+
+def to_prediction_request(sensor_data: gw_schemas.SensorDataExport) -> inf_schemas.PredictionRequestExport:
+    export_value = sensor_data.export_value
+    inference_descriptor = export_value.inference_descriptor
+    return inf_schemas.PredictionRequestExport.model_construct(
+        metadata=sensor_data.metadata,
+        export_value=inf_schemas.PredictionRequest.model_construct(
+            reading=export_value.reading,
+            low_battery=export_value.low_battery,
+            inference_descriptor=inf_schemas.InferenceDescriptor.model_construct(
+                inference_layer=inference_descriptor.inference_layer,
+                send_timestamp=inference_descriptor.send_timestamp,
+            ),
+        ),
+    )
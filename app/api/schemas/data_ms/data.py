@@ -1,12 +1,7 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from typing import Optional
-import enum
-
-class InferenceLayer(int, enum.Enum):
-    CLOUD = 2
-    GATEWAY = 1
-    SENSOR = 0
+from app.api.schemas.common import InferenceLayer, SensorState, InferenceLatencyBenchmark
 
 # --- Device Schemas ---
 class BaseDeviceSchema(BaseModel):
@@ -43,16 +38,10 @@ class ReadEdgeGateway(BaseDeviceSchema):
     url: str
     registered_at: datetime
 
+ReadEdgeGatewayList = TypeAdapter(list[ReadEdgeGateway])
 
-# --- Edge Sensor Schemas ---
-class SensorState(str, enum.Enum):
-    INITIAL = "initial"
-    UNLOCKED = "unlocked"
-    LOCKED = "locked"
-    WORKING = "working"
-    IDLE = "idle"
-    ERROR = "error"
 
+# --- Edge Sensor Schemas ---
 class CreateEdgeSensor(BaseDeviceSchema):
     """
     Schema for creating an edge sensor.
@@ -76,26 +65,8 @@ class ReadEdgeSensor(BaseDeviceSchema):
     device_address: str
     registered_at: datetime
 
-# --- Sensor Config Schemas ---
-class SensorConfig(BaseModel):
-    """
-    Schema for a sensor configuration.
-    """
-
-    sleep_interval_ms: int
-
+ReadEdgeSensorList = TypeAdapter(list[ReadEdgeSensor])
 
-# --- Inference Latency Benchmark Schemas ---
-class InferenceLatencyBenchmark(BaseModel):
-    """
-    Schema for an inference latency benchmark.
-    """
-    sensor_name: str
-    inference_layer: InferenceLayer
-    send_timestamp: Optional[int] = None
-    recv_timestamp: int
-    inference_latency: int
-    
 
 # --- Inference Result Schemas ---
 class PredictionResult(BaseModel):
@@ -114,7 +85,8 @@ class BaseSensorReading(BaseModel):
     """
 
     uuid: str
-    values: str # JSON encoded list[list[float]]
+    values: str # list[list[float]] encoded with a reading codec, see app.core.codecs
+    features: Optional[str] = None # JSON encoded reading features, see app.core.features
 
 class CreateSensorReading(BaseSensorReading):
     """
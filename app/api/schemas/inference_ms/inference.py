@@ -1,29 +1,12 @@
 from pydantic import BaseModel
 from typing import Optional
-import enum
+from app.api.schemas.common import BaseExport, InferenceLayer, SensorReading
 
 
-class Metadata(BaseModel):
-    gateway_name: str
-    sensor_name: str
-
-class BaseExport(BaseModel):
-    metadata: Metadata
-    export_value: object
-
 class CloudModel(BaseModel):
     tf_model_bytesize: int
     tf_model_b64: str
 
-class SensorReading(BaseModel):
-    uuid: str
-    values: list[list[float]]
-
-class InferenceLayer(int, enum.Enum):
-    CLOUD = 2
-    GATEWAY = 1
-    SENSOR = 0
-
 class InferenceDescriptor(BaseModel):
     inference_layer: InferenceLayer
     send_timestamp: Optional[int] = None
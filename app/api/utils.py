@@ -4,6 +4,24 @@ from app.core.config import (
     INFERENCE_MICROSERVICE_URL,
     GATEWAY_INFERENCE_LAYER,
     HEURISTIC_ERROR_CODE,
+    POLLING_INTERVAL_MS,
+    INFERENCE_BATCHING,
+    INFERENCE_BATCH_SIZE,
+    INFERENCE_BATCH_DELAY_MS,
+    LOCAL_INFERENCE,
+    DEVICE_REGISTRY,
+    DEVICE_REGISTRY_SYNC_INTERVAL_S,
+    DEVICE_REGISTRY_FULL_SYNC_INTERVAL_S,
+    EXPORT_RATE_LIMIT_KEY,
+    EXPORT_RATE_LIMIT_DEFAULT_RATE,
+    EXPORT_RATE_LIMIT_MIN_RATE,
+    EXPORT_RATE_LIMIT_HEADROOM,
+    EXPORT_RATE_LIMIT_BURST_S,
+    EXPORT_RATE_LIMIT_CONFIG_TTL_S,
+    COMMAND_OUTBOX,
+    UPSTREAM_COMPRESSION,
+    UPSTREAM_COMPRESSION_MIN_BYTES,
+    UPSTREAM_COMPRESSION_LEVEL,
 )
 from app.api.schemas.data_ms import data as data_schemas
 from app.api.schemas.cloud_api import gateway as gw_schemas
@@ -11,37 +29,77 @@ from app.api.schemas.command_ms import gateway_cmd as gw_cmd_schemas
 from app.api.schemas.command_ms import sensor_cmd as s_cmd_schemas
 from app.api.schemas.command_ms import sensor_resp as s_resp_schemas
 from app.api.schemas.inference_ms import inference as inf_schemas
+from app.api.schemas.cloud_api import ingest as ingest_schemas
+from app.core.batching import MicroBatcher
+from app.core.local_inference import local_inference_engine, ModelNotLoadedError
+from app.core.registry import DeviceRegistry
+from app.core.last_known import sensor_properties
+from app.core.ratelimit import AdmissionController
+from app.core.lanes import upstream_lanes
+from app.core.channels import gateway_channels
+from app.core.etags import entity_cache
+from app.core.outbox import create_command_outbox
+from app.core.compression import compress, COMPRESSORS
 from fastapi import UploadFile, status, HTTPException
 import httpx
+from pydantic import BaseModel, ValidationError
+from pydantic_core import to_json
+from typing import Any, Awaitable, Callable, Hashable, Union
 import base64
+import collections
+import logging
+import math
+import time
 import zlib
 import asyncio
 
+logger = logging.getLogger(__name__)
+
 # --- Async Polling ---
 async def async_sleep(ms: int):
     await asyncio.sleep(ms / 1000)
 
 # --- Primitive functions for microservice communication ---
 
+if UPSTREAM_COMPRESSION and UPSTREAM_COMPRESSION not in COMPRESSORS:
+    raise ValueError(
+        f"Unsupported upstream compression: {UPSTREAM_COMPRESSION}, must be one of: {', '.join(COMPRESSORS)}"
+        + ("" if "zstd" in COMPRESSORS else " (zstd requires the zstandard package)")
+    )
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+COMPRESSED_JSON_HEADERS = {**JSON_HEADERS, "Content-Encoding": UPSTREAM_COMPRESSION}
+
+
+def _json_content(data: Union[BaseModel, list, dict]) -> bytes:
+    # pydantic-core serializes models (and containers of models) straight to
+    # JSON bytes, skipping the intermediate dict and the stdlib json encoder.
+    return to_json(data)
+
+
+def _json_request(data: Union[BaseModel, list, dict]) -> dict:
+    # Large bodies (readings, models) are compressed if UPSTREAM_COMPRESSION is set
+    content = _json_content(data)
+    if UPSTREAM_COMPRESSION and len(content) >= UPSTREAM_COMPRESSION_MIN_BYTES:
+        return {"content": compress(content, UPSTREAM_COMPRESSION, UPSTREAM_COMPRESSION_LEVEL), "headers": COMPRESSED_JSON_HEADERS}
+    return {"content": content, "headers": JSON_HEADERS}
 
-async def _post_json_to_microservice(url: str, json_data: dict):
-    async with httpx.AsyncClient(timeout=httpx.Timeout(20.0)) as client:
-        return await client.post(url, json=json_data)
 
+# Requests go through the pooled client of the caller's priority lane, see app.core.lanes
+async def _post_json_to_microservice(url: str, data: Union[BaseModel, list, dict]):
+    return await upstream_lanes.request("POST", url, **_json_request(data))
 
-async def _put_json_to_microservice(url: str, json_data: dict):
-    async with httpx.AsyncClient(timeout=httpx.Timeout(20.0)) as client:
-        return await client.put(url, json=json_data)
+
+async def _put_json_to_microservice(url: str, data: Union[BaseModel, list, dict]):
+    return await upstream_lanes.request("PUT", url, **_json_request(data))
 
 
 async def _get_from_microservice(url: str):
-    async with httpx.AsyncClient(timeout=httpx.Timeout(20.0)) as client:
-        return await client.get(url)
+    return await upstream_lanes.request("GET", url)
 
 
 async def _delete_from_microservice(url: str):
-    async with httpx.AsyncClient(timeout=httpx.Timeout(20.0)) as client:
-        return await client.delete(url)
+    return await upstream_lanes.request("DELETE", url)
 
 
 # --- Data microservice functions ---
@@ -50,13 +108,13 @@ async def _delete_from_microservice(url: str):
 # CRUD operations for edge gateways
 async def create_edge_gateway(data: data_schemas.CreateEdgeGateway):
     return await _post_json_to_microservice(
-        f"{DATA_MICROSERVICE_URL}/gateway", data.model_dump()
+        f"{DATA_MICROSERVICE_URL}/gateway", data
     )
 
 
 async def update_edge_gateway(data: data_schemas.UpdateEdgeGateway):
     return await _put_json_to_microservice(
-        f"{DATA_MICROSERVICE_URL}/gateway", data.model_dump()
+        f"{DATA_MICROSERVICE_URL}/gateway", data
     )
 
 
@@ -79,13 +137,13 @@ async def delete_edge_gateway(device_name: str):
 # CRUD operations for edge sensors
 async def create_edge_sensor(gateway_name: str, data: data_schemas.CreateEdgeSensor):
     return await _post_json_to_microservice(
-        f"{DATA_MICROSERVICE_URL}/gateway/{gateway_name}/sensor", data.model_dump()
+        f"{DATA_MICROSERVICE_URL}/gateway/{gateway_name}/sensor", data
     )
 
 
 async def update_edge_sensor(gateway_name: str, device_name: str, data: data_schemas.UpdateEdgeSensor):
     return await _put_json_to_microservice(
-        f"{DATA_MICROSERVICE_URL}/gateway/{gateway_name}/sensor/{device_name}", data.model_dump()
+        f"{DATA_MICROSERVICE_URL}/gateway/{gateway_name}/sensor/{device_name}", data
     )
 
 
@@ -109,11 +167,11 @@ async def delete_edge_sensor(gateway_name: str, device_name: str):
 
 # CRUD operations for sensor config
 async def create_or_update_sensor_config(
-    gateway_name: str, sensor_name: str, data: data_schemas.SensorConfig
+    gateway_name: str, sensor_name: str, data: s_cmd_schemas.SensorConfig
 ):
     return await _post_json_to_microservice(
         f"{DATA_MICROSERVICE_URL}/gateway/{gateway_name}/sensor/{sensor_name}/config",
-        data.model_dump(),
+        data,
     )
 
 
@@ -151,9 +209,11 @@ async def delete_sensor_readings(gateway_name: str, sensor_name: str):
 async def create_sensor_reading(
     gateway_name: str, sensor_name: str, data: data_schemas.CreateSensorReading
 ):
+    # `features` is only sent when extracted, so a data ms whose reading schema
+    # doesn't have the field gets the same body as before
     return await _post_json_to_microservice(
         f"{DATA_MICROSERVICE_URL}/gateway/{gateway_name}/sensor/{sensor_name}/reading",
-        data.model_dump(),
+        data.model_dump(exclude_none=True),
     )
 
 
@@ -166,7 +226,7 @@ async def create_prediction_result(
 ):
     return await _post_json_to_microservice(
         f"{DATA_MICROSERVICE_URL}/gateway/{gateway_name}/sensor/{sensor_name}/reading/{reading_uuid}/prediction",
-        data.model_dump(),
+        data,
     )
 
 
@@ -178,8 +238,259 @@ async def create_inference_latency_benchmark(
 ):
     return await _post_json_to_microservice(
         f"{DATA_MICROSERVICE_URL}/gateway/{gateway_name}/sensor/{sensor_name}/inference/latency",
-        data.model_dump(),
+        data,
+    )
+
+
+# Ingest records
+def _check_stored(response: httpx.Response, replay: bool):
+    # Replayed records may have been stored before the replay was interrupted
+    if replay and response.status_code == status.HTTP_409_CONFLICT:
+        return
+    if response.status_code != status.HTTP_201_CREATED:
+        raise HTTPException(status_code=response.status_code, detail=response.json())
+
+
+async def store_ingest_record(record: ingest_schemas.IngestRecord, replay: bool = False):
+    gateway_name, sensor_name = record.gateway_name, record.sensor_name
+
+    response = await create_sensor_reading(gateway_name, sensor_name, record.reading)
+    _check_stored(response, replay)
+
+    response = await create_prediction_result(
+        gateway_name, sensor_name, record.reading.uuid, record.prediction_result
+    )
+    _check_stored(response, replay)
+
+    if record.inference_latency_benchmark is not None:
+        response = await create_inference_latency_benchmark(
+            gateway_name, sensor_name, record.inference_latency_benchmark
+        )
+        _check_stored(response, replay)
+
+
+async def _replay_ingest_record(payload: bytes):
+    record = ingest_schemas.IngestRecord.model_validate_json(payload)
+    await store_ingest_record(record, replay=True)
+
+
+_RETRYABLE_STATUS_CODES = {408, 425, 429}
+
+
+def _rejected_for_good(exc: Exception) -> bool:
+    # A 4xx (deleted sensor, invalid record) won't succeed on retry, unlike
+    # transport errors, 5xx and the retryable 4xx (timeout, too early, throttled)
+    if isinstance(exc, ValidationError):
+        return True
+    return (
+        isinstance(exc, HTTPException)
+        and 400 <= exc.status_code < 500
+        and exc.status_code not in _RETRYABLE_STATUS_CODES
+    )
+
+
+async def replay_ingest_records(payloads: list[bytes]) -> list[tuple[int, Exception]]:
+    results = await asyncio.gather(
+        *(_replay_ingest_record(payload) for payload in payloads),
+        return_exceptions=True,
     )
+    rejected = []
+    for index, result in enumerate(results):
+        if not isinstance(result, Exception):
+            continue
+        if not _rejected_for_good(result):
+            raise result
+        rejected.append((index, result))
+    return rejected
+
+
+# Device registry: gateway and sensor lookups without a data ms round trip
+async def _fetch_edge_gateway(gateway_name: str):
+    response = await read_edge_gateway(gateway_name)
+    if response.status_code != status.HTTP_200_OK:
+        raise HTTPException(status_code=response.status_code, detail=response.json())
+    return data_schemas.ReadEdgeGateway.model_validate_json(response.content)
+
+
+async def _fetch_edge_sensor(gateway_name: str, sensor_name: str):
+    response = await read_edge_sensor(gateway_name, sensor_name)
+    if response.status_code != status.HTTP_200_OK:
+        raise HTTPException(status_code=response.status_code, detail=response.json())
+    return data_schemas.ReadEdgeSensor.model_validate_json(response.content)
+
+
+async def _fetch_edge_gateways():
+    response = await read_edge_gateways()
+    if response.status_code != status.HTTP_200_OK:
+        raise HTTPException(status_code=response.status_code, detail=response.json())
+    return data_schemas.ReadEdgeGatewayList.validate_json(response.content)
+
+
+async def _fetch_edge_sensors(gateway_name: str):
+    response = await read_edge_sensors(gateway_name)
+    if response.status_code != status.HTTP_200_OK:
+        raise HTTPException(status_code=response.status_code, detail=response.json())
+    return data_schemas.ReadEdgeSensorList.validate_json(response.content)
+
+
+device_registry = DeviceRegistry(
+    fetch_gateways=_fetch_edge_gateways,
+    fetch_sensors=_fetch_edge_sensors,
+    fetch_gateway=_fetch_edge_gateway,
+    fetch_sensor=_fetch_edge_sensor,
+    sync_interval_s=DEVICE_REGISTRY_SYNC_INTERVAL_S,
+    full_sync_interval_s=DEVICE_REGISTRY_FULL_SYNC_INTERVAL_S,
+)
+
+
+async def lookup_edge_gateway(gateway_name: str):
+    """
+    Returns the gateway (with its `url`), raising the data ms error if it doesn't exist.
+    """
+    if DEVICE_REGISTRY:
+        return await device_registry.get_gateway(gateway_name)
+    return await _fetch_edge_gateway(gateway_name)
+
+
+async def lookup_edge_sensor(gateway_name: str, sensor_name: str):
+    """
+    Returns the sensor, raising the data ms error if it or its gateway doesn't exist.
+    """
+    if DEVICE_REGISTRY:
+        return await device_registry.get_sensor(gateway_name, sensor_name)
+    return await _fetch_edge_sensor(gateway_name, sensor_name)
+
+
+def record_sensor_properties(gateway_name: str, sensor_name: str, source: str, **properties):
+    """
+    Records observed sensor properties (state, inference_layer, config) in the
+    last-known-value cache and the device registry indexes. `source` is what
+    they were observed from: "command", "response" or "export".
+    """
+    sensor_properties.record(gateway_name, sensor_name, source, **properties)
+    device_registry.update_sensor(gateway_name, sensor_name, **properties)
+
+
+# Export admission control
+# Rates are based on the sensor configs stored in the data ms (and, without the
+# device registry, the gateway sensor lists), cached for
+# EXPORT_RATE_LIMIT_CONFIG_TTL_S. Configs observed since by this process
+# (last-known values) override them. Stale or missing rate sources are loaded in
+# the background, one load at a time per admission key, so the export path never
+# waits on the data ms; a key is admitted until its first load completes.
+_RATE_SOURCES_MAX_ENTRIES = 100000
+_rate_sources: collections.OrderedDict[Hashable, tuple[float, Any]] = collections.OrderedDict()
+_export_rates_expire_at: collections.OrderedDict[Hashable, float] = collections.OrderedDict()
+_export_rate_loads: dict[Hashable, asyncio.Task] = {}
+
+
+async def _fetch_stored_sensor_config(gateway_name: str, sensor_name: str):
+    response = await read_sensor_config(gateway_name, sensor_name)
+    if response.status_code != status.HTTP_200_OK:
+        raise HTTPException(status_code=response.status_code, detail=response.text)
+    return s_cmd_schemas.SensorConfig.model_validate_json(response.content)
+
+
+async def _fetch_gateway_sensor_names(gateway_name: str):
+    return [sensor.device_name for sensor in await _fetch_edge_sensors(gateway_name)]
+
+
+async def _load_rate_source(key: Hashable, fetch: Callable[[], Awaitable[Any]]):
+    entry = _rate_sources.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        return
+    try:
+        value = await fetch()
+    except (HTTPException, httpx.TransportError, ValueError):
+        # No stored config, or the data ms is unavailable: keep what we had
+        # (or the default rate) until the next refresh
+        value = None if entry is None else entry[1]
+    _rate_sources[key] = (time.monotonic() + EXPORT_RATE_LIMIT_CONFIG_TTL_S, value)
+    _rate_sources.move_to_end(key)
+    while len(_rate_sources) > _RATE_SOURCES_MAX_ENTRIES:
+        _rate_sources.popitem(last=False)
+
+
+def _gateway_sensor_names(gateway_name: str) -> list[str]:
+    if DEVICE_REGISTRY:
+        gateway = device_registry.peek_gateway(gateway_name)
+        return list(gateway.sensors) if gateway is not None else []
+    entry = _rate_sources.get(gateway_name)
+    return (entry[1] or []) if entry is not None else []
+
+
+async def _load_export_rate_sources(key):
+    try:
+        if EXPORT_RATE_LIMIT_KEY == "sensor":
+            sensor_keys = [key]
+        else:
+            if not DEVICE_REGISTRY:
+                await _load_rate_source(key, lambda: _fetch_gateway_sensor_names(key))
+            sensor_keys = [(key, sensor_name) for sensor_name in _gateway_sensor_names(key)]
+        await asyncio.gather(*(
+            _load_rate_source(sensor_key, lambda sensor_key=sensor_key: _fetch_stored_sensor_config(*sensor_key))
+            for sensor_key in sensor_keys
+        ))
+    except Exception:
+        logger.exception("Loading the export rate sources of %s failed", key)
+    finally:
+        # Failed loads are retried after the TTL too, not on every export
+        _export_rates_expire_at[key] = time.monotonic() + EXPORT_RATE_LIMIT_CONFIG_TTL_S
+        _export_rates_expire_at.move_to_end(key)
+        while len(_export_rates_expire_at) > _RATE_SOURCES_MAX_ENTRIES:
+            _export_rates_expire_at.popitem(last=False)
+        del _export_rate_loads[key]
+
+
+def _refresh_export_rate_sources(key) -> bool:
+    """
+    Starts loading the rate sources of `key` in the background if they are stale
+    and no load is in flight. Returns whether they were loaded at least once.
+    """
+    expires_at = _export_rates_expire_at.get(key)
+    if (expires_at is None or expires_at <= time.monotonic()) and key not in _export_rate_loads:
+        _export_rate_loads[key] = asyncio.create_task(_load_export_rate_sources(key), name=f"export-rate-load-{key}")
+    return expires_at is not None
+
+
+def _sensor_export_rate(gateway_name: str, sensor_name: str) -> float:
+    observed = sensor_properties.get(gateway_name, sensor_name, "config")
+    if observed is not None:
+        config = observed.value
+    else:
+        entry = _rate_sources.get((gateway_name, sensor_name))
+        config = entry[1] if entry is not None else None
+    if config is None or config.sleep_interval_ms <= 0:
+        return EXPORT_RATE_LIMIT_DEFAULT_RATE
+    return 1000 / config.sleep_interval_ms
+
+
+def _export_rate(key) -> float:
+    """
+    Expected exports per second of a gateway (sum over its sensors) or of a
+    (gateway, sensor), with headroom.
+    """
+    if EXPORT_RATE_LIMIT_KEY == "sensor":
+        rate = _sensor_export_rate(*key)
+    else:
+        rate = sum(_sensor_export_rate(key, sensor_name) for sensor_name in _gateway_sensor_names(key))
+    return max(rate * EXPORT_RATE_LIMIT_HEADROOM, EXPORT_RATE_LIMIT_MIN_RATE)
+
+
+export_admission = AdmissionController(_export_rate, burst_s=EXPORT_RATE_LIMIT_BURST_S)
+
+
+def admit_export(gateway_name: str, sensor_name: str):
+    key = (gateway_name, sensor_name) if EXPORT_RATE_LIMIT_KEY == "sensor" else gateway_name
+    if not _refresh_export_rate_sources(key):
+        return
+    retry_after = export_admission.admit(key)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Export rate limit exceeded for {'/'.join(key) if isinstance(key, tuple) else key}",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
 
 
 # --- Command microservice functions ---
@@ -191,7 +502,7 @@ async def get_available_sensors(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/gateway/command/get/available-sensors",
-        command.model_dump(),
+        command,
     )
 
 async def get_provisioned_sensors(
@@ -199,7 +510,7 @@ async def get_provisioned_sensors(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/gateway/command/get/provisioned-sensors",
-        command.model_dump(),
+        command,
     )
 
 async def add_provisioned_sensors(
@@ -207,7 +518,7 @@ async def add_provisioned_sensors(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/gateway/command/add/provisioned-sensors",
-        command.model_dump(),
+        command,
     )
 
 async def set_gateway_model(
@@ -215,7 +526,7 @@ async def set_gateway_model(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/gateway/command/set/gateway-model",
-        command.model_dump(),
+        command,
     )
 
 async def add_registered_sensors(
@@ -223,7 +534,7 @@ async def add_registered_sensors(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/gateway/command/add/registered-sensors",
-        command.model_dump(),
+        command,
     )
 
 
@@ -234,7 +545,7 @@ async def set_sensor_state(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/sensor/command/set/sensor-state",
-        command.model_dump(),
+        command,
     )
 
 async def get_sensor_state(
@@ -242,7 +553,7 @@ async def get_sensor_state(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/sensor/command/get/sensor-state",
-        command.model_dump(),
+        command,
     )
 
 async def retrieve_sensor_state(
@@ -258,7 +569,7 @@ async def set_inference_layer(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/sensor/command/set/inference-layer",
-        command.model_dump(),
+        command,
     )
 
 async def get_inference_layer(
@@ -266,7 +577,7 @@ async def get_inference_layer(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/sensor/command/get/inference-layer",
-        command.model_dump(),
+        command,
     )
 
 async def retrieve_inference_layer(
@@ -282,7 +593,7 @@ async def set_sensor_config(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/sensor/command/set/sensor-config",
-        command.model_dump(),
+        command,
     )
 
 async def get_sensor_config(
@@ -290,7 +601,7 @@ async def get_sensor_config(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/sensor/command/get/sensor-config",
-        command.model_dump(),
+        command,
     )
 
 async def retrieve_sensor_config(
@@ -306,8 +617,54 @@ async def set_sensor_model(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/sensor/command/set/sensor-model",
-        command.model_dump(),
-    )
+        command,
+    )
+
+# SET sensor commands, directly or through the command outbox. A gateway
+# connected over its channel gets them down the channel (delivered again when it
+# resumes), the others through the command ms.
+SET_SENSOR_COMMANDS = {
+    "sensor-state": (s_cmd_schemas.SetSensorState, set_sensor_state),
+    "inference-layer": (s_cmd_schemas.SetInferenceLayer, set_inference_layer),
+    "sensor-config": (s_cmd_schemas.SetSensorConfig, set_sensor_config),
+}
+# SET command property -> last-known property
+SET_SENSOR_PROPERTIES = {"sensor-state": "state", "inference-layer": "inference_layer", "sensor-config": "config"}
+
+async def _dispatch_set_command(gateway_name: str, property_name: str, sensor_names: list[str], value):
+    command_schema, send_command = SET_SENSOR_COMMANDS[property_name]
+    command = command_schema(
+        target=await get_gateway_api_with_sensors(gateway_name, sensor_names),
+        property_value=value,
+    )
+    if gateway_channels.connected(gateway_name):
+        await gateway_channels.push(gateway_name, "command", command.model_dump(mode="json"))
+    else:
+        response = await send_command(command)
+        if response.status_code != status.HTTP_202_ACCEPTED:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+    _record_dispatched_set_command(gateway_name, property_name, sensor_names, value)
+
+def _record_dispatched_set_command(gateway_name: str, property_name: str, sensor_names: list[str], value):
+    # Recorded once dispatched, not when queued: a dead-lettered command changes nothing
+    recorded_name = SET_SENSOR_PROPERTIES[property_name]
+    for sensor_name in sensor_names:
+        record_sensor_properties(gateway_name, sensor_name, "command", **{recorded_name: value})
+    entity_cache.invalidate(("sensors", gateway_name), *(("sensor", gateway_name, name) for name in sensor_names))
+
+command_outbox = create_command_outbox(_dispatch_set_command)
+
+async def send_set_command(gateway_name: str, property_name: str, sensor_names: list[str], value):
+    """
+    Sends a SET command to the sensors, or queues it in the command outbox if
+    enabled (the sensors are validated either way). The value is recorded as the
+    sensors' last-known property once the command is dispatched.
+    """
+    if not COMMAND_OUTBOX:
+        await _dispatch_set_command(gateway_name, property_name, sensor_names, value)
+        return
+    await get_gateway_api_with_sensors(gateway_name, sensor_names)
+    command_outbox.put(gateway_name, property_name, sensor_names, value)
 
 async def send_inference_latency_benchmark_command(
     sensor_data: gw_schemas.SensorDataExport,
@@ -326,7 +683,7 @@ async def send_inference_latency_benchmark_command(
     )
     response = await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/sensor/command/set/inf-latency-bench",
-        command.model_dump(),
+        command,
     )
     if response.status_code != status.HTTP_202_ACCEPTED:
         raise HTTPException(status_code=response.status_code, detail=response.json())
@@ -338,7 +695,7 @@ async def store_sensor_state_response(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/store/sensor/response/get/sensor-state",
-        response.model_dump(),
+        response,
     )
 
 async def store_sensor_inference_layer_response(
@@ -346,7 +703,7 @@ async def store_sensor_inference_layer_response(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/store/sensor/response/get/inference-layer",
-        response.model_dump(),
+        response,
     )
 
 async def store_sensor_config_response(
@@ -354,69 +711,135 @@ async def store_sensor_config_response(
 ):
     return await _post_json_to_microservice(
         f"{COMMAND_MICROSERVICE_URL}/store/sensor/response/get/sensor-config",
-        response.model_dump(),
+        response,
     )
 
 # --- Inference microservice functions ---
 
 async def set_cloud_model(predictive_model: inf_schemas.CloudModel):
     return await _post_json_to_microservice(
-        f"{INFERENCE_MICROSERVICE_URL}/model/upload", predictive_model.model_dump()
+        f"{INFERENCE_MICROSERVICE_URL}/model/upload", predictive_model
     )
 
 
 async def send_prediction_request(prediction_request: inf_schemas.PredictionRequestExport):
     return await _put_json_to_microservice(
         f"{INFERENCE_MICROSERVICE_URL}/model/prediction/request",
-        prediction_request.model_dump(),
+        prediction_request,
     )
 
 async def get_prediction_result(task_id: str):
     return await _get_from_microservice(f"{INFERENCE_MICROSERVICE_URL}/model/prediction/result/{task_id}")
 
 
+async def send_batch_prediction_request(prediction_requests: list[inf_schemas.PredictionRequestExport]):
+    return await _put_json_to_microservice(
+        f"{INFERENCE_MICROSERVICE_URL}/model/prediction/batch/request",
+        prediction_requests,
+    )
+
+
+async def poll_prediction_result(task_id: str):
+    while True:
+        response = await get_prediction_result(task_id)
+        if response.status_code != status.HTTP_200_OK:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+
+        json_response = response.json()
+        if json_response["status"] == "SUCCESS":
+            return json_response["result"]
+        elif json_response["status"] == "FAILURE":
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Prediction task failed.")
+        else:   # status == "PENDING"
+            await async_sleep(POLLING_INTERVAL_MS)
+
+
+async def request_cloud_prediction(prediction_request: inf_schemas.PredictionRequestExport):
+    response = await send_prediction_request(prediction_request)
+    if response.status_code != status.HTTP_202_ACCEPTED:
+        raise HTTPException(status_code=response.status_code, detail=response.json())
+
+    return await poll_prediction_result(response.json()["task_id"])
+
+
+async def request_cloud_batch_prediction(prediction_requests: list[inf_schemas.PredictionRequestExport]):
+    # A lone request doesn't need the batch endpoint
+    if len(prediction_requests) == 1:
+        return [await request_cloud_prediction(prediction_requests[0])]
+
+    response = await send_batch_prediction_request(prediction_requests)
+    if response.status_code != status.HTTP_202_ACCEPTED:
+        raise HTTPException(status_code=response.status_code, detail=response.json())
+
+    # The batch task result holds one result per request, in submission order
+    return await poll_prediction_result(response.json()["task_id"])
+
+
+prediction_batcher = MicroBatcher(
+    request_cloud_batch_prediction,
+    max_batch_size=INFERENCE_BATCH_SIZE,
+    max_delay_ms=INFERENCE_BATCH_DELAY_MS,
+)
+
+
+async def run_cloud_inference(prediction_request: inf_schemas.PredictionRequestExport):
+    """
+    Returns the {"prediction_result", "heuristic_result"} of the inference task,
+    running it in-process in local inference mode, or going through the
+    micro-batcher when batching is enabled.
+    """
+    if LOCAL_INFERENCE:
+        try:
+            return await local_inference_engine.predict(prediction_request.export_value.reading.values)
+        except ModelNotLoadedError as exc:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc))
+    if INFERENCE_BATCHING:
+        return await prediction_batcher.submit(prediction_request)
+    return await request_cloud_prediction(prediction_request)
+
+
 async def handle_heuristic_result(gateway_name: str, sensor_name: str, heuristic_result: int):
-    gateway_api_with_sensors = await get_gateway_api_with_sensors(gateway_name, [sensor_name])
     if heuristic_result == HEURISTIC_ERROR_CODE:    # set sensor state to error
-        command = s_cmd_schemas.SetSensorState(
-            target=gateway_api_with_sensors,
-            property_value=s_cmd_schemas.SensorState.ERROR
-        )
-        response = await set_sensor_state(command)
-        if response.status_code != status.HTTP_202_ACCEPTED:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
+        await send_set_command(gateway_name, "sensor-state", [sensor_name], s_cmd_schemas.SensorState.ERROR)
     elif heuristic_result == GATEWAY_INFERENCE_LAYER:    # set sensor inference layer to gateway
-        command = s_cmd_schemas.SetInferenceLayer(
-            target=gateway_api_with_sensors,
-            property_value=s_cmd_schemas.InferenceLayer.GATEWAY
-        )
-        response = await set_inference_layer(command)
-        if response.status_code != status.HTTP_202_ACCEPTED:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
-    
+        await send_set_command(gateway_name, "inference-layer", [sensor_name], s_cmd_schemas.InferenceLayer.GATEWAY)
+
 
 # --- Gateway Comm Utility Functions ---
 
 async def get_gateway_api(gateway_name: str):
-    response = await read_edge_gateway(gateway_name)
-    if response.status_code != status.HTTP_200_OK:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
-
-    gateway_url = response.json()["url"]
-    return gw_cmd_schemas.GatewayAPI(gateway_name=gateway_name, url=gateway_url)
+    gateway = await lookup_edge_gateway(gateway_name)
+    return gw_cmd_schemas.GatewayAPI(gateway_name=gateway_name, url=gateway.url)
 
 async def get_gateway_api_with_sensors(gateway_name: str, sensor_names: list[str]):
-    response = await read_edge_gateway(gateway_name)
-    if response.status_code != status.HTTP_200_OK:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
-    gateway_url = response.json()["url"]
-
+    gateway = await lookup_edge_gateway(gateway_name)
     for sensor in sensor_names:
-        response = await read_edge_sensor(gateway_name, sensor)
-        if response.status_code != status.HTTP_200_OK:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
+        await lookup_edge_sensor(gateway_name, sensor)
 
-    return s_cmd_schemas.GatewayAPIWithSensors(gateway_name=gateway_name, url=gateway_url, target_sensors=sensor_names)
+    return s_cmd_schemas.GatewayAPIWithSensors(gateway_name=gateway_name, url=gateway.url, target_sensors=sensor_names)
+
+
+# Last-known sensor properties
+SENSOR_PROPERTY_COMMANDS = {
+    "state": (s_cmd_schemas.GetSensorState, get_sensor_state),
+    "inference_layer": (s_cmd_schemas.GetInferenceLayer, get_inference_layer),
+    "config": (s_cmd_schemas.GetSensorConfig, get_sensor_config),
+}
+
+async def request_sensor_properties(gateway_name: str, sensor_name: str, names: list[str]) -> dict[str, list[str]]:
+    """
+    Sends the GET commands that refresh the given properties of a sensor, returns
+    their command uuids per property.
+    """
+    gateway_api_with_sensors = await get_gateway_api_with_sensors(gateway_name, [sensor_name])
+    command_uuids = {}
+    for name in names:
+        command_schema, send_command = SENSOR_PROPERTY_COMMANDS[name]
+        response = await send_command(command_schema(target=gateway_api_with_sensors))
+        if response.status_code != status.HTTP_202_ACCEPTED:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+        command_uuids[name] = response.json()["command_uuids"]
+    return command_uuids
 
 
 # --- Model Utility Functions ---
@@ -0,0 +1,176 @@
+"""
+Rolling per-sensor aggregates of the ingested readings.
+
+For every sensor and window (e.g. 1 min, 1 h, 1 day) the readings are
+summarized per channel (count, min, max, mean, RMS) together with the counts of
+each prediction class. Each window is a ring of time buckets (a 1 h window
+with 60 buckets keeps one bucket per minute); a bucket older than the window is
+reset when its slot is reused, so the aggregates roll without ever storing raw
+readings. All windows of a sensor share one set of NumPy arrays, which are
+updated with a handful of vectorized operations per reading.
+"""
+
+import time
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import AGGREGATE_WINDOWS, AGGREGATE_PREDICTION_CLASSES
+
+
+def parse_windows(spec: str) -> list[tuple[int, int]]:
+    """
+    "60:12,3600:60" -> [(60, 12), (3600, 60)]: (window seconds, buckets).
+    """
+    windows = []
+    for item in spec.split(","):
+        window_s, _, buckets = item.partition(":")
+        windows.append((int(window_s), int(buckets or 60)))
+    return windows
+
+
+class SensorAggregates:
+    """
+    Bucket rings of all windows of one sensor, stacked in the same arrays: the
+    buckets of window `w` are rows `offsets[w]:offsets[w] + buckets[w]`.
+    """
+
+    __slots__ = ("channels", "bucket_ids", "readings", "count", "sum", "sumsq", "min", "max", "predictions")
+
+    def __init__(self, rows: int, channels: int, classes: int):
+        self.channels = channels
+        self.bucket_ids = np.full(rows, -1, dtype=np.int64)
+        self.readings = np.zeros(rows, dtype=np.int64)
+        self.count = np.zeros(rows, dtype=np.int64)
+        self.sum = np.zeros((rows, channels))
+        self.sumsq = np.zeros((rows, channels))
+        self.min = np.full((rows, channels), np.inf, dtype=np.float32)
+        self.max = np.full((rows, channels), -np.inf, dtype=np.float32)
+        self.predictions = np.zeros((rows, classes + 1), dtype=np.int32)    # last column: other classes
+
+    def reset(self, rows: np.ndarray):
+        self.readings[rows] = 0
+        self.count[rows] = 0
+        self.sum[rows] = 0
+        self.sumsq[rows] = 0
+        self.min[rows] = np.inf
+        self.max[rows] = -np.inf
+        self.predictions[rows] = 0
+
+
+class RollingAggregates:
+    def __init__(self, windows: list[tuple[int, int]], prediction_classes: int):
+        self.windows = windows
+        self.prediction_classes = prediction_classes
+        self._bucket_s = np.array([window_s / buckets for window_s, buckets in windows])
+        self._buckets = np.array([buckets for _, buckets in windows])
+        self._offsets = np.concatenate(([0], np.cumsum(self._buckets)[:-1]))
+        self._rows = int(self._buckets.sum())
+        self._sensors: dict[tuple[str, str], SensorAggregates] = {}
+
+    def add(self, gateway_name: str, sensor_name: str, values, prediction: Optional[int] = None,
+            timestamp: Optional[float] = None):
+        """
+        Adds a reading (samples x channels) and its predicted class. Readings
+        that aren't a (samples x channels) array of numbers (e.g. ragged rows)
+        are skipped.
+        """
+        try:
+            values = np.asarray(values, dtype=np.float64)
+        except (ValueError, TypeError):
+            return
+        if values.ndim != 2 or values.size == 0:
+            return
+        now = time.time() if timestamp is None else timestamp
+
+        # Per-channel statistics of the reading, once for all windows
+        samples, channels = values.shape
+        reading_sum = values.sum(axis=0)
+        reading_sumsq = np.einsum("ij,ij->j", values, values)
+        reading_min = values.min(axis=0)
+        reading_max = values.max(axis=0)
+
+        bucket_ids = (now // self._bucket_s).astype(np.int64)
+        rows = self._offsets + bucket_ids % self._buckets
+
+        key = (gateway_name, sensor_name)
+        aggregates = self._sensors.get(key)
+        if aggregates is None or aggregates.channels != channels:
+            aggregates = self._sensors[key] = SensorAggregates(self._rows, channels, self.prediction_classes)
+
+        stale = rows[aggregates.bucket_ids[rows] != bucket_ids]
+        if stale.size:
+            aggregates.reset(stale)
+            aggregates.bucket_ids[rows] = bucket_ids
+
+        aggregates.readings[rows] += 1
+        aggregates.count[rows] += samples
+        aggregates.sum[rows] += reading_sum
+        aggregates.sumsq[rows] += reading_sumsq
+        aggregates.min[rows] = np.minimum(aggregates.min[rows], reading_min)
+        aggregates.max[rows] = np.maximum(aggregates.max[rows], reading_max)
+        if prediction is not None:
+            column = prediction if 0 <= prediction < self.prediction_classes else self.prediction_classes
+            aggregates.predictions[rows, column] += 1
+
+    def query(self, gateway_name: str, sensor_name: str, window_s: Optional[int] = None,
+              timestamp: Optional[float] = None) -> list[dict]:
+        """
+        Aggregates of the sensor over each window, or only over `window_s`.
+        """
+        aggregates = self._sensors.get((gateway_name, sensor_name))
+        now = time.time() if timestamp is None else timestamp
+
+        result = []
+        for i, (window, buckets) in enumerate(self.windows):
+            if window_s is not None and window != window_s:
+                continue
+            if aggregates is None:
+                result.append({"window_s": window, "readings": 0, "count": 0, "channels": [], "predictions": {}})
+                continue
+            rows = slice(self._offsets[i], self._offsets[i] + buckets)
+            current = int(now // self._bucket_s[i])
+            live = (aggregates.bucket_ids[rows] > current - buckets) & (aggregates.bucket_ids[rows] <= current)
+            result.append(self._summarize(aggregates, rows, live, window))
+        return result
+
+    def forget(self, gateway_name: str, sensor_name: str):
+        self._sensors.pop((gateway_name, sensor_name), None)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "windows": [window for window, _ in self.windows],
+            "sensors": len(self._sensors),
+        }
+
+    def _summarize(self, aggregates: SensorAggregates, rows: slice, live: np.ndarray, window: int) -> dict:
+        readings = int(aggregates.readings[rows][live].sum())
+        count = int(aggregates.count[rows][live].sum())
+        predictions = aggregates.predictions[rows][live].sum(axis=0)
+        prediction_counts = {str(c): int(n) for c, n in enumerate(predictions[:-1]) if n}
+        if predictions[-1]:
+            prediction_counts["other"] = int(predictions[-1])
+
+        channels = []
+        if count:
+            total = aggregates.sum[rows][live].sum(axis=0)
+            total_sq = aggregates.sumsq[rows][live].sum(axis=0)
+            mins = aggregates.min[rows][live].min(axis=0)
+            maxs = aggregates.max[rows][live].max(axis=0)
+            means = total / count
+            rms = np.sqrt(total_sq / count)
+            channels = [
+                {"min": float(mins[c]), "max": float(maxs[c]), "mean": float(means[c]), "rms": float(rms[c])}
+                for c in range(aggregates.channels)
+            ]
+        return {
+            "window_s": window,
+            "readings": readings,
+            "count": count,
+            "channels": channels,
+            "predictions": prediction_counts,
+        }
+
+
+sensor_aggregates = RollingAggregates(parse_windows(AGGREGATE_WINDOWS), AGGREGATE_PREDICTION_CLASSES)
@@ -0,0 +1,91 @@
+"""
+Micro-batching dispatcher.
+
+Concurrent requests submitted within `max_delay_ms` of each other (up to
+`max_batch_size` of them) are handed to a single `submit_batch` call, and each
+caller gets its own item of the batch result back through a future.
+"""
+
+import asyncio
+import collections
+from typing import Any, Awaitable, Callable, Optional
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        submit_batch: Callable[[list], Awaitable[list]],
+        max_batch_size: int,
+        max_delay_ms: int,
+    ):
+        self.submit_batch = submit_batch
+        self.max_batch_size = max_batch_size
+        self.max_delay_ms = max_delay_ms
+
+        self._pending: list[tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: set[asyncio.Task] = set()
+        self._stats = collections.Counter()
+
+    async def submit(self, item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        self._stats["items"] += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_delay_ms / 1000, self._flush
+            )
+        return await future
+
+    async def shutdown(self):
+        """
+        Dispatch whatever is pending and wait for in-flight batches.
+        """
+        self._flush()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_delay_ms": self.max_delay_ms,
+            "pending": len(self._pending),
+            "inflight_batches": len(self._inflight),
+            **self._stats,
+        }
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._dispatch(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: list[tuple[Any, asyncio.Future]]):
+        self._stats["batches"] += 1
+        items = [item for item, _ in batch]
+        try:
+            results = await self.submit_batch(items)
+            if len(results) != len(items):
+                raise RuntimeError(
+                    f"Batch returned {len(results)} results for {len(items)} items"
+                )
+        except Exception as exc:
+            self._stats["failed_batches"] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
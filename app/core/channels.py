@@ -0,0 +1,325 @@
+"""
+Persistent bidirectional channel between a gateway and the cloud API.
+
+A single WebSocket per gateway carries what would otherwise be one HTTP request
+per message: exports, latency benchmark exports and command responses travel
+upstream, and commands travel downstream. Messages are JSON text frames:
+
+    gateway -> cloud
+        {"type": "hello", "session": null | "<id>", "ack": m}    first frame, m: last command received
+        {"type": "<kind>", "seq": n, "body": {...}}              kind: a registered handler
+        {"type": "ack", "seq": m}                                downstream messages up to m received
+
+    cloud -> gateway
+        {"type": "welcome", "session": "<id>", "ack": n, "credits": c, "window": w, "resumed": bool}
+        {"type": "result", "seq": n, "status": 201, "detail": ..., "ack": n}
+        {"type": "<kind>", "seq": m, "body": {...}}              e.g. "command"
+
+Upstream messages are numbered by the gateway and downstream messages by the
+cloud, both from 1 and separately. Every upstream message gets a result, and
+the `ack` of a result or welcome is the highest seq up to which all upstream
+messages have been processed.
+
+Flow control: the gateway may have at most `credits` upstream messages without
+a result, and each result returns one credit. Upstream seqs must also stay
+within `window` of the ack, so a message stuck in processing holds back the
+gateway after `window` messages. A gateway that goes over its credits or its
+window is disconnected (policy violation).
+
+Resume: a session outlives its connection for `resume_ttl_s`. A gateway that
+reconnects with its session id gets the upstream ack in the welcome and resends
+the messages it has no result for. Messages that are still being processed, or
+whose result is still cached, are not processed twice: their result is sent
+(again) instead. Downstream messages the gateway has not acked are sent again
+after the welcome. Detached sessions past their resume TTL are dropped when a
+gateway connects, a message is pushed or the stats are read.
+
+SET sensor commands go down the channel of a connected gateway instead of
+through the command microservice (see `app.api.utils`). GET commands still go
+through the command microservice, which assigns the command uuids their
+responses are stored and retrieved by.
+"""
+
+import asyncio
+import collections
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+from pydantic_core import to_json
+from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
+
+from app.core.config import GATEWAY_CHANNEL_CREDITS, GATEWAY_CHANNEL_RESUME_TTL_S, GATEWAY_CHANNEL_OUTBOX_SIZE
+
+# handler(gateway_name, body) -> (status, detail)
+Handler = Callable[[str, dict], Awaitable[tuple[int, Any]]]
+
+HELLO_TIMEOUT_S = 10
+POLICY_VIOLATION = 1008
+INVALID_PAYLOAD = 1007
+GOING_AWAY = 1001
+
+
+def _is_seq(value: Any) -> bool:
+    # Sequence numbers and acks are non-negative integers (JSON true is not one)
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+class ChannelSession:
+    def __init__(self, gateway_name: str, results_size: int, outbox_size: int):
+        self.id = uuid.uuid4().hex
+        self.gateway_name = gateway_name
+        self.websocket: Optional[WebSocket] = None
+        self.detached_at = time.monotonic()
+        self.ack = 0
+        self.processed: set[int] = set()    # processed seqs above `ack`
+        self.pending: dict[int, asyncio.Task] = {}
+        self.results: collections.OrderedDict[int, dict] = collections.OrderedDict()
+        self.results_size = results_size
+        self.downstream_seq = 0
+        self.outbox: collections.OrderedDict[int, dict] = collections.OrderedDict()
+        self.outbox_size = outbox_size
+        self.send_lock = asyncio.Lock()
+
+    def complete(self, seq: int, result: dict):
+        self.pending.pop(seq, None)
+        self.results[seq] = result
+        while len(self.results) > self.results_size:
+            self.results.popitem(last=False)
+
+        self.processed.add(seq)
+        while self.ack + 1 in self.processed:
+            self.ack += 1
+            self.processed.remove(self.ack)
+        result["ack"] = self.ack
+
+    def acknowledge(self, seq: int):
+        while self.outbox and next(iter(self.outbox)) <= seq:
+            self.outbox.popitem(last=False)
+
+    def enqueue(self, kind: str, body: Any) -> dict:
+        self.downstream_seq += 1
+        message = {"type": kind, "seq": self.downstream_seq, "body": body}
+        self.outbox[self.downstream_seq] = message
+        if len(self.outbox) > self.outbox_size:
+            self.outbox.popitem(last=False)
+        return message
+
+
+class GatewayChannels:
+    def __init__(self, credits: int, resume_ttl_s: float, outbox_size: int):
+        self.credits = credits
+        # Results are cached for the whole window, so resent messages within it are recognized
+        self.window = 4 * credits
+        self.resume_ttl_s = resume_ttl_s
+        self.outbox_size = outbox_size
+        self.handlers: dict[str, Handler] = {}
+        self._sessions: dict[str, ChannelSession] = {}
+        self._by_gateway: dict[str, ChannelSession] = {}
+        self._stats = collections.Counter()
+
+    def register(self, kind: str, handler: Handler):
+        self.handlers[kind] = handler
+
+    async def serve(self, websocket: WebSocket, gateway_name: str):
+        """
+        Runs the channel of `gateway_name` over an accepted websocket until it
+        disconnects.
+        """
+        try:
+            hello = json.loads(await asyncio.wait_for(websocket.receive_text(), HELLO_TIMEOUT_S))
+        except (asyncio.TimeoutError, ValueError):
+            await websocket.close(code=POLICY_VIOLATION, reason="Expected a hello frame")
+            return
+        except WebSocketDisconnect:
+            return
+        if not isinstance(hello, dict) or hello.get("type") != "hello":
+            await websocket.close(code=POLICY_VIOLATION, reason="Expected a hello frame")
+            return
+        ack, session_id = hello.get("ack") or 0, hello.get("session")
+        if not _is_seq(ack) or not (session_id is None or isinstance(session_id, str)):
+            await websocket.close(code=INVALID_PAYLOAD, reason="Invalid hello frame")
+            return
+
+        session, resumed = await self._attach(websocket, gateway_name, session_id)
+        session.acknowledge(ack)
+        await self._send(session, {
+            "type": "welcome", "session": session.id, "ack": session.ack, "credits": self.credits, "window": self.window,
+            "resumed": resumed,
+        })
+        for message in list(session.outbox.values()):
+            await self._send(session, message)
+
+        try:
+            await self._receive(websocket, session)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if session.websocket is websocket:
+                session.websocket = None
+                session.detached_at = time.monotonic()
+            self._stats["disconnected"] += 1
+
+    async def push(self, gateway_name: str, kind: str, body: Any) -> Optional[int]:
+        """
+        Sends a message down the channel of `gateway_name`, returns its seq or
+        None if the gateway has no session. Messages to a detached session are
+        sent when it resumes.
+        """
+        self._expire()
+        session = self._by_gateway.get(gateway_name)
+        if session is None:
+            return None
+        message = session.enqueue(kind, body)
+        self._stats["pushed"] += 1
+        await self._send(session, message)
+        return message["seq"]
+
+    def connected(self, gateway_name: str) -> bool:
+        session = self._by_gateway.get(gateway_name)
+        return session is not None and session.websocket is not None
+
+    async def close(self):
+        for session in list(self._sessions.values()):
+            if session.websocket is not None:
+                try:
+                    await session.websocket.close(code=GOING_AWAY)
+                except RuntimeError:
+                    pass
+
+    @property
+    def stats(self) -> dict:
+        self._expire()
+        return {
+            **self._stats,
+            "sessions": len(self._sessions),
+            "connected": sum(session.websocket is not None for session in self._sessions.values()),
+            "gateways": {
+                gateway_name: {
+                    "session": session.id,
+                    "connected": session.websocket is not None,
+                    "ack": session.ack,
+                    "in_flight": len(session.pending),
+                    "downstream_seq": session.downstream_seq,
+                    "unacked_downstream": len(session.outbox),
+                }
+                for gateway_name, session in self._by_gateway.items()
+            },
+        }
+
+    async def _attach(self, websocket: WebSocket, gateway_name: str, session_id: Optional[str]):
+        self._expire()
+        session = self._sessions.get(session_id) if session_id else None
+        resumed = session is not None and session.gateway_name == gateway_name
+        if not resumed:
+            session = ChannelSession(gateway_name, results_size=self.window, outbox_size=self.outbox_size)
+            self._sessions[session.id] = session
+            previous = self._by_gateway.get(gateway_name)
+            if previous is not None:
+                self._sessions.pop(previous.id, None)
+        self._by_gateway[gateway_name] = session
+
+        # A newer connection of the gateway replaces the current one
+        if session.websocket is not None:
+            try:
+                await session.websocket.close(code=POLICY_VIOLATION, reason="Replaced by a newer connection")
+            except RuntimeError:
+                pass
+        session.websocket = websocket
+        self._stats["resumed" if resumed else "opened"] += 1
+        return session, resumed
+
+    def _expire(self):
+        deadline = time.monotonic() - self.resume_ttl_s
+        expired = [
+            session for session in self._sessions.values()
+            if session.websocket is None and session.detached_at < deadline and not session.pending
+        ]
+        for session in expired:
+            del self._sessions[session.id]
+            if self._by_gateway.get(session.gateway_name) is session:
+                del self._by_gateway[session.gateway_name]
+        self._stats["expired"] += len(expired)
+
+    async def _receive(self, websocket: WebSocket, session: ChannelSession):
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                kind, seq = message["type"], message.get("seq")
+            except (ValueError, KeyError, TypeError, AttributeError):
+                kind = None
+            if not isinstance(kind, str):
+                await websocket.close(code=INVALID_PAYLOAD, reason="Invalid frame")
+                return
+
+            if kind == "ack":
+                if not _is_seq(seq):
+                    await websocket.close(code=INVALID_PAYLOAD, reason="Invalid ack")
+                    return
+                session.acknowledge(seq)
+                continue
+            if not (_is_seq(seq) and seq > 0):
+                await websocket.close(code=INVALID_PAYLOAD, reason="Missing sequence number")
+                return
+
+            self._stats["received"] += 1
+            if seq in session.results:
+                # Resent after a reconnect: the result was already sent (or lost with the connection)
+                self._stats["duplicates"] += 1
+                await self._send(session, {**session.results[seq], "ack": session.ack})
+                continue
+            if seq in session.pending or seq <= session.ack or seq in session.processed:
+                # Still being processed (its result will be sent), or processed long ago
+                self._stats["duplicates"] += 1
+                if seq not in session.pending:
+                    await self._send(session, {
+                        "type": "result", "seq": seq, "status": 208, "detail": "Already processed", "ack": session.ack,
+                    })
+                continue
+            if seq > session.ack + self.window:
+                self._stats["window_violations"] += 1
+                await websocket.close(code=POLICY_VIOLATION, reason="Sequence number outside the window")
+                return
+            if len(session.pending) >= self.credits:
+                self._stats["credit_violations"] += 1
+                await websocket.close(code=POLICY_VIOLATION, reason="Out of credits")
+                return
+
+            session.pending[seq] = asyncio.create_task(self._process(session, seq, kind, message.get("body")))
+
+    async def _process(self, session: ChannelSession, seq: int, kind: str, body: Any):
+        # Every message completes, whatever happens, so its credit and the ack move on
+        status, detail = 500, "Internal error"
+        try:
+            handler = self.handlers.get(kind)
+            if handler is None:
+                status, detail = 400, f"Unknown message type: {kind}"
+            else:
+                status, detail = await handler(session.gateway_name, body)
+        except Exception as exc:
+            status, detail = 500, repr(exc)
+        finally:
+            self._stats[f"status_{status}"] += 1
+            result = {"type": "result", "seq": seq, "status": status, "detail": detail}
+            session.complete(seq, result)
+        await self._send(session, result)
+
+    async def _send(self, session: ChannelSession, message: dict):
+        websocket = session.websocket
+        if websocket is None or websocket.application_state != WebSocketState.CONNECTED:
+            return
+        async with session.send_lock:
+            try:
+                await websocket.send_text(to_json(message).decode())
+            except (RuntimeError, WebSocketDisconnect):
+                # The receive loop notices the disconnect; the message is
+                # resent (results, outbox) when the session resumes
+                pass
+
+
+gateway_channels = GatewayChannels(
+    credits=GATEWAY_CHANNEL_CREDITS,
+    resume_ttl_s=GATEWAY_CHANNEL_RESUME_TTL_S,
+    outbox_size=GATEWAY_CHANNEL_OUTBOX_SIZE,
+)
@@ -0,0 +1,139 @@
+"""
+Storage encodings of reading values.
+
+The data microservice stores the values of a reading as a string. The "json"
+codec keeps the plain JSON list of lists (15-20 bytes per sample); the binary
+codecs store "<codec id>:<base64 payload>", where the codec id is
+"<array encoding>+<compression>":
+
+    - array encodings: "f32" (float32, lossy: ~7 significant digits), "f16"
+      (float16, lossy: ~3 significant digits) and "delta" (float64 bit patterns
+      delta-encoded along the samples: lossless, every value decodes to the
+      same float as its JSON form; compresses better for slowly varying
+      signals).
+    - compressions: "zlib", "zstd" (requires the zstandard package) and "none".
+
+The payload starts with the (samples, channels) shape as two little-endian
+uint32. Decoding reads the codec id of the stored value, so readings stored with
+any codec (or before codecs existed) decode whatever the configured codec is.
+
+NumPy is only imported by the binary codecs, on first use: the default "json"
+codec doesn't load it.
+"""
+
+import base64
+import json
+import struct
+import zlib
+from typing import TYPE_CHECKING, Callable
+
+from app.core.config import READING_CODEC, READING_CODEC_LEVEL
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+if TYPE_CHECKING:
+    import numpy as np
+
+JSON_CODEC = "json"
+_SHAPE = struct.Struct("<II")
+
+
+def _from_bytes(payload: bytes, dtype: str, shape: tuple[int, int]) -> "np.ndarray":
+    import numpy as np
+    return np.frombuffer(payload, dtype=dtype).reshape(shape)
+
+
+def _delta_encode(values: "np.ndarray") -> bytes:
+    import numpy as np
+    # Integer deltas wrap around on overflow, and the cumulative sum wraps back
+    bits = values.astype("<f8").view("<i8")
+    return np.diff(bits, axis=0, prepend=np.zeros((1, bits.shape[1]), dtype="<i8")).tobytes()
+
+
+def _delta_decode(payload: bytes, shape: tuple[int, int]) -> "np.ndarray":
+    import numpy as np
+    deltas = np.frombuffer(payload, dtype="<i8").reshape(shape)
+    return np.cumsum(deltas, axis=0, dtype="<i8").view("<f8")
+
+
+# name: (encode, decode)
+ARRAY_ENCODINGS: dict[str, tuple[Callable[["np.ndarray"], bytes], Callable[[bytes, tuple[int, int]], "np.ndarray"]]] = {
+    "f32": (
+        lambda values: values.astype("<f4").tobytes(),
+        lambda payload, shape: _from_bytes(payload, "<f4", shape),
+    ),
+    "f16": (
+        lambda values: values.astype("<f2").tobytes(),
+        lambda payload, shape: _from_bytes(payload, "<f2", shape),
+    ),
+    "delta": (_delta_encode, _delta_decode),
+}
+
+# name: (compress(data, level), decompress)
+COMPRESSIONS: dict[str, tuple[Callable[[bytes, int], bytes], Callable[[bytes], bytes]]] = {
+    "none": (lambda data, level: data, lambda data: data),
+    "zlib": (zlib.compress, zlib.decompress),
+}
+if zstandard is not None:
+    COMPRESSIONS["zstd"] = (
+        lambda data, level: zstandard.ZstdCompressor(level=level).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+
+
+def _split(codec_id: str) -> tuple[str, str]:
+    encoding, _, compression = codec_id.partition("+")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError(f"Reading codec {codec_id} requires the zstandard package")
+    if encoding not in ARRAY_ENCODINGS or (compression or "none") not in COMPRESSIONS:
+        raise ValueError(f"Unsupported reading codec: {codec_id}")
+    return encoding, compression or "none"
+
+
+def decode_values(stored: str) -> list[list[float]]:
+    """
+    Values of a stored reading, whatever codec they were encoded with.
+    """
+    if stored.lstrip().startswith("["):
+        return json.loads(stored)
+
+    codec_id, _, payload = stored.partition(":")
+    encoding, compression = _split(codec_id)
+    data = COMPRESSIONS[compression][1](base64.b64decode(payload))
+    shape = _SHAPE.unpack_from(data)
+    values = ARRAY_ENCODINGS[encoding][1](data[_SHAPE.size:], shape)
+    return values.astype("<f8").tolist()
+
+
+class ReadingCodec:
+    def __init__(self, codec_id: str, level: int):
+        if codec_id != JSON_CODEC:
+            _split(codec_id)
+        self.codec_id = codec_id
+        self.level = level
+
+    def encode(self, values: list[list[float]]) -> str:
+        if self.codec_id == JSON_CODEC:
+            return json.dumps(values)
+
+        import numpy as np
+        try:
+            array = np.asarray(values, dtype=np.float64)
+        except (ValueError, TypeError):
+            array = None
+        if array is None or array.ndim != 2:
+            # Empty or ragged readings are kept as they are
+            return json.dumps(values)
+        encoding, compression = _split(self.codec_id)
+        data = _SHAPE.pack(*array.shape) + ARRAY_ENCODINGS[encoding][0](array)
+        payload = COMPRESSIONS[compression][0](data, self.level)
+        return f"{self.codec_id}:{base64.b64encode(payload).decode()}"
+
+    def decode(self, stored: str) -> list[list[float]]:
+        return decode_values(stored)
+
+
+reading_codec = ReadingCodec(READING_CODEC, READING_CODEC_LEVEL)
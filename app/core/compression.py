@@ -0,0 +1,166 @@
+"""
+HTTP body compression.
+
+Gateways may send compressed request bodies (`Content-Encoding: gzip`, `deflate`
+or `zstd`, the latter when the zstandard package is installed): the
+`RequestDecompressionMiddleware` inflates them chunk by chunk before the routes
+see them. The inflated size is capped, so a small compressed body (e.g. a
+"zip bomb") can't exhaust memory, and so is the compressed size of the bodies
+that are buffered before inflating (zstd): going over the cap answers 413.
+
+`compress` is used for bodies sent to the microservices (see
+UPSTREAM_COMPRESSION); responses are gzipped by starlette's GZipMiddleware.
+"""
+
+import gzip
+import zlib
+from typing import Callable
+
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class BodyTooLargeError(Exception):
+    pass
+
+
+class _ZlibDecompressor:
+    def __init__(self, wbits: int, max_size: int):
+        self._decompressor = zlib.decompressobj(wbits)
+        self._remaining = max_size
+
+    def decompress(self, data: bytes) -> bytes:
+        # Inflate at most one byte over the cap: enough to detect the overflow
+        # without inflating the rest of the chunk
+        output = self._decompressor.decompress(data, self._remaining + 1)
+        self._remaining -= len(output)
+        if self._remaining < 0 or self._decompressor.unconsumed_tail:
+            raise BodyTooLargeError()
+        return output
+
+    def flush(self) -> bytes:
+        if not self._decompressor.eof:
+            raise zlib.error("Truncated compressed body")
+        return b""
+
+
+class _ZstdDecompressor:
+    # zstandard can't cap the output of a streaming decompression, so the frame
+    # is buffered (up to the same cap) and inflated at once, after checking the
+    # size declared in its header
+    def __init__(self, max_size: int):
+        self._chunks = []
+        self._size = 0
+        self._max_size = max_size
+
+    def decompress(self, data: bytes) -> bytes:
+        self._size += len(data)
+        if self._size > self._max_size:
+            raise BodyTooLargeError()
+        self._chunks.append(data)
+        return b""
+
+    def flush(self) -> bytes:
+        data = b"".join(self._chunks)
+        declared_size = zstandard.frame_content_size(data)
+        if declared_size > self._max_size:
+            raise BodyTooLargeError()
+        output = zstandard.ZstdDecompressor().decompress(data, max_output_size=self._max_size)
+        if len(output) > self._max_size:
+            raise BodyTooLargeError()
+        return output
+
+
+# Content-Encoding: decompressor factory(max_size)
+DECOMPRESSORS: dict[str, Callable[[int], object]] = {
+    "gzip": lambda max_size: _ZlibDecompressor(16 + zlib.MAX_WBITS, max_size),
+    "deflate": lambda max_size: _ZlibDecompressor(zlib.MAX_WBITS, max_size),
+}
+# Content-Encoding: compress(data, level)
+COMPRESSORS: dict[str, Callable[[bytes, int], bytes]] = {
+    "gzip": lambda data, level: gzip.compress(data, compresslevel=level, mtime=0),
+    "deflate": zlib.compress,
+}
+if zstandard is not None:
+    DECOMPRESSORS["zstd"] = _ZstdDecompressor
+    COMPRESSORS["zstd"] = lambda data, level: zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    return COMPRESSORS[encoding](data, level)
+
+
+class RequestDecompressionMiddleware:
+    def __init__(self, app: ASGIApp, max_size: int):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = Headers(scope=scope).get("content-encoding", "identity").strip().lower()
+        if encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+
+        if encoding not in DECOMPRESSORS:
+            response = PlainTextResponse(
+                f"Unsupported Content-Encoding: {encoding}", status_code=415,
+                headers={"Accept-Encoding": ", ".join(DECOMPRESSORS)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            body = await self._inflate(receive, DECOMPRESSORS[encoding](self.max_size))
+        except BodyTooLargeError:
+            response = PlainTextResponse(f"Request body exceeds {self.max_size} bytes", status_code=413)
+            await response(scope, receive, send)
+            return
+        except (zlib.error, EOFError, ValueError) as exc:
+            response = PlainTextResponse(f"Invalid {encoding} body: {exc}", status_code=400)
+            await response(scope, receive, send)
+            return
+        except RuntimeError:
+            # zstandard raises ZstdError (a RuntimeError subclass) on corrupt input
+            response = PlainTextResponse(f"Invalid {encoding} body", status_code=400)
+            await response(scope, receive, send)
+            return
+
+        # The routes see a plain body of the inflated length
+        headers = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        headers.append((b"content-length", str(len(body)).encode()))
+        scope = {**scope, "headers": headers}
+
+        sent = False
+
+        async def receive_inflated() -> Message:
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, receive_inflated, send)
+
+    async def _inflate(self, receive: Receive, decompressor) -> bytes:
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            more_body = message.get("more_body", False)
+            chunks.append(decompressor.decompress(message.get("body", b"")))
+        chunks.append(decompressor.flush())
+        return b"".join(chunks)
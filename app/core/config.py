@@ -1,4 +1,5 @@
 import os
+import importlib.util
 from dotenv import load_dotenv
 
 # Retrieve enviroment variables from .env file
@@ -14,6 +15,140 @@ LATENCY_BENCHMARK: bool = bool(int(os.environ.get("LATENCY_BENCHMARK", "0")))
 ADAPTIVE_INFERENCE: bool = bool(int(os.environ.get("ADAPTIVE_INFERENCE", "1")))
 POLLING_INTERVAL_MS: int = int(os.environ.get("POLLING_INTERVAL_MS", "100"))
 
+# Local in-process cloud inference, used by default when no inference microservice is configured
+LOCAL_INFERENCE: bool = bool(int(os.environ.get("LOCAL_INFERENCE", "0" if INFERENCE_MICROSERVICE_URL else "1")))
+# "tflite" when a TensorFlow Lite runtime is installed, else the "stand-in" model (no model upload needed)
+_TFLITE_AVAILABLE = any(importlib.util.find_spec(module) for module in ("tflite_runtime", "tensorflow"))
+LOCAL_INFERENCE_MODEL_LOADER: str = os.environ.get("LOCAL_INFERENCE_MODEL_LOADER", "tflite" if _TFLITE_AVAILABLE else "stand-in")
+LOCAL_INFERENCE_EXECUTOR: str = os.environ.get("LOCAL_INFERENCE_EXECUTOR", "process")
+LOCAL_INFERENCE_WORKERS: int = int(os.environ.get("LOCAL_INFERENCE_WORKERS", str(os.cpu_count() or 1)))
+# Uploaded models are saved here and polled by every server worker; empty keeps them in the uploading worker only
+LOCAL_INFERENCE_MODEL_PATH: str = os.environ.get("LOCAL_INFERENCE_MODEL_PATH", "/tmp/esn-cloud-api/cloud_model.bin")
+LOCAL_INFERENCE_MODEL_POLL_S: float = float(os.environ.get("LOCAL_INFERENCE_MODEL_POLL_S", "5"))
+
+# Upstream (microservice) connections per priority lane: operator commands, gateway
+# command-response callbacks, and bulk ingest (everything else)
+UPSTREAM_TIMEOUT_S: float = float(os.environ.get("UPSTREAM_TIMEOUT_S", "20"))
+UPSTREAM_COMMAND_CONNECTIONS: int = int(os.environ.get("UPSTREAM_COMMAND_CONNECTIONS", "16"))
+UPSTREAM_CALLBACK_CONNECTIONS: int = int(os.environ.get("UPSTREAM_CALLBACK_CONNECTIONS", "16"))
+UPSTREAM_INGEST_CONNECTIONS: int = int(os.environ.get("UPSTREAM_INGEST_CONNECTIONS", "100"))
+
+# Micro-batching of cloud inference requests
+INFERENCE_BATCHING: bool = bool(int(os.environ.get("INFERENCE_BATCHING", "0")))
+INFERENCE_BATCH_SIZE: int = int(os.environ.get("INFERENCE_BATCH_SIZE", "32"))
+INFERENCE_BATCH_DELAY_MS: int = int(os.environ.get("INFERENCE_BATCH_DELAY_MS", "10"))
+
+# Idempotent /export/sensor-data retries, keyed by (gateway, sensor, reading uuid). A TTL of 0 disables it.
+EXPORT_IDEMPOTENCY_TTL_S: float = float(os.environ.get("EXPORT_IDEMPOTENCY_TTL_S", "300"))
+EXPORT_IDEMPOTENCY_MAX_ENTRIES: int = int(os.environ.get("EXPORT_IDEMPOTENCY_MAX_ENTRIES", "100000"))
+
+# Rolling per-sensor aggregates of the ingested readings, over "window_s:buckets" windows
+AGGREGATES: bool = bool(int(os.environ.get("AGGREGATES", "0")))
+AGGREGATE_WINDOWS: str = os.environ.get("AGGREGATE_WINDOWS", "60:12,3600:60,86400:24")
+AGGREGATE_PREDICTION_CLASSES: int = int(os.environ.get("AGGREGATE_PREDICTION_CLASSES", "8"))
+
+# Reading features (RMS, peak, crest factor, spectral bands), sent with the reading to the data microservice
+# (which must have a `features` field to keep them): "none", "cloud" (cloud-layer readings) or "all".
+# The gate always computes them for cloud-layer readings.
+READING_FEATURES: str = os.environ.get("READING_FEATURES", "none")
+READING_FEATURE_BANDS: int = int(os.environ.get("READING_FEATURE_BANDS", "4"))
+
+# Pre-inference gate: cloud-layer readings within these limits get a local "normal" prediction
+# instead of going to the inference microservice. Empty disables it.
+INFERENCE_GATE: str = os.environ.get("INFERENCE_GATE", "")
+INFERENCE_GATE_MAX_RMS: float = float(os.environ.get("INFERENCE_GATE_MAX_RMS", "0.5"))
+INFERENCE_GATE_MAX_PEAK: float = float(os.environ.get("INFERENCE_GATE_MAX_PEAK", "2"))
+INFERENCE_GATE_MAX_CREST: float = float(os.environ.get("INFERENCE_GATE_MAX_CREST", "4"))
+INFERENCE_GATE_NORMAL_PREDICTION: int = int(os.environ.get("INFERENCE_GATE_NORMAL_PREDICTION", "0"))
+
+# Storage encoding of reading values, see app.core.codecs: json, or <f32|f16|delta>+<zlib|zstd|none>
+READING_CODEC: str = os.environ.get("READING_CODEC", "json")
+READING_CODEC_LEVEL: int = int(os.environ.get("READING_CODEC_LEVEL", "3"))
+
+# Persistent gateway websocket channel (exports, command responses and commands), see app.core.channels
+GATEWAY_CHANNEL: bool = bool(int(os.environ.get("GATEWAY_CHANNEL", "1")))
+GATEWAY_CHANNEL_CREDITS: int = int(os.environ.get("GATEWAY_CHANNEL_CREDITS", "32"))
+GATEWAY_CHANNEL_RESUME_TTL_S: float = float(os.environ.get("GATEWAY_CHANNEL_RESUME_TTL_S", "120"))
+GATEWAY_CHANNEL_OUTBOX_SIZE: int = int(os.environ.get("GATEWAY_CHANNEL_OUTBOX_SIZE", "1000"))
+
+# Last-write-wins outbox of SET sensor commands, coalesced per (sensor, property) and paced per gateway
+COMMAND_OUTBOX: bool = bool(int(os.environ.get("COMMAND_OUTBOX", "0")))
+COMMAND_OUTBOX_DELAY_MS: int = int(os.environ.get("COMMAND_OUTBOX_DELAY_MS", "250"))
+COMMAND_OUTBOX_JITTER_MS: int = int(os.environ.get("COMMAND_OUTBOX_JITTER_MS", "500"))
+COMMAND_OUTBOX_GATEWAY_INTERVAL_MS: int = int(os.environ.get("COMMAND_OUTBOX_GATEWAY_INTERVAL_MS", "200"))
+COMMAND_OUTBOX_MAX_RETRIES: int = int(os.environ.get("COMMAND_OUTBOX_MAX_RETRIES", "3"))
+
+# HTTP body compression: compressed request bodies (Content-Encoding gzip, deflate or zstd) are inflated
+# up to REQUEST_DECOMPRESSION_MAX_BYTES; responses over RESPONSE_COMPRESSION_MIN_BYTES are gzipped if accepted
+REQUEST_DECOMPRESSION_MAX_BYTES: int = int(os.environ.get("REQUEST_DECOMPRESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_COMPRESSION: bool = bool(int(os.environ.get("RESPONSE_COMPRESSION", "1")))
+RESPONSE_COMPRESSION_MIN_BYTES: int = int(os.environ.get("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+RESPONSE_COMPRESSION_LEVEL: int = int(os.environ.get("RESPONSE_COMPRESSION_LEVEL", "5"))
+
+# Compression of the request bodies sent to the microservices, which must accept it: "" (disabled), gzip, deflate or zstd (zstandard package)
+UPSTREAM_COMPRESSION: str = os.environ.get("UPSTREAM_COMPRESSION", "")
+UPSTREAM_COMPRESSION_MIN_BYTES: int = int(os.environ.get("UPSTREAM_COMPRESSION_MIN_BYTES", "4096"))
+UPSTREAM_COMPRESSION_LEVEL: int = int(os.environ.get("UPSTREAM_COMPRESSION_LEVEL", "3"))
+
+# Local cache of the gateway and sensor read responses, with ETags for conditional GETs.
+# Entries are invalidated by the routes that change them; the TTL bounds changes made elsewhere.
+ENTITY_CACHE_TTL_S: float = float(os.environ.get("ENTITY_CACHE_TTL_S", "30"))
+ENTITY_CACHE_MAX_ENTRIES: int = int(os.environ.get("ENTITY_CACHE_MAX_ENTRIES", "10000"))
+ENTITY_CACHE_CONTROL: str = os.environ.get("ENTITY_CACHE_CONTROL", "private, no-cache")
+
+# Last-known sensor property values (state, inference layer, config), least recently observed sensors evicted first
+LAST_KNOWN_MAX_SENSORS: int = int(os.environ.get("LAST_KNOWN_MAX_SENSORS", "100000"))
+
+# Token-bucket admission control of /export/sensor-data, keyed by gateway or sensor.
+# Rates follow the sensors' sleep_interval_ms (with headroom), DEFAULT_RATE per sensor without a known config.
+# Configs stored in the data microservice are cached for CONFIG_TTL_S; configs observed since override them.
+EXPORT_RATE_LIMIT: bool = bool(int(os.environ.get("EXPORT_RATE_LIMIT", "0")))
+EXPORT_RATE_LIMIT_KEY: str = os.environ.get("EXPORT_RATE_LIMIT_KEY", "gateway")  # gateway or sensor
+EXPORT_RATE_LIMIT_DEFAULT_RATE: float = float(os.environ.get("EXPORT_RATE_LIMIT_DEFAULT_RATE", "1"))
+EXPORT_RATE_LIMIT_MIN_RATE: float = float(os.environ.get("EXPORT_RATE_LIMIT_MIN_RATE", "1"))
+EXPORT_RATE_LIMIT_HEADROOM: float = float(os.environ.get("EXPORT_RATE_LIMIT_HEADROOM", "2"))
+EXPORT_RATE_LIMIT_BURST_S: float = float(os.environ.get("EXPORT_RATE_LIMIT_BURST_S", "5"))
+EXPORT_RATE_LIMIT_CONFIG_TTL_S: float = float(os.environ.get("EXPORT_RATE_LIMIT_CONFIG_TTL_S", "300"))
+
+# Durable local ingest journal, enabled by setting INGEST_JOURNAL_DIR
+INGEST_JOURNAL_DIR: str = os.environ.get("INGEST_JOURNAL_DIR")
+INGEST_JOURNAL_SEGMENT_BYTES: int = int(os.environ.get("INGEST_JOURNAL_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+# Disk budget of each worker's journal slot: N workers may use up to N times this
+INGEST_JOURNAL_SLOT_MAX_BYTES: int = int(os.environ.get("INGEST_JOURNAL_SLOT_MAX_BYTES", str(1024 * 1024 * 1024)))
+INGEST_JOURNAL_FSYNC_POLICY: str = os.environ.get("INGEST_JOURNAL_FSYNC_POLICY", "interval")  # always, interval or never
+INGEST_JOURNAL_FSYNC_INTERVAL_MS: int = int(os.environ.get("INGEST_JOURNAL_FSYNC_INTERVAL_MS", "1000"))
+INGEST_JOURNAL_REPLAY_BATCH_SIZE: int = int(os.environ.get("INGEST_JOURNAL_REPLAY_BATCH_SIZE", "256"))
+INGEST_JOURNAL_REPLAY_INTERVAL_MS: int = int(os.environ.get("INGEST_JOURNAL_REPLAY_INTERVAL_MS", "200"))
+INGEST_JOURNAL_REPLAY_MAX_BACKOFF_MS: int = int(os.environ.get("INGEST_JOURNAL_REPLAY_MAX_BACKOFF_MS", "30000"))
+
+# In-memory registry of gateways and sensors, synced from the data microservice
+DEVICE_REGISTRY: bool = bool(int(os.environ.get("DEVICE_REGISTRY", "1")))
+DEVICE_REGISTRY_SYNC_INTERVAL_S: float = float(os.environ.get("DEVICE_REGISTRY_SYNC_INTERVAL_S", "30"))
+DEVICE_REGISTRY_FULL_SYNC_INTERVAL_S: float = float(os.environ.get("DEVICE_REGISTRY_FULL_SYNC_INTERVAL_S", "600"))
+
+# Event-loop diagnostics (admin /diagnostics): lag monitor and slow-callback watchdog, on-demand sampling profiler
+LOOP_MONITOR: bool = bool(int(os.environ.get("LOOP_MONITOR", "0")))
+LOOP_MONITOR_INTERVAL_MS: int = int(os.environ.get("LOOP_MONITOR_INTERVAL_MS", "100"))
+SLOW_CALLBACK_THRESHOLD_MS: int = int(os.environ.get("SLOW_CALLBACK_THRESHOLD_MS", "250"))
+SAMPLING_PROFILER: bool = bool(int(os.environ.get("SAMPLING_PROFILER", "0")))
+SAMPLING_PROFILER_MAX_SECONDS: float = float(os.environ.get("SAMPLING_PROFILER_MAX_SECONDS", "60"))
+
+# Background task executor (ingest side effects)
+BACKGROUND_TASK_WORKERS: int = int(os.environ.get("BACKGROUND_TASK_WORKERS", "8"))
+BACKGROUND_TASK_QUEUE_SIZE: int = int(os.environ.get("BACKGROUND_TASK_QUEUE_SIZE", "10000"))
+BACKGROUND_TASK_MAX_RETRIES: int = int(os.environ.get("BACKGROUND_TASK_MAX_RETRIES", "3"))
+BACKGROUND_TASK_RETRY_DELAY_MS: int = int(os.environ.get("BACKGROUND_TASK_RETRY_DELAY_MS", "500"))
+BACKGROUND_TASK_DEAD_LETTER_SIZE: int = int(os.environ.get("BACKGROUND_TASK_DEAD_LETTER_SIZE", "1000"))
+BACKGROUND_TASK_SHUTDOWN_TIMEOUT_S: float = float(os.environ.get("BACKGROUND_TASK_SHUTDOWN_TIMEOUT_S", "10"))
+
+# Production server (app.server)
+SERVER_APP: str = os.environ.get("SERVER_APP", "full")  # full or ingest
+SERVER_HOST: str = os.environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT: int = int(os.environ.get("CLOUD_API_PORT", "8010"))
+# More than one worker requires AGGREGATES, GATEWAY_CHANNEL and DEVICE_REGISTRY off, see app.server
+SERVER_WORKERS: int = int(os.environ.get("SERVER_WORKERS", "1"))
+SERVER_GRACEFUL_SHUTDOWN_TIMEOUT_S: int = int(os.environ.get("SERVER_GRACEFUL_SHUTDOWN_TIMEOUT_S", "30"))
+
 CLOUD_INFERENCE_LAYER: int = 2
 GATEWAY_INFERENCE_LAYER: int = 1
 SENSOR_INFERENCE_LAYER: int = 0
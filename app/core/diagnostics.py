@@ -0,0 +1,163 @@
+"""
+Event-loop diagnostics: lag monitor, slow-callback watchdog and sampling profiler.
+
+Blocking work on the event loop (compression, base64, big JSON dumps, validation
+of huge payloads) stalls every request of the worker. To find it:
+
+    - The lag monitor is a task that sleeps `interval_ms` and measures how late
+      it wakes up: the event-loop lag.
+    - The watchdog is a thread that checks the monitor's heartbeat. When the loop
+      hasn't ticked for `slow_callback_ms`, the callback running on it is stuck:
+      the watchdog captures the loop thread's stack while it is still blocked,
+      logs it and keeps it in a bounded list.
+    - The sampling profiler samples the loop thread's stack (or every thread's)
+      from another thread for a few seconds, and returns the collapsed stacks
+      ("frame;frame;frame count" lines) that flamegraph tools read.
+
+Nothing runs unless enabled: the monitor and watchdog are started by the app's
+lifespan if LOOP_MONITOR is set, and the profiler only samples on demand.
+"""
+
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app.core.config import LOOP_MONITOR_INTERVAL_MS, SLOW_CALLBACK_THRESHOLD_MS
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    def __init__(self, interval_ms: int, slow_callback_ms: int, history_size: int = 600, slow_callbacks_size: int = 100):
+        self.interval_ms = interval_ms
+        self.slow_callback_ms = slow_callback_ms
+        self.loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._heartbeat = 0.0
+        self._lags_ms: collections.deque = collections.deque(maxlen=history_size)
+        self._slow_callbacks: collections.deque = collections.deque(maxlen=slow_callbacks_size)
+        self._stats = collections.Counter()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self.loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._run(), name="loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog.join(timeout=1)
+        self._watchdog = None
+
+    @property
+    def stats(self) -> dict:
+        lags = sorted(self._lags_ms)
+        return {
+            "running": self.running,
+            "interval_ms": self.interval_ms,
+            "slow_callback_ms": self.slow_callback_ms,
+            "lag_ms": {
+                "last": self._lags_ms[-1] if lags else 0,
+                "avg": sum(lags) / len(lags) if lags else 0,
+                "p99": lags[int(0.99 * (len(lags) - 1))] if lags else 0,
+                "max": lags[-1] if lags else 0,
+                "samples": len(lags),
+            },
+            **self._stats,
+        }
+
+    @property
+    def slow_callbacks(self) -> list[dict]:
+        return list(self._slow_callbacks)
+
+    async def _run(self):
+        interval_s = self.interval_ms / 1000
+        while True:
+            expected = time.monotonic() + interval_s
+            await asyncio.sleep(interval_s)
+            now = time.monotonic()
+            self._heartbeat = now
+            self._lags_ms.append(max(0.0, (now - expected) * 1000))
+
+    def _watch(self):
+        threshold_s = self.slow_callback_ms / 1000
+        reported = None    # heartbeat of the stall already reported
+        while not self._stopped.wait(threshold_s / 4):
+            heartbeat = self._heartbeat
+            stalled_s = time.monotonic() - heartbeat - self.interval_ms / 1000
+            if stalled_s < threshold_s or reported == heartbeat:
+                continue
+            reported = heartbeat
+
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            self._stats["slow_callbacks"] += 1
+            self._slow_callbacks.append({"detected_at": time.time(), "blocked_ms": stalled_s * 1000, "stack": stack})
+            logger.warning("Event loop blocked for more than %.0f ms in:\n%s", stalled_s * 1000, stack)
+
+
+def _collapse(frame) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def sample(self, seconds: float, interval_ms: float, thread_id: Optional[int] = None) -> str:
+        """
+        Samples the stacks of `thread_id` (every other thread if None) for
+        `seconds`, blocking the calling thread: run it off the event loop.
+        Returns the collapsed stacks, most frequent first.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            own_id = threading.get_ident()
+            counts = collections.Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for frame_thread_id, frame in sys._current_frames().items():
+                    if frame_thread_id == own_id or (thread_id is not None and frame_thread_id != thread_id):
+                        continue
+                    counts[_collapse(frame)] += 1
+                time.sleep(interval_ms / 1000)
+        finally:
+            self._lock.release()
+        return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+loop_monitor = LoopMonitor(LOOP_MONITOR_INTERVAL_MS, SLOW_CALLBACK_THRESHOLD_MS)
+sampling_profiler = SamplingProfiler()
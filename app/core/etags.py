@@ -0,0 +1,86 @@
+"""
+Entity tags and a local cache of read responses, for conditional GETs.
+
+Read routes keep the body they got from the data microservice together with a
+weak ETag (a hash of the body) for `ttl_s` seconds. The tag is weak because
+the same tag is sent with the identity and the gzipped response, which are not
+byte-identical. A request whose
+`If-None-Match` matches the cached ETag gets a 304 and a request without it gets
+the cached body, neither of them calling the data microservice. Routes that
+create or update an entity invalidate its entries (see `invalidate`), and the
+TTL bounds how long changes made outside the cloud API go unnoticed.
+"""
+
+import collections
+import hashlib
+import time
+from typing import Hashable, Optional
+
+from app.core.config import ENTITY_CACHE_TTL_S, ENTITY_CACHE_MAX_ENTRIES
+
+
+def entity_tag(body: bytes) -> str:
+    return 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match uses the weak comparison: W/"x" matches "x".
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque_tag for tag in if_none_match.split(","))
+
+
+class CachedEntity:
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, ttl_s: float):
+        self.body = body
+        self.etag = entity_tag(body)
+        self.expires_at = time.monotonic() + ttl_s
+
+
+class EntityCache:
+    def __init__(self, ttl_s: float, max_entries: int):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries: collections.OrderedDict[Hashable, CachedEntity] = collections.OrderedDict()
+        self._stats = collections.Counter()
+
+    def get(self, key: Hashable) -> Optional[CachedEntity]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return entry
+
+    def put(self, key: Hashable, body: bytes) -> CachedEntity:
+        entry = self._entries[key] = CachedEntity(body, self.ttl_s)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, *keys: Hashable):
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def count_not_modified(self):
+        self._stats["not_modified"] += 1
+
+    @property
+    def stats(self) -> dict:
+        return {**self._stats, "entries": len(self._entries), "ttl_s": self.ttl_s}
+
+
+entity_cache = EntityCache(ENTITY_CACHE_TTL_S, ENTITY_CACHE_MAX_ENTRIES)
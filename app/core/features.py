@@ -0,0 +1,141 @@
+"""
+Reading features and the pre-inference gate.
+
+Features are cheap per-channel statistics of a vibration window: RMS, peak
+(max absolute value), crest factor (peak / RMS) and the share of the signal
+energy in each of `bands` equal-width frequency bands, computed with NumPy over
+the (samples, channels) array of a reading. NumPy is imported on first use, so
+the gate and a disabled extractor don't load it.
+
+The gate looks at the features of a cloud-layer reading before it is sent to
+the inference microservice: obviously normal readings get a local prediction,
+the others (gate returns None) are forwarded. Gates are pluggable:
+
+    - "threshold": normal when every channel is within the RMS, peak and crest
+      factor limits.
+
+Register other gates with `register_gate(name, factory)`. Gates are resolved when
+the `InferenceGate` is created, so an unknown INFERENCE_GATE fails at import;
+a gate registered afterwards is used through its own `InferenceGate(name)`.
+"""
+
+import collections
+from typing import Callable, Optional, Protocol
+
+from app.core.config import (
+    READING_FEATURE_BANDS,
+    INFERENCE_GATE,
+    INFERENCE_GATE_MAX_RMS,
+    INFERENCE_GATE_MAX_PEAK,
+    INFERENCE_GATE_MAX_CREST,
+    INFERENCE_GATE_NORMAL_PREDICTION,
+)
+
+
+class FeatureExtractor:
+    def __init__(self, bands: int):
+        self.bands = bands
+
+    def extract(self, values: list[list[float]]) -> Optional[dict[str, list]]:
+        """
+        Features of one reading (samples x channels): "rms", "peak" and "crest"
+        per channel, "bands" per channel and band. None if the reading is empty
+        or isn't a (samples x channels) array of numbers (e.g. ragged rows).
+        """
+        import numpy as np
+        try:
+            reading = np.asarray(values, dtype=np.float64)
+        except (ValueError, TypeError):
+            return None
+        if reading.ndim != 2 or reading.size == 0:
+            return None
+
+        rms = np.sqrt(np.mean(np.square(reading), axis=0))
+        peak = np.max(np.abs(reading), axis=0)
+        crest = np.divide(peak, rms, out=np.zeros_like(peak), where=rms > 0)
+
+        # Energy share per frequency band of the mean-removed signal
+        spectrum = np.abs(np.fft.rfft(reading - reading.mean(axis=0), axis=0)) ** 2
+        edges = np.linspace(0, spectrum.shape[0], self.bands + 1).astype(int)
+        cumulative = np.concatenate((np.zeros_like(spectrum[:1]), np.cumsum(spectrum, axis=0)))
+        bands = cumulative[edges[1:]] - cumulative[edges[:-1]]
+        total = bands.sum(axis=0)
+        bands = np.divide(bands, total, out=np.zeros_like(bands), where=total > 0)
+
+        return {"rms": rms.tolist(), "peak": peak.tolist(), "crest": crest.tolist(), "bands": bands.T.tolist()}
+
+
+class Gate(Protocol):
+    def decide(self, features: dict[str, list]) -> Optional[int]:
+        """
+        Returns the prediction of an obviously normal reading, or None if the
+        reading must go to the inference microservice.
+        """
+        ...
+
+
+class ThresholdGate:
+    def __init__(self, max_rms: float, max_peak: float, max_crest: float, normal_prediction: int):
+        self.max_rms = max_rms
+        self.max_peak = max_peak
+        self.max_crest = max_crest
+        self.normal_prediction = normal_prediction
+
+    def decide(self, features: dict[str, list]) -> Optional[int]:
+        if (
+            max(features["rms"]) <= self.max_rms
+            and max(features["peak"]) <= self.max_peak
+            and max(features["crest"]) <= self.max_crest
+        ):
+            return self.normal_prediction
+        return None
+
+
+GATES: dict[str, Callable[[], Gate]] = {
+    "threshold": lambda: ThresholdGate(
+        INFERENCE_GATE_MAX_RMS, INFERENCE_GATE_MAX_PEAK, INFERENCE_GATE_MAX_CREST, INFERENCE_GATE_NORMAL_PREDICTION
+    ),
+}
+
+
+def register_gate(name: str, factory: Callable[[], Gate]):
+    GATES[name] = factory
+
+
+class InferenceGate:
+    """
+    Runs the configured gate and counts how many inference calls it saved.
+    """
+
+    def __init__(self, name: Optional[str]):
+        self.name = name or None
+        if self.name is not None and self.name not in GATES:
+            raise ValueError(f"Unknown inference gate: {self.name}, must be one of: {', '.join(GATES)}")
+        self._gate: Optional[Gate] = GATES[self.name]() if self.name is not None else None
+        self._stats = collections.Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.name is not None
+
+    def decide(self, features: Optional[dict[str, list]]) -> Optional[int]:
+        if not self.enabled or features is None:
+            return None
+
+        prediction = self._gate.decide(features)
+        self._stats["short_circuited" if prediction is not None else "forwarded"] += 1
+        return prediction
+
+    @property
+    def stats(self) -> dict:
+        evaluated = self._stats["short_circuited"] + self._stats["forwarded"]
+        return {
+            "gate": self.name,
+            "evaluated": evaluated,
+            **self._stats,
+            "saved_fraction": self._stats["short_circuited"] / evaluated if evaluated else 0,
+        }
+
+
+feature_extractor = FeatureExtractor(READING_FEATURE_BANDS)
+inference_gate = InferenceGate(INFERENCE_GATE)
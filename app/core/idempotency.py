@@ -0,0 +1,92 @@
+"""
+Idempotency layer for retried requests.
+
+Requests are identified by a caller-provided key. While a request is in flight,
+duplicates join it instead of running again; once it completes successfully its
+outcome is remembered for `ttl_s` seconds and returned to later duplicates. Failed
+requests are forgotten right away so that a retry runs them again.
+"""
+
+import asyncio
+import collections
+import time
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from app.core.config import EXPORT_IDEMPOTENCY_TTL_S, EXPORT_IDEMPOTENCY_MAX_ENTRIES
+
+
+class _Entry:
+    __slots__ = ("future", "expires_at")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.expires_at: Optional[float] = None    # None while in flight
+
+
+class IdempotencyCache:
+    def __init__(self, ttl_s: float, max_entries: int):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries: collections.OrderedDict[Hashable, _Entry] = collections.OrderedDict()
+        self._stats = collections.Counter()
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable]) -> Any:
+        now = time.monotonic()
+        self._evict(now)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at is None:
+                self._stats["joined"] += 1
+                return await asyncio.shield(entry.future)
+            if entry.expires_at > now:
+                self._stats["hits"] += 1
+                return entry.future.result()
+            del self._entries[key]
+
+        self._stats["misses"] += 1
+        entry = _Entry(asyncio.get_running_loop().create_future())
+        self._entries[key] = entry
+        try:
+            result = await func()
+        except BaseException as exc:
+            self._entries.pop(key, None)
+            if isinstance(exc, asyncio.CancelledError):
+                entry.future.cancel()
+            else:
+                entry.future.set_exception(exc)
+                entry.future.exception()    # joiners may not exist, mark it as retrieved
+            raise
+
+        entry.future.set_result(result)
+        entry.expires_at = time.monotonic() + self.ttl_s
+        self._entries.move_to_end(key)  # keep entries ordered by expiry
+        return result
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "ttl_s": self.ttl_s,
+            "entries": len(self._entries),
+            **self._stats,
+        }
+
+    def _evict(self, now: float):
+        # Completed entries are kept ordered by expiry, in-flight ones are skipped
+        evicted = []
+        for key, entry in self._entries.items():
+            if entry.expires_at is None:
+                continue
+            if entry.expires_at > now and len(self._entries) - len(evicted) <= self.max_entries:
+                break
+            evicted.append(key)
+
+        for key in evicted:
+            del self._entries[key]
+        self._stats["evicted"] += len(evicted)
+
+
+export_idempotency = IdempotencyCache(
+    ttl_s=EXPORT_IDEMPOTENCY_TTL_S,
+    max_entries=EXPORT_IDEMPOTENCY_MAX_ENTRIES,
+)
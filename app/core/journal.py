@@ -0,0 +1,510 @@
+"""
+Durable local ingest journal.
+
+An append-only log of opaque records stored in fixed-size, memory-mapped segment
+files. Ingest appends a record and returns; a `JournalReplayer` drains records in
+batches into their final destination and advances a checkpoint, deleting fully
+replayed segments.
+
+Segment files are named after the sequence number of their first record and are
+preallocated (zero-filled), so a zero length header marks the end of the written
+part of a segment. Each record is:
+
+    length (u32) | crc32 of payload (u32) | sequence (u64) | payload
+
+On open, segments are scanned and the log is cut at the first torn or corrupt
+record, so a crash mid-append loses at most the record being written.
+
+A journal directory is owned by one process at a time (flock). With several
+server workers, each worker opens a "slotted" journal: it locks the first free
+`slot-<n>` subdirectory of the configured directory. Slots left with pending
+records by workers that are gone (e.g. after restarting with fewer workers) are
+adopted and drained by the replayer of a live worker. The disk budget applies
+to each slot, so the journal as a whole may hold up to one budget per worker.
+
+Records the destination rejects for good (e.g. a 4xx for a deleted sensor) are
+moved to a bounded dead-letter list and replayed past, so they can't block the
+journal; only transient failures are retried.
+
+Fsync policies:
+    - "always": msync after every append (survives power loss, slowest).
+    - "interval": msync every `fsync_interval_ms`, from a timer of the replayer.
+    - "never": leave write-back to the OS (survives process crashes only).
+"""
+
+import asyncio
+import collections
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Awaitable, Callable, Optional
+
+from app.core.config import (
+    INGEST_JOURNAL_DIR,
+    INGEST_JOURNAL_SEGMENT_BYTES,
+    INGEST_JOURNAL_SLOT_MAX_BYTES,
+    INGEST_JOURNAL_FSYNC_POLICY,
+    INGEST_JOURNAL_FSYNC_INTERVAL_MS,
+    INGEST_JOURNAL_REPLAY_BATCH_SIZE,
+    INGEST_JOURNAL_REPLAY_INTERVAL_MS,
+    INGEST_JOURNAL_REPLAY_MAX_BACKOFF_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<IIQ")
+_CHECKPOINT = struct.Struct("<Q")
+_SEGMENT_SUFFIX = ".seg"
+_CHECKPOINT_FILE = "checkpoint"
+_LOCK_FILE = ".lock"
+_SLOT_PREFIX = "slot-"
+_MAX_SLOTS = 1024
+_ORPHAN_SCAN_INTERVAL_S = 30
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+class JournalFullError(Exception):
+    pass
+
+
+class JournalLockedError(Exception):
+    pass
+
+
+def _lock_directory(directory: str) -> int:
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(os.path.join(directory, _LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        raise JournalLockedError(f"Journal directory {directory} is locked by another process")
+    return fd
+
+
+class _Segment:
+    def __init__(self, path: str, first_seq: int, size: int):
+        self.path = path
+        self.first_seq = first_seq
+        self.last_seq = first_seq - 1
+        self.write_offset = 0
+
+        self._file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        if os.fstat(self._file.fileno()).st_size < size:
+            self._file.truncate(size)
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.mmap = mmap.mmap(self._file.fileno(), self.size)
+
+    def records(self, start: int = 0):
+        """
+        Yields (offset, seq, payload) for each valid record from `start`, stopping
+        at the end of the written part or at the first torn/corrupt record.
+        """
+        offset = start
+        while offset + _HEADER.size <= self.size:
+            length, crc, seq = _HEADER.unpack_from(self.mmap, offset)
+            end = offset + _HEADER.size + length
+            if length == 0 or end > self.size:
+                return
+            payload = self.mmap[offset + _HEADER.size:end]
+            if zlib.crc32(payload) != crc:
+                return
+            yield offset, seq, payload
+            offset = end
+
+    def recover(self):
+        for offset, seq, payload in self.records():
+            self.last_seq = seq
+            self.write_offset = offset + _HEADER.size + len(payload)
+        # Zero whatever a torn append left behind the last valid record
+        torn = min(_HEADER.size, self.size - self.write_offset)
+        if torn > 0 and any(self.mmap[self.write_offset:self.write_offset + torn]):
+            logger.warning("Discarding torn record at %s:%d", self.path, self.write_offset)
+            self.mmap[self.write_offset:self.write_offset + torn] = bytes(torn)
+
+    def fits(self, length: int) -> bool:
+        return self.write_offset + _HEADER.size + length <= self.size
+
+    def append(self, seq: int, payload: bytes):
+        offset = self.write_offset
+        end = offset + _HEADER.size + len(payload)
+        # Payload first, header last: a crash in between leaves a zero header.
+        self.mmap[offset + _HEADER.size:end] = payload
+        _HEADER.pack_into(self.mmap, offset, len(payload), zlib.crc32(payload), seq)
+        self.write_offset = end
+        self.last_seq = seq
+
+    def flush(self):
+        self.mmap.flush()
+
+    def close(self):
+        self.mmap.close()
+        self._file.close()
+
+
+class Journal:
+    def __init__(self, directory: str, segment_bytes: int, max_bytes: int, fsync_policy: str, slotted: bool = False):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}, must be one of: {', '.join(FSYNC_POLICIES)}")
+        self.base_directory = directory
+        self.directory = directory
+        self.slotted = slotted
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_policy = fsync_policy
+
+        self._lock_fd: Optional[int] = None
+        self._segments: list[_Segment] = []
+        self._checkpoint = 0    # sequence of the last replayed record
+        self._read_cursor: Optional[tuple[_Segment, int]] = None
+        self._batch_end: Optional[tuple[int, tuple[_Segment, int]]] = None
+        self._dirty = False
+        self._appended = asyncio.Event()
+        self._stats = collections.Counter()
+
+    # --- Lifecycle ---
+
+    def open(self):
+        self._lock()
+        checkpoint_path = os.path.join(self.directory, _CHECKPOINT_FILE)
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "rb") as f:
+                (self._checkpoint,) = _CHECKPOINT.unpack(f.read(_CHECKPOINT.size))
+
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(_SEGMENT_SUFFIX))
+        for name in names:
+            segment = _Segment(os.path.join(self.directory, name), int(name[:-len(_SEGMENT_SUFFIX)]), self.segment_bytes)
+            segment.recover()
+            self._segments.append(segment)
+
+        # Records past the checkpoint may have been lost (e.g. unsynced writes
+        # on power loss): continue numbering after the checkpoint regardless.
+        if not self._segments or self._segments[-1].last_seq < self._checkpoint:
+            self._segments.append(self._new_segment(self._checkpoint + 1))
+        self._drop_replayed_segments()
+        logger.info("Ingest journal opened with %d pending records", self.pending)
+
+    def flush(self):
+        if self._dirty:
+            self._segments[-1].flush()
+            self._dirty = False
+
+    def close(self):
+        self.flush()
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def adopt_orphan(self) -> Optional["Journal"]:
+        """
+        Lock and open another slot of the base directory holding pending records
+        (left by a worker that is gone), or return None if there is none.
+        """
+        for name in sorted(os.listdir(self.base_directory)):
+            path = os.path.join(self.base_directory, name)
+            if not name.startswith(_SLOT_PREFIX) or path == self.directory:
+                continue
+            # Opening a slot without segments would create (and preallocate) one
+            if not any(entry.endswith(_SEGMENT_SUFFIX) for entry in os.listdir(path)):
+                continue
+            orphan = Journal(path, self.segment_bytes, self.max_bytes, self.fsync_policy)
+            try:
+                orphan.open()
+            except JournalLockedError:
+                continue
+            if orphan.pending:
+                return orphan
+            orphan.close()
+        return None
+
+    def _lock(self):
+        if not self.slotted:
+            self._lock_fd = _lock_directory(self.directory)
+            return
+
+        for slot in range(_MAX_SLOTS):
+            directory = os.path.join(self.base_directory, f"{_SLOT_PREFIX}{slot}")
+            try:
+                self._lock_fd = _lock_directory(directory)
+            except JournalLockedError:
+                continue
+            self.directory = directory
+            return
+        raise JournalLockedError(f"All {_MAX_SLOTS} journal slots of {self.base_directory} are locked")
+
+    # --- Writer ---
+
+    def append(self, payload: bytes) -> int:
+        if _HEADER.size + len(payload) > self.segment_bytes:
+            raise ValueError(f"Record of {len(payload)} bytes does not fit in a journal segment")
+
+        segment = self._segments[-1]
+        if not segment.fits(len(payload)):
+            if (len(self._segments) + 1) * self.segment_bytes > self.max_bytes:
+                self._stats["rejected"] += 1
+                raise JournalFullError("Ingest journal disk budget exhausted")
+            segment.flush()
+            segment = self._new_segment(segment.last_seq + 1)
+            self._segments.append(segment)
+
+        seq = segment.last_seq + 1
+        segment.append(seq, payload)
+        self._stats["appended"] += 1
+        if self.fsync_policy == "always":
+            segment.flush()
+        else:
+            self._dirty = True
+        self._appended.set()
+        return seq
+
+    # --- Replay ---
+
+    @property
+    def pending(self) -> int:
+        if not self._segments:
+            return 0
+        return self._segments[-1].last_seq - self._checkpoint
+
+    def read_batch(self, max_records: int) -> list[tuple[int, bytes]]:
+        """
+        Returns up to `max_records` (seq, payload) pairs following the checkpoint.
+        """
+        start_segment, start_offset = self._read_cursor or (None, 0)
+        batch, end = [], None
+        for segment in self._segments:
+            if segment.last_seq <= self._checkpoint:
+                continue
+            offset = start_offset if segment is start_segment else 0
+            for record_offset, seq, payload in segment.records(offset):
+                if seq <= self._checkpoint:
+                    continue
+                batch.append((seq, payload))
+                end = (segment, record_offset + _HEADER.size + len(payload))
+                if len(batch) >= max_records:
+                    break
+            if len(batch) >= max_records:
+                break
+
+        self._batch_end = (batch[-1][0], end) if batch else None
+        return batch
+
+    def commit(self, seq: int):
+        """
+        Mark every record up to `seq` as replayed.
+        """
+        self._checkpoint = seq
+        checkpoint_path = os.path.join(self.directory, _CHECKPOINT_FILE)
+        with open(checkpoint_path + ".tmp", "wb") as f:
+            f.write(_CHECKPOINT.pack(seq))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+        # Next reads resume right after the committed batch instead of rescanning
+        if self._batch_end is not None and self._batch_end[0] == seq:
+            self._read_cursor = self._batch_end[1]
+        else:
+            self._read_cursor = None
+        self._drop_replayed_segments()
+
+    async def wait_for_records(self, timeout: float):
+        self._appended.clear()
+        if self.pending:
+            return
+        try:
+            await asyncio.wait_for(self._appended.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "fsync_policy": self.fsync_policy,
+            "segments": len(self._segments),
+            "disk_bytes": len(self._segments) * self.segment_bytes,
+            "max_bytes": self.max_bytes,
+            "pending": self.pending,
+            "checkpoint": self._checkpoint,
+            **self._stats,
+        }
+
+    # --- Internals ---
+
+    def _new_segment(self, first_seq: int) -> _Segment:
+        path = os.path.join(self.directory, f"{first_seq:020d}{_SEGMENT_SUFFIX}")
+        segment = _Segment(path, first_seq, self.segment_bytes)
+        if self.fsync_policy == "always":
+            fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        return segment
+
+    def _drop_replayed_segments(self):
+        # The active (last) segment is kept even when fully replayed
+        while len(self._segments) > 1 and self._segments[0].last_seq <= self._checkpoint:
+            segment = self._segments.pop(0)
+            segment.close()
+            os.remove(segment.path)
+
+
+# replay(payloads) -> [(index in payloads, error)] of the records rejected for good
+Replay = Callable[[list[bytes]], Awaitable[list[tuple[int, Exception]]]]
+
+
+class JournalReplayer:
+    """
+    Drains the journal in batches through `replay`. `replay` must raise if a
+    record of the batch failed transiently (e.g. the destination is down): the
+    batch is retried with exponential backoff until the destination is healthy
+    again, so `replay` must tolerate records that were already replayed. Records
+    rejected for good are returned instead; they are dead-lettered and the
+    checkpoint moves past them.
+    """
+
+    def __init__(
+        self,
+        journal: Journal,
+        replay: Replay,
+        batch_size: int,
+        interval_ms: int,
+        max_backoff_ms: int,
+        fsync_interval_ms: int,
+        dead_letter_size: int = 1000,
+    ):
+        self.journal = journal
+        self.replay = replay
+        self.batch_size = batch_size
+        self.interval_ms = interval_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.fsync_interval_ms = fsync_interval_ms
+
+        self.healthy = True
+        self._task: Optional[asyncio.Task] = None
+        self._fsync_task: Optional[asyncio.Task] = None
+        self._dead_letters: collections.deque = collections.deque(maxlen=dead_letter_size)
+        self._stats = collections.Counter()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="ingest-journal-replayer")
+        if self._fsync_task is None and self.journal.fsync_policy == "interval":
+            self._fsync_task = asyncio.create_task(self._fsync(), name="ingest-journal-fsync")
+
+    async def stop(self):
+        for task in (self._task, self._fsync_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = self._fsync_task = None
+
+    @property
+    def stats(self) -> dict:
+        return {"healthy": self.healthy, **self._stats}
+
+    @property
+    def dead_letters(self) -> list[dict]:
+        return list(self._dead_letters)
+
+    async def _fsync(self):
+        # Own timer: the replay loop may be backing off for a long time
+        while True:
+            await asyncio.sleep(self.fsync_interval_ms / 1000)
+            self.journal.flush()
+
+    async def _run(self):
+        backoff_ms = self.interval_ms
+        loop = asyncio.get_running_loop()
+        last_orphan_scan = loop.time()
+        while True:
+            try:
+                replayed = await self._replay_batch(self.journal)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.healthy = False
+                self._stats["failed_batches"] += 1
+                logger.warning("Journal replay failed (%s), retrying in %d ms", exc, backoff_ms)
+                await asyncio.sleep(backoff_ms / 1000)
+                backoff_ms = min(backoff_ms * 2, self.max_backoff_ms)
+                continue
+
+            self.healthy = True
+            backoff_ms = self.interval_ms
+            if replayed:
+                continue
+
+            if self.journal.slotted and loop.time() - last_orphan_scan >= _ORPHAN_SCAN_INTERVAL_S:
+                last_orphan_scan = loop.time()
+                await self._drain_orphans()
+
+            await self.journal.wait_for_records(self.interval_ms / 1000)
+
+    async def _replay_batch(self, journal: Journal) -> int:
+        batch = journal.read_batch(self.batch_size)
+        if not batch:
+            return 0
+
+        rejected = await self.replay([payload for _, payload in batch])
+        for index, exc in rejected:
+            self._dead_letter(journal, *batch[index], exc)
+        journal.commit(batch[-1][0])
+        self._stats["replayed_batches"] += 1
+        self._stats["replayed_records"] += len(batch) - len(rejected)
+        return len(batch)
+
+    def _dead_letter(self, journal: Journal, seq: int, payload: bytes, exc: Exception):
+        self._stats["dead_lettered"] += 1
+        self._dead_letters.append({
+            "journal": journal.directory,
+            "seq": seq,
+            "record": payload.decode(errors="replace"),
+            "error": repr(exc),
+            "failed_at": time.time(),
+        })
+        logger.warning("Journal record %d of %s rejected, dropping it: %r", seq, journal.directory, exc)
+
+    async def _drain_orphans(self):
+        while (orphan := self.journal.adopt_orphan()) is not None:
+            logger.info("Draining %d records of orphaned journal %s", orphan.pending, orphan.directory)
+            self._stats["adopted_orphans"] += 1
+            try:
+                while await self._replay_batch(orphan):
+                    pass
+            except Exception as exc:
+                logger.warning("Orphaned journal replay failed (%s), retrying later", exc)
+                return
+            finally:
+                orphan.close()
+
+
+ingest_journal: Optional[Journal] = None
+if INGEST_JOURNAL_DIR:
+    ingest_journal = Journal(
+        directory=INGEST_JOURNAL_DIR,
+        segment_bytes=INGEST_JOURNAL_SEGMENT_BYTES,
+        max_bytes=INGEST_JOURNAL_SLOT_MAX_BYTES,
+        fsync_policy=INGEST_JOURNAL_FSYNC_POLICY,
+        slotted=True,
+    )
+
+
+def create_ingest_journal_replayer(replay: Replay) -> JournalReplayer:
+    return JournalReplayer(
+        ingest_journal,
+        replay,
+        batch_size=INGEST_JOURNAL_REPLAY_BATCH_SIZE,
+        interval_ms=INGEST_JOURNAL_REPLAY_INTERVAL_MS,
+        max_backoff_ms=INGEST_JOURNAL_REPLAY_MAX_BACKOFF_MS,
+        fsync_interval_ms=INGEST_JOURNAL_FSYNC_INTERVAL_MS,
+    )
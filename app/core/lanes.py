@@ -0,0 +1,144 @@
+"""
+Priority lanes for upstream (microservice) calls.
+
+Each lane has its own pooled HTTP client with a fixed number of connections,
+and a semaphore of the same size: calls beyond the lane's capacity wait for a
+slot of their lane only. Operator commands and command-response callbacks get
+small dedicated lanes, so they never queue behind bulk ingest traffic, which
+uses the remaining (largest) lane.
+
+The lane of a call is taken from the `upstream_lane` context variable, set per
+route with the `use_lane(name)` dependency; calls made outside a request (e.g.
+background tasks, journal replay) use the default lane.
+"""
+
+import asyncio
+import collections
+import contextvars
+import time
+from typing import Optional
+
+import httpx
+
+from app.core.config import (
+    UPSTREAM_TIMEOUT_S,
+    UPSTREAM_COMMAND_CONNECTIONS,
+    UPSTREAM_CALLBACK_CONNECTIONS,
+    UPSTREAM_INGEST_CONNECTIONS,
+)
+
+DEFAULT_LANE = "ingest"
+
+upstream_lane: contextvars.ContextVar[str] = contextvars.ContextVar("upstream_lane", default=DEFAULT_LANE)
+
+
+def use_lane(name: str):
+    """
+    Route dependency running the upstream calls of the route in lane `name`.
+    """
+    async def set_lane():
+        upstream_lane.set(name)
+
+    return set_lane
+
+
+class Lane:
+    def __init__(self, name: str, capacity: int, timeout_s: float):
+        self.name = name
+        self.capacity = capacity
+        self.timeout_s = timeout_s
+        self.in_flight = 0
+        self.waiting = 0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._stats = collections.Counter()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use, in the running loop (see UpstreamLanes.close)
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout_s),
+                limits=httpx.Limits(max_connections=self.capacity, max_keepalive_connections=self.capacity),
+            )
+            self._slots = asyncio.Semaphore(self.capacity)
+        return self._client
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        client = self.client
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started_at = time.perf_counter()
+        self.in_flight += 1
+        try:
+            return await client.request(method, url, **kwargs)
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            wait_ms = (started_at - queued_at) * 1000
+            self._stats["requests"] += 1
+            self._stats["wait_ms"] += wait_ms
+            self._stats["latency_ms"] += (time.perf_counter() - started_at) * 1000
+            if wait_ms > self._stats["max_wait_ms"]:
+                self._stats["max_wait_ms"] = wait_ms
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._slots = None
+
+    @property
+    def stats(self) -> dict:
+        requests = self._stats["requests"]
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "requests": requests,
+            "errors": self._stats["errors"],
+            "avg_wait_ms": self._stats["wait_ms"] / requests if requests else 0,
+            "max_wait_ms": self._stats["max_wait_ms"],
+            "avg_latency_ms": self._stats["latency_ms"] / requests if requests else 0,
+        }
+
+
+class UpstreamLanes:
+    def __init__(self, capacities: dict[str, int], timeout_s: float):
+        self.lanes = {name: Lane(name, capacity, timeout_s) for name, capacity in capacities.items()}
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        return await self.lanes[upstream_lane.get()].request(method, url, **kwargs)
+
+    async def close(self):
+        """
+        Closes the pooled clients; they are recreated on the next call.
+        """
+        for lane in self.lanes.values():
+            await lane.close()
+
+    @property
+    def stats(self) -> dict:
+        lanes = {name: lane.stats for name, lane in self.lanes.items()}
+        total = sum(lane["requests"] for lane in lanes.values())
+        for lane in lanes.values():
+            lane["share"] = lane["requests"] / total if total else 0
+            lane["utilization"] = lane["in_flight"] / lane["capacity"]
+        return lanes
+
+
+upstream_lanes = UpstreamLanes(
+    {
+        "command": UPSTREAM_COMMAND_CONNECTIONS,
+        "callback": UPSTREAM_CALLBACK_CONNECTIONS,
+        DEFAULT_LANE: UPSTREAM_INGEST_CONNECTIONS,
+    },
+    timeout_s=UPSTREAM_TIMEOUT_S,
+)
@@ -0,0 +1,90 @@
+"""
+Last-known values of sensor properties (state, inference layer, config).
+
+Values are recorded from the SET commands sent to the sensors, the responses to
+GET commands and the exports, so reads don't need a command round trip to the
+sensor. Every value carries its staleness metadata: when and from what it was
+last observed, and a version that is bumped whenever the value changes.
+
+At most `max_sensors` sensors are kept: recording a value for one more sensor
+forgets the sensor observed least recently.
+"""
+
+import collections
+import time
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from app.core.config import LAST_KNOWN_MAX_SENSORS
+
+
+class PropertyValue:
+    __slots__ = ("value", "version", "updated_at", "source")
+
+    def __init__(self, value: Any, source: str):
+        self.value = value
+        self.version = 1
+        self.updated_at = time.time()
+        self.source = source
+
+    def describe(self, now: float) -> dict:
+        return {
+            "value": self.value,
+            "version": self.version,
+            "updated_at": datetime.fromtimestamp(self.updated_at, tz=timezone.utc),
+            "age_s": now - self.updated_at,
+            "source": self.source,
+        }
+
+
+class LastKnownValues:
+    def __init__(self, max_sensors: int):
+        self.max_sensors = max_sensors
+        self._values: collections.OrderedDict[tuple[str, str], dict[str, PropertyValue]] = collections.OrderedDict()
+        self._evicted = 0
+
+    def record(self, gateway_name: str, sensor_name: str, source: str, **properties):
+        """
+        Records the observed `properties` of a sensor. Re-observing the same value
+        only refreshes its timestamp and source.
+        """
+        key = (gateway_name, sensor_name)
+        values = self._values.setdefault(key, {})
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_sensors:
+            self._values.popitem(last=False)
+            self._evicted += 1
+
+        for name, value in properties.items():
+            current = values.get(name)
+            if current is None:
+                values[name] = PropertyValue(value, source)
+                continue
+            if current.value != value:
+                current.value = value
+                current.version += 1
+            current.updated_at = time.time()
+            current.source = source
+
+    def get(self, gateway_name: str, sensor_name: str, name: str) -> Optional[PropertyValue]:
+        return self._values.get((gateway_name, sensor_name), {}).get(name)
+
+    def describe(self, gateway_name: str, sensor_name: str) -> dict[str, dict]:
+        now = time.time()
+        values = self._values.get((gateway_name, sensor_name), {})
+        return {name: value.describe(now) for name, value in values.items()}
+
+    def forget(self, gateway_name: str, sensor_name: str):
+        self._values.pop((gateway_name, sensor_name), None)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "sensors": len(self._values),
+            "values": sum(len(values) for values in self._values.values()),
+            "max_sensors": self.max_sensors,
+            "evicted": self._evicted,
+        }
+
+
+sensor_properties = LastKnownValues(LAST_KNOWN_MAX_SENSORS)
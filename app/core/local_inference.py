@@ -0,0 +1,262 @@
+"""
+Local in-process cloud inference engine.
+
+For small deployments (and for benchmarking) the cloud API can run the cloud
+model itself instead of going through the inference microservice and its task
+queue. The model is the same zlib-compressed, base64-encoded payload uploaded
+through `/model`; it is turned into a predictive model by a registered loader
+and predictions run on a process pool (or a thread pool when the model runtime
+releases the GIL). Every pool worker, process or thread, has its own copy of the
+model: TFLite interpreters are not thread-safe.
+
+Each server worker runs its own engine, so an uploaded model is also saved to
+`model_path`; every engine loads the saved model on start and polls the file
+for changes, so an upload handled by one server worker reaches all of them.
+
+Loaders:
+    - "tflite": TensorFlow Lite interpreter (needs `tflite_runtime` or `tensorflow`).
+    - "stand-in": a cheap threshold model that ignores the uploaded payload, so the
+      local mode can run without TensorFlow (the default when it isn't installed).
+      It never returns a heuristic result, so ADAPTIVE_INFERENCE does nothing
+      with it: sensors are never moved to another layer or flagged as errors.
+"""
+
+import asyncio
+import base64
+import concurrent.futures
+import logging
+import os
+import threading
+import zlib
+from typing import Callable, Optional, Protocol
+
+from app.core.config import (
+    LOCAL_INFERENCE_MODEL_LOADER,
+    LOCAL_INFERENCE_EXECUTOR,
+    LOCAL_INFERENCE_WORKERS,
+    LOCAL_INFERENCE_MODEL_PATH,
+    LOCAL_INFERENCE_MODEL_POLL_S,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PredictiveModel(Protocol):
+    def predict(self, values: list[list[float]]) -> tuple[int, Optional[int]]:
+        """
+        Returns the (prediction, heuristic) pair for a reading, with the same
+        meaning as the inference microservice's prediction_result/heuristic_result.
+        """
+        ...
+
+
+class StandInModel:
+    """
+    Stand-in predictive model: predicts class 1 when the mean absolute value of
+    the reading exceeds `threshold`, class 0 otherwise. Its heuristic result is
+    always None: it never suggests a layer change or an error state.
+    """
+
+    def __init__(self, threshold: float = 1.0):
+        self.threshold = threshold
+
+    def predict(self, values: list[list[float]]) -> tuple[int, Optional[int]]:
+        count = sum(len(row) for row in values)
+        if count == 0:
+            return 0, None
+        mean_abs = sum(abs(value) for row in values for value in row) / count
+        return int(mean_abs > self.threshold), None
+
+
+class TFLiteModel:
+    def __init__(self, model_content: bytes):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        import numpy as np
+
+        self._np = np
+        self._interpreter = Interpreter(model_content=model_content)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+
+    def predict(self, values: list[list[float]]) -> tuple[int, Optional[int]]:
+        tensor = self._np.asarray(values, dtype=self._input["dtype"]).reshape(self._input["shape"])
+        self._interpreter.set_tensor(self._input["index"], tensor)
+        self._interpreter.invoke()
+        output = self._interpreter.get_tensor(self._output["index"])
+        return int(self._np.argmax(output)), None
+
+
+MODEL_LOADERS: dict[str, Callable[[bytes], PredictiveModel]] = {
+    "tflite": TFLiteModel,
+    "stand-in": lambda model_content: StandInModel(),
+}
+
+
+def register_model_loader(name: str, loader: Callable[[bytes], PredictiveModel]):
+    MODEL_LOADERS[name] = loader
+
+
+def decode_model_payload(tf_model_b64: str) -> bytes:
+    return zlib.decompress(base64.b64decode(tf_model_b64))
+
+
+# --- Pool workers ---
+# Each worker process (or thread) loads its own copy of the model once, in the
+# pool initializer. Thread pools of a replaced model keep their own threads, so
+# a thread-local copy is never shared across models either.
+
+_worker_model = threading.local()
+
+
+def _init_worker(loader_name: str, model_content: bytes):
+    _worker_model.model = MODEL_LOADERS[loader_name](model_content)
+
+
+def _worker_predict(values: list[list[float]]) -> tuple[int, Optional[int]]:
+    return _worker_model.model.predict(values)
+
+
+class ModelNotLoadedError(Exception):
+    pass
+
+
+class LocalInferenceEngine:
+    def __init__(
+        self,
+        loader_name: str,
+        executor_kind: str,
+        workers: int,
+        model_path: Optional[str] = None,
+        poll_interval_s: float = 5.0,
+    ):
+        if executor_kind not in ("process", "thread"):
+            raise ValueError(f"Unknown executor kind: {executor_kind}, must be one of: process, thread")
+        self.loader_name = loader_name
+        self.executor_kind = executor_kind
+        self.workers = workers
+        self.model_path = model_path
+        self.poll_interval_s = poll_interval_s
+
+        self._executor: Optional[concurrent.futures.Executor] = None
+        self._model_version: Optional[tuple[int, int]] = None  # (mtime_ns, size) of the loaded model file
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._executor is not None
+
+    def load(self, model_content: bytes):
+        """
+        Load a model and swap it in. Blocking, run it off the event loop.
+        """
+        MODEL_LOADERS[self.loader_name](model_content)  # fail here, before the running model is replaced
+
+        if self.executor_kind == "process":
+            executor_class, options = concurrent.futures.ProcessPoolExecutor, {}
+        else:
+            executor_class, options = concurrent.futures.ThreadPoolExecutor, {"thread_name_prefix": "local-inference"}
+        executor = executor_class(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.loader_name, model_content),
+            **options,
+        )
+
+        previous, self._executor = self._executor, executor
+        if previous is not None:
+            previous.shutdown(wait=False)
+
+    async def load_payload(self, tf_model_b64: str):
+        """
+        Load an uploaded model and save it to `model_path` for the other server workers.
+        """
+        def load_and_save():
+            model_content = decode_model_payload(tf_model_b64)
+            self.load(model_content)
+            if self.model_path:
+                self._model_version = self._save(model_content)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, load_and_save)
+
+    def load_saved(self) -> bool:
+        """
+        Load the model saved at `model_path` if it changed since the last load.
+        Blocking, run it off the event loop.
+        """
+        try:
+            stat = os.stat(self.model_path)
+        except FileNotFoundError:
+            return False
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self._model_version:
+            return False
+
+        self._model_version = version  # a broken file is not retried until it changes
+        with open(self.model_path, "rb") as f:
+            self.load(f.read())
+        return True
+
+    async def start(self):
+        """
+        Load the saved model, if any, and watch `model_path` for models uploaded
+        through other server workers.
+        """
+        if not self.model_path or self._watcher is not None:
+            return
+        await self._load_saved()
+        self._watcher = asyncio.create_task(self._watch(), name="local-inference-model-watcher")
+
+    async def predict(self, values: list[list[float]]) -> dict:
+        if self._executor is None:
+            raise ModelNotLoadedError("No cloud model has been loaded for local inference")
+
+        loop = asyncio.get_running_loop()
+        prediction, heuristic = await loop.run_in_executor(self._executor, _worker_predict, values)
+        return {"prediction_result": prediction, "heuristic_result": heuristic}
+
+    def shutdown(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _save(self, model_content: bytes) -> tuple[int, int]:
+        # Written aside and renamed, so other workers never read a partial file
+        os.makedirs(os.path.dirname(self.model_path) or ".", exist_ok=True)
+        tmp_path = f"{self.model_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(model_content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.model_path)
+        stat = os.stat(self.model_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    async def _load_saved(self):
+        loop = asyncio.get_running_loop()
+        try:
+            if await loop.run_in_executor(None, self.load_saved):
+                logger.info("Loaded the cloud model saved at %s", self.model_path)
+        except Exception as exc:
+            logger.warning("Could not load the cloud model saved at %s: %r", self.model_path, exc)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval_s)
+            await self._load_saved()
+
+
+local_inference_engine = LocalInferenceEngine(
+    loader_name=LOCAL_INFERENCE_MODEL_LOADER,
+    executor_kind=LOCAL_INFERENCE_EXECUTOR,
+    workers=LOCAL_INFERENCE_WORKERS,
+    model_path=LOCAL_INFERENCE_MODEL_PATH,
+    poll_interval_s=LOCAL_INFERENCE_MODEL_POLL_S,
+)
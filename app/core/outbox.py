@@ -0,0 +1,180 @@
+"""
+Last-write-wins outbox of SET commands to the sensors.
+
+SET commands are not forwarded one per API call: they wait in the outbox for
+`delay_ms` (plus up to `jitter_ms` of random jitter, so a broadcast doesn't hit
+every gateway at the same instant), and a newer value for the same (sensor,
+property) replaces the pending one, since only the last value matters. When the
+gateway's turn comes, its pending commands are merged into one multi-target
+command per (property, value) and dispatched one after the other, at least
+`gateway_interval_ms` apart, so the gateway's radio link isn't flooded.
+
+A command that fails to dispatch is queued again for its sensors (unless a
+newer value arrived meanwhile) up to `max_retries` times, then dropped and kept
+in a bounded dead-letter list.
+"""
+
+import asyncio
+import collections
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable
+
+from pydantic_core import to_json
+
+from app.core.config import (
+    COMMAND_OUTBOX_DELAY_MS,
+    COMMAND_OUTBOX_JITTER_MS,
+    COMMAND_OUTBOX_GATEWAY_INTERVAL_MS,
+    COMMAND_OUTBOX_MAX_RETRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+# dispatch(gateway_name, property_name, sensor_names, value)
+Dispatch = Callable[[str, str, list[str], Any], Awaitable[None]]
+
+
+class _Pending:
+    __slots__ = ("value", "attempts")
+
+    def __init__(self, value: Any, attempts: int = 0):
+        self.value = value
+        self.attempts = attempts
+
+
+class CommandOutbox:
+    def __init__(
+        self,
+        dispatch: Dispatch,
+        delay_ms: int,
+        jitter_ms: int,
+        gateway_interval_ms: int,
+        max_retries: int,
+        dead_letter_size: int = 1000,
+    ):
+        self.dispatch = dispatch
+        self.delay_ms = delay_ms
+        self.jitter_ms = jitter_ms
+        self.gateway_interval_ms = gateway_interval_ms
+        self.max_retries = max_retries
+        self._pending: dict[str, dict[tuple[str, str], _Pending]] = {}
+        self._dispatchers: dict[str, asyncio.Task] = {}
+        self._last_dispatch: dict[str, float] = {}
+        self._draining = False
+        self._dead_letters: collections.deque = collections.deque(maxlen=dead_letter_size)
+        self._stats = collections.Counter()
+
+    def put(self, gateway_name: str, property_name: str, sensor_names: list[str], value: Any):
+        """
+        Queues `property_name = value` for the sensors, replacing their pending
+        value of the property.
+        """
+        pending = self._pending.setdefault(gateway_name, {})
+        for sensor_name in sensor_names:
+            key = (property_name, sensor_name)
+            if key in pending:
+                self._stats["coalesced"] += 1
+            pending[key] = _Pending(value)
+        self._stats["queued"] += len(sensor_names)
+
+        if gateway_name not in self._dispatchers:
+            self._dispatchers[gateway_name] = asyncio.create_task(
+                self._run(gateway_name), name=f"command-outbox-{gateway_name}"
+            )
+
+    async def shutdown(self, timeout: float = 10.0):
+        """
+        Dispatches the pending commands without waiting for the coalescing delay.
+        """
+        self._draining = True
+        dispatchers = list(self._dispatchers.values())
+        if not dispatchers:
+            return
+        _, not_done = await asyncio.wait(dispatchers, timeout=timeout)
+        for task in not_done:
+            task.cancel()
+
+    @property
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "pending": sum(len(pending) for pending in self._pending.values()),
+            "gateways": {gateway_name: len(pending) for gateway_name, pending in self._pending.items() if pending},
+        }
+
+    @property
+    def dead_letters(self) -> list[dict]:
+        return list(self._dead_letters)
+
+    async def _run(self, gateway_name: str):
+        try:
+            while self._pending.get(gateway_name):
+                if not self._draining:
+                    await asyncio.sleep((self.delay_ms + random.uniform(0, self.jitter_ms)) / 1000)
+
+                # Commands queued from here on go to the next round
+                pending = self._pending.pop(gateway_name, {})
+                for (property_name, _), (value, sensor_names, attempts) in self._merge(pending).items():
+                    await self._pace(gateway_name)
+                    try:
+                        await self.dispatch(gateway_name, property_name, sensor_names, value)
+                    except Exception as exc:
+                        self._failed(gateway_name, property_name, sensor_names, value, attempts, exc)
+                        continue
+                    self._stats["commands"] += 1
+                    self._stats["dispatched"] += len(sensor_names)
+        finally:
+            del self._dispatchers[gateway_name]
+
+    def _merge(self, pending: dict[tuple[str, str], _Pending]) -> dict:
+        # (property, value) -> (value, sensors, attempts): one command per distinct value
+        commands: dict[tuple[str, bytes], tuple[Any, list[str], int]] = {}
+        for (property_name, sensor_name), entry in pending.items():
+            key = (property_name, to_json(entry.value))
+            value, sensor_names, attempts = commands.setdefault(key, (entry.value, [], 0))
+            sensor_names.append(sensor_name)
+            commands[key] = (value, sensor_names, max(attempts, entry.attempts))
+        return commands
+
+    async def _pace(self, gateway_name: str):
+        last = self._last_dispatch.get(gateway_name)
+        if last is not None:
+            wait_s = last + self.gateway_interval_ms / 1000 - time.monotonic()
+            if wait_s > 0:
+                await asyncio.sleep(wait_s)
+        self._last_dispatch[gateway_name] = time.monotonic()
+
+    def _failed(self, gateway_name: str, property_name: str, sensor_names: list[str], value: Any,
+                attempts: int, exc: Exception):
+        self._stats["failed"] += 1
+        if attempts >= self.max_retries or self._draining:
+            self._stats["dead_lettered"] += 1
+            self._dead_letters.append({
+                "gateway_name": gateway_name,
+                "property_name": property_name,
+                "sensor_names": sensor_names,
+                "value": value,
+                "attempts": attempts + 1,
+                "error": repr(exc),
+                "failed_at": time.time(),
+            })
+            logger.warning("SET %s command to %s failed, dropping it: %r", property_name, gateway_name, exc)
+            return
+
+        # Retried in the next round, unless a newer value was queued meanwhile
+        pending = self._pending.setdefault(gateway_name, {})
+        for sensor_name in sensor_names:
+            pending.setdefault((property_name, sensor_name), _Pending(value, attempts + 1))
+        self._stats["retried"] += 1
+
+
+def create_command_outbox(dispatch: Dispatch) -> CommandOutbox:
+    return CommandOutbox(
+        dispatch,
+        delay_ms=COMMAND_OUTBOX_DELAY_MS,
+        jitter_ms=COMMAND_OUTBOX_JITTER_MS,
+        gateway_interval_ms=COMMAND_OUTBOX_GATEWAY_INTERVAL_MS,
+        max_retries=COMMAND_OUTBOX_MAX_RETRIES,
+    )
@@ -0,0 +1,105 @@
+"""
+Token-bucket admission control.
+
+Every key (e.g. a gateway) gets a bucket that refills at the key's rate and
+holds up to `burst_s` seconds worth of tokens; each admitted request takes a
+token. Rates come from `rate_for(key)` and are re-evaluated every
+`rate_refresh_s` seconds, so they follow configuration changes.
+"""
+
+import collections
+import time
+from typing import Callable, Hashable, Optional
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated_at", "rate_expires_at", "accepted", "rejected")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+        self.rate_expires_at = now
+        self.accepted = 0
+        self.rejected = 0
+
+    def take(self, now: float) -> float:
+        """
+        Takes a token, returns 0 if one was available or else the seconds until
+        the next token.
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.accepted += 1
+            return 0
+        self.rejected += 1
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        rate_for: Callable[[Hashable], float],
+        burst_s: float,
+        rate_refresh_s: float = 10,
+        max_keys: int = 100000,
+    ):
+        self.rate_for = rate_for
+        self.burst_s = burst_s
+        self.rate_refresh_s = rate_refresh_s
+        self.max_keys = max_keys
+        self._buckets: dict[Hashable, TokenBucket] = {}
+        self._stats = collections.Counter()
+
+    def admit(self, key: Hashable) -> Optional[float]:
+        """
+        Returns None if the request is admitted, or else the seconds after which
+        it may be retried.
+        """
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune(now)
+            rate = self.rate_for(key)
+            bucket = self._buckets[key] = TokenBucket(rate, max(rate * self.burst_s, 1), now)
+            bucket.rate_expires_at = now + self.rate_refresh_s
+        elif now >= bucket.rate_expires_at:
+            bucket.rate = self.rate_for(key)
+            bucket.capacity = max(bucket.rate * self.burst_s, 1)
+            bucket.rate_expires_at = now + self.rate_refresh_s
+
+        retry_after = bucket.take(now)
+        if retry_after:
+            self._stats["rejected"] += 1
+            return retry_after
+        self._stats["accepted"] += 1
+        return None
+
+    @property
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "keys": {
+                str(key) if not isinstance(key, tuple) else "/".join(key): {
+                    "rate": bucket.rate,
+                    "tokens": bucket.tokens,
+                    "accepted": bucket.accepted,
+                    "rejected": bucket.rejected,
+                }
+                for key, bucket in self._buckets.items()
+            },
+        }
+
+    def _prune(self, now: float):
+        # A bucket that refilled completely is equivalent to a new one
+        full = [
+            key for key, bucket in self._buckets.items()
+            if bucket.tokens + (now - bucket.updated_at) * bucket.rate >= bucket.capacity
+        ]
+        for key in full:
+            del self._buckets[key]
+        self._stats["pruned"] += len(full)
@@ -0,0 +1,407 @@
+"""
+In-memory registry of the edge gateways and sensors known to the data microservice.
+
+Routes check that a gateway or sensor exists, and look up gateway URLs, with
+dictionary lookups instead of a data microservice round trip. The registry is
+kept fresh by:
+    - a full load at startup, repeated every `full_sync_interval_s` seconds,
+      which also drops devices deleted from the data microservice,
+    - an incremental sync every `sync_interval_s` seconds, which lists the
+      gateways and loads the sensors of gateways registered since the last sync
+      (newer `registered_at`),
+    - write-through updates from the routes that create or modify devices,
+    - lookups that miss, which are resolved against the data microservice and
+      cached, so devices registered through another worker or another service
+      are found before the next full sync.
+
+Sensor state, config and inference layer are only known from the commands and
+command responses handled by this process, last-seen time and low battery from
+the exports it ingested (the data microservice doesn't store them with the
+sensor). They are indexed for fleet-wide queries (`query`), see `INDEXED_FIELDS`.
+"""
+
+import asyncio
+import collections
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_SYNC_CONCURRENCY = 8
+
+# Sensor fields with a value -> sensors index; last_seen has its own ordered index
+INDEXED_FIELDS = ("state", "inference_layer", "low_battery")
+
+
+class SensorEntry:
+    __slots__ = (
+        "gateway_name", "device_name", "device_address", "uuid", "registered_at",
+        "state", "config", "inference_layer", "low_battery", "last_seen",
+    )
+
+    def __init__(self, gateway_name: str, device_name: str, device_address: str,
+                 uuid: Optional[str] = None, registered_at: Optional[datetime] = None):
+        self.gateway_name = gateway_name
+        self.device_name = device_name
+        self.device_address = device_address
+        self.uuid = uuid
+        self.registered_at = registered_at
+        self.state: Optional[Any] = None
+        self.config: Optional[Any] = None
+        self.inference_layer: Optional[Any] = None
+        self.low_battery: Optional[bool] = None
+        self.last_seen: Optional[float] = None     # unix time of the last export
+
+
+class GatewayEntry:
+    __slots__ = ("device_name", "device_address", "url", "uuid", "registered_at", "sensors")
+
+    def __init__(self, device_name: str, device_address: str, url: str,
+                 uuid: Optional[str] = None, registered_at: Optional[datetime] = None):
+        self.device_name = device_name
+        self.device_address = device_address
+        self.url = url
+        self.uuid = uuid
+        self.registered_at = registered_at
+        self.sensors: dict[str, SensorEntry] = {}
+
+
+class DeviceRegistry:
+    """
+    `fetch_gateways()` and `fetch_sensors(gateway_name)` list the devices of the
+    data microservice; `fetch_gateway(name)` and `fetch_sensor(gateway_name, name)`
+    read a single one and raise if it doesn't exist. Devices are objects with
+    `device_name` and `device_address` attributes (and `url` for gateways), and
+    optionally `uuid` and `registered_at`.
+    """
+
+    def __init__(
+        self,
+        fetch_gateways: Callable[[], Awaitable[list]],
+        fetch_sensors: Callable[[str], Awaitable[list]],
+        fetch_gateway: Callable[[str], Awaitable[Any]],
+        fetch_sensor: Callable[[str, str], Awaitable[Any]],
+        sync_interval_s: float,
+        full_sync_interval_s: float,
+    ):
+        self.fetch_gateways = fetch_gateways
+        self.fetch_sensors = fetch_sensors
+        self.fetch_gateway = fetch_gateway
+        self.fetch_sensor = fetch_sensor
+        self.sync_interval_s = sync_interval_s
+        self.full_sync_interval_s = full_sync_interval_s
+
+        self.loaded = False
+        self.last_sync: Optional[datetime] = None
+        self._gateways: dict[str, GatewayEntry] = {}
+        self._index: dict[str, collections.defaultdict[Any, set[SensorEntry]]] = {
+            field: collections.defaultdict(set) for field in INDEXED_FIELDS
+        }
+        # Sensors ordered by last_seen, never seen sensors first
+        self._by_last_seen: collections.OrderedDict[SensorEntry, None] = collections.OrderedDict()
+        self._watermark: Optional[datetime] = None
+        self._last_full_sync: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = collections.Counter()
+
+    # --- Lookups ---
+    async def get_gateway(self, gateway_name: str) -> GatewayEntry:
+        gateway = self._gateways.get(gateway_name)
+        if gateway is not None:
+            self._stats["hits"] += 1
+            return gateway
+
+        self._stats["misses"] += 1
+        return self._put_gateway(await self.fetch_gateway(gateway_name))
+
+    async def get_sensor(self, gateway_name: str, sensor_name: str) -> SensorEntry:
+        gateway = self._gateways.get(gateway_name)
+        sensor = None if gateway is None else gateway.sensors.get(sensor_name)
+        if sensor is not None:
+            self._stats["hits"] += 1
+            return sensor
+
+        self._stats["misses"] += 1
+        device = await self.fetch_sensor(gateway_name, sensor_name)
+        if gateway is None:
+            gateway = await self.get_gateway(gateway_name)
+        return self._put_sensor(gateway, device)
+
+    def peek_gateway(self, gateway_name: str) -> Optional[GatewayEntry]:
+        """
+        The gateway if it is in the registry, without falling back to the data microservice.
+        """
+        return self._gateways.get(gateway_name)
+
+    def gateways(self) -> list[GatewayEntry]:
+        return list(self._gateways.values())
+
+    # --- Write-through updates ---
+    def put_gateway(self, device: Any) -> GatewayEntry:
+        return self._put_gateway(device)
+
+    def put_sensor(self, gateway_name: str, device: Any) -> Optional[SensorEntry]:
+        gateway = self._gateways.get(gateway_name)
+        if gateway is None:     # resolved by the next lookup
+            return None
+        return self._put_sensor(gateway, device)
+
+    def update_sensor(self, gateway_name: str, sensor_name: str, **fields):
+        """
+        Sets fields of a known sensor, keeping the indexes up to date. Unknown
+        sensors are ignored: they are indexed once a lookup or sync adds them.
+        """
+        gateway = self._gateways.get(gateway_name)
+        sensor = None if gateway is None else gateway.sensors.get(sensor_name)
+        if sensor is None:
+            return
+
+        for name, value in fields.items():
+            if name in self._index:
+                old = getattr(sensor, name)
+                if old == value:
+                    continue
+                if old is not None:
+                    self._unindex(name, old, sensor)
+                if value is not None:
+                    self._index[name][value].add(sensor)
+            elif name == "last_seen":
+                self._by_last_seen.move_to_end(sensor)
+            setattr(sensor, name, value)
+
+    # --- Fleet queries ---
+    def query(
+        self,
+        gateway_name: Optional[str] = None,
+        seen_since: Optional[float] = None,
+        not_seen_since: Optional[float] = None,
+        **filters,
+    ) -> list[SensorEntry]:
+        """
+        Sensors matching every given filter, ordered by gateway and sensor name.
+        `filters` are values of the indexed fields (None means any value);
+        `seen_since`/`not_seen_since` are unix times compared to last_seen, never
+        seen sensors count as not seen.
+
+        Only the smallest candidate set is scanned: the sensors of the gateway,
+        of one index entry, or the run of the last-seen order within the bound.
+        """
+        candidates = []
+        if gateway_name is not None:
+            gateway = self._gateways.get(gateway_name)
+            candidates.append(gateway.sensors.values() if gateway is not None else ())
+        for name, value in filters.items():
+            if value is not None:
+                candidates.append(self._index[name].get(value, ()))
+        if seen_since is not None:
+            candidates.append(self._seen_since(seen_since))
+        if not_seen_since is not None:
+            candidates.append(self._not_seen_since(not_seen_since))
+        if not candidates:
+            candidates.append(self._by_last_seen.keys())
+
+        def matches(sensor: SensorEntry) -> bool:
+            if gateway_name is not None and sensor.gateway_name != gateway_name:
+                return False
+            for name, value in filters.items():
+                if value is not None and getattr(sensor, name) != value:
+                    return False
+            if seen_since is not None and (sensor.last_seen is None or sensor.last_seen < seen_since):
+                return False
+            if not_seen_since is not None and sensor.last_seen is not None and sensor.last_seen >= not_seen_since:
+                return False
+            return True
+
+        smallest = min(candidates, key=len)
+        result = [sensor for sensor in smallest if matches(sensor)]
+        result.sort(key=lambda sensor: (sensor.gateway_name, sensor.device_name))
+        return result
+
+    def summary(self) -> dict:
+        """
+        Number of sensors per value of every indexed field.
+        """
+        return {
+            name: {str(getattr(value, "value", value)): len(sensors) for value, sensors in index.items() if sensors}
+            for name, index in self._index.items()
+        }
+
+    # --- Synchronization ---
+    async def load(self):
+        """
+        Initial full load. Failures are logged and not raised: lookups fall back
+        to the data microservice until a later sync succeeds.
+        """
+        try:
+            await self.sync(full=True)
+        except Exception as exc:
+            self._stats["failed_syncs"] += 1
+            logger.warning("Device registry load failed (%s), retrying in the background", exc)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="device-registry-sync")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def sync(self, full: bool = False):
+        """
+        Lists the gateways and (re)loads the sensors of the new ones, or of all of
+        them on a full sync, which also drops the devices that no longer exist.
+        """
+        devices = await self.fetch_gateways()
+        watermark = self._watermark
+        to_load = []
+        for device in devices:
+            known = device.device_name in self._gateways
+            gateway = self._put_gateway(device)
+            if full or not known or (watermark is not None and device.registered_at > watermark):
+                to_load.append(gateway)
+
+        semaphore = asyncio.Semaphore(_SYNC_CONCURRENCY)
+
+        async def load_sensors(gateway: GatewayEntry):
+            async with semaphore:
+                sensors = await self.fetch_sensors(gateway.device_name)
+            names = {sensor.device_name for sensor in sensors}
+            for sensor in sensors:
+                self._put_sensor(gateway, sensor)
+            if full:
+                for name in gateway.sensors.keys() - names:
+                    self._drop_sensor(gateway.sensors[name])
+
+        await asyncio.gather(*(load_sensors(gateway) for gateway in to_load))
+
+        if full:
+            names = {device.device_name for device in devices}
+            for name in self._gateways.keys() - names:
+                for sensor in list(self._gateways[name].sensors.values()):
+                    self._drop_sensor(sensor)
+                del self._gateways[name]
+
+        registered = [device.registered_at for device in devices if device.registered_at is not None]
+        if registered:
+            self._watermark = max(registered) if watermark is None else max(watermark, *registered)
+        self.loaded = True
+        self.last_sync = datetime.now()
+        if full:
+            self._last_full_sync = asyncio.get_running_loop().time()
+        self._stats["full_syncs" if full else "syncs"] += 1
+
+    async def check_consistency(self) -> dict:
+        """
+        Compares the registry with a fresh listing of the data microservice.
+        """
+        devices = await self.fetch_gateways()
+        remote = {device.device_name: device for device in devices}
+        sensor_lists = await asyncio.gather(*(self.fetch_sensors(name) for name in remote))
+
+        report = {"missing": [], "unknown": [], "mismatched": []}
+        for (gateway_name, device), sensors in zip(remote.items(), sensor_lists):
+            gateway = self._gateways.get(gateway_name)
+            if gateway is None:
+                report["missing"].append({"gateway_name": gateway_name})
+                continue
+            if (gateway.url, gateway.device_address) != (device.url, device.device_address):
+                report["mismatched"].append({"gateway_name": gateway_name})
+
+            remote_sensors = {sensor.device_name: sensor for sensor in sensors}
+            for name, sensor in remote_sensors.items():
+                local = gateway.sensors.get(name)
+                if local is None:
+                    report["missing"].append({"gateway_name": gateway_name, "sensor_name": name})
+                elif local.device_address != sensor.device_address:
+                    report["mismatched"].append({"gateway_name": gateway_name, "sensor_name": name})
+            for name in gateway.sensors.keys() - remote_sensors.keys():
+                report["unknown"].append({"gateway_name": gateway_name, "sensor_name": name})
+
+        for name in self._gateways.keys() - remote.keys():
+            report["unknown"].append({"gateway_name": name})
+
+        report["consistent"] = not (report["missing"] or report["unknown"] or report["mismatched"])
+        return report
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "last_sync": self.last_sync,
+            "gateways": len(self._gateways),
+            "sensors": len(self._by_last_seen),
+            **self._stats,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.sync_interval_s)
+            last_full_sync = self._last_full_sync
+            full = last_full_sync is None or loop.time() - last_full_sync >= self.full_sync_interval_s
+            try:
+                await self.sync(full=full)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._stats["failed_syncs"] += 1
+                logger.warning("Device registry sync failed (%s)", exc)
+
+    def _put_gateway(self, device: Any) -> GatewayEntry:
+        gateway = self._gateways.get(device.device_name)
+        if gateway is None:
+            gateway = self._gateways[device.device_name] = GatewayEntry(
+                device.device_name, device.device_address, device.url
+            )
+        else:
+            gateway.device_address, gateway.url = device.device_address, device.url
+        gateway.uuid = getattr(device, "uuid", gateway.uuid)
+        gateway.registered_at = getattr(device, "registered_at", gateway.registered_at)
+        return gateway
+
+    def _put_sensor(self, gateway: GatewayEntry, device: Any) -> SensorEntry:
+        sensor = gateway.sensors.get(device.device_name)
+        if sensor is None:
+            sensor = gateway.sensors[device.device_name] = SensorEntry(
+                gateway.device_name, device.device_name, device.device_address
+            )
+            self._by_last_seen[sensor] = None
+            self._by_last_seen.move_to_end(sensor, last=False)
+        else:
+            sensor.device_address = device.device_address
+        sensor.uuid = getattr(device, "uuid", sensor.uuid)
+        sensor.registered_at = getattr(device, "registered_at", sensor.registered_at)
+        return sensor
+
+    def _drop_sensor(self, sensor: SensorEntry):
+        for name in INDEXED_FIELDS:
+            value = getattr(sensor, name)
+            if value is not None:
+                self._unindex(name, value, sensor)
+        self._by_last_seen.pop(sensor, None)
+        del self._gateways[sensor.gateway_name].sensors[sensor.device_name]
+
+    def _unindex(self, name: str, value: Any, sensor: SensorEntry):
+        sensors = self._index[name][value]
+        sensors.discard(sensor)
+        if not sensors:
+            del self._index[name][value]
+
+    def _seen_since(self, since: float) -> list[SensorEntry]:
+        seen = []
+        for sensor in reversed(self._by_last_seen):
+            if sensor.last_seen is None or sensor.last_seen < since:
+                break
+            seen.append(sensor)
+        return seen
+
+    def _not_seen_since(self, since: float) -> list[SensorEntry]:
+        not_seen = []
+        for sensor in self._by_last_seen:
+            if sensor.last_seen is not None and sensor.last_seen >= since:
+                break
+            not_seen.append(sensor)
+        return not_seen
@@ -0,0 +1,198 @@
+"""
+Supervised background task executor.
+
+Side effects of the ingest path (latency benchmark commands, adaptive inference
+commands, ...) do not affect the response returned to the gateway, so they are
+handed to this executor instead of being awaited inline. Tasks run on a fixed
+pool of workers (bounded concurrency), failed tasks are retried with exponential
+backoff and tasks that exhaust their retries end up in a bounded dead-letter list.
+"""
+
+import asyncio
+import collections
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from app.core.config import (
+    BACKGROUND_TASK_WORKERS,
+    BACKGROUND_TASK_QUEUE_SIZE,
+    BACKGROUND_TASK_MAX_RETRIES,
+    BACKGROUND_TASK_RETRY_DELAY_MS,
+    BACKGROUND_TASK_DEAD_LETTER_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _Task:
+    __slots__ = ("name", "func", "args", "attempts")
+
+    def __init__(self, name: str, func: Callable[..., Awaitable], args: tuple):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.attempts = 0
+
+
+class BackgroundTaskExecutor:
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        max_retries: int,
+        retry_delay_ms: int,
+        dead_letter_size: int,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_delay_ms = retry_delay_ms
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._retry_handles: dict[asyncio.TimerHandle, _Task] = {}
+        self._accepting = True
+        self._dead_letters: collections.deque = collections.deque(maxlen=dead_letter_size)
+        self._stats = collections.Counter()
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._accepting = True
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"background-task-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def shutdown(self, timeout: float = 10.0):
+        """
+        Stop accepting tasks, run what is already queued (pending retries are
+        run immediately) and dead-letter whatever is left after `timeout` seconds,
+        including the tasks cancelled while running.
+        """
+        self._accepting = False
+        if not self._workers:
+            return
+
+        for handle, task in list(self._retry_handles.items()):
+            handle.cancel()
+            self._enqueue(task)
+        self._retry_handles.clear()
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Background tasks did not drain within %.1fs", timeout)
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        while not self._queue.empty():
+            task = self._queue.get_nowait()
+            self._dead_letter(task, "executor shut down before the task could run")
+
+    # --- Public API ---
+
+    def submit(self, name: str, func: Callable[..., Awaitable], *args) -> bool:
+        """
+        Schedule `func(*args)` to run in the background. Returns False if the
+        task was rejected (executor shutting down or queue full), in which case
+        it is recorded in the dead-letter list.
+        """
+        task = _Task(name, func, args)
+        if not self._accepting:
+            self._dead_letter(task, "executor is shutting down")
+            return False
+        if not self._workers:
+            self.start()
+        self._stats["submitted"] += 1
+        return self._enqueue(task)
+
+    @property
+    def dead_letters(self) -> list[dict]:
+        return list(self._dead_letters)
+
+    def clear_dead_letters(self) -> int:
+        count = len(self._dead_letters)
+        self._dead_letters.clear()
+        return count
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "pending_retries": len(self._retry_handles),
+            "dead_letters": len(self._dead_letters),
+            **self._stats,
+        }
+
+    # --- Internals ---
+
+    def _enqueue(self, task: _Task) -> bool:
+        try:
+            self._queue.put_nowait(task)
+        except asyncio.QueueFull:
+            self._dead_letter(task, "background task queue is full")
+            return False
+        return True
+
+    def _dead_letter(self, task: _Task, error: str):
+        self._stats["dead_lettered"] += 1
+        self._dead_letters.append({
+            "name": task.name,
+            "args": [repr(arg) for arg in task.args],
+            "attempts": task.attempts,
+            "error": error,
+            "failed_at": time.time(),
+        })
+
+    def _schedule_retry(self, task: _Task):
+        delay = self.retry_delay_ms * (2 ** (task.attempts - 1)) / 1000
+        loop = asyncio.get_running_loop()
+
+        def _retry():
+            self._retry_handles.pop(handle, None)
+            self._enqueue(task)
+
+        handle = loop.call_later(delay, _retry)
+        self._retry_handles[handle] = task
+
+    async def _worker(self):
+        while True:
+            task = await self._queue.get()
+            try:
+                task.attempts += 1
+                await task.func(*task.args)
+                self._stats["succeeded"] += 1
+            except asyncio.CancelledError:
+                # Still running when shutdown gave up waiting
+                logger.warning("Background task %s cancelled by shutdown", task.name)
+                self._dead_letter(task, "cancelled by executor shutdown while running")
+                raise
+            except Exception as exc:
+                error = f"{type(exc).__name__}: {getattr(exc, 'detail', exc)}"
+                if task.attempts <= self.max_retries and self._accepting:
+                    self._stats["retried"] += 1
+                    logger.info("Background task %s failed (%s), retrying", task.name, error)
+                    self._schedule_retry(task)
+                else:
+                    logger.error("Background task %s failed permanently: %s", task.name, error)
+                    self._dead_letter(task, error)
+            finally:
+                self._queue.task_done()
+
+
+background_tasks = BackgroundTaskExecutor(
+    workers=BACKGROUND_TASK_WORKERS,
+    queue_size=BACKGROUND_TASK_QUEUE_SIZE,
+    max_retries=BACKGROUND_TASK_MAX_RETRIES,
+    retry_delay_ms=BACKGROUND_TASK_RETRY_DELAY_MS,
+    dead_letter_size=BACKGROUND_TASK_DEAD_LETTER_SIZE,
+)
@@ -0,0 +1,34 @@
+"""
+Lean ingest deployment of the cloud API.
+
+Mounts only the gateway routes, without the session and CORS middleware of
+the full app in `app.main`: gateways talk to the API machine to machine and
+never use cookies or browsers. It doesn't import the application routes, so it
+starts faster, and exports only go through the body compression middleware.
+The admin routes are left out too: the ingest app faces the gateways, and
+operators reach the admin routes through the full app.
+
+Run it with `python -m app.server --app ingest`.
+"""
+
+from fastapi import FastAPI
+from app.api.routes.gateway import gateway_router
+from app.api.lifespan import lifespan
+from app.core.config import (
+    REQUEST_DECOMPRESSION_MAX_BYTES,
+    RESPONSE_COMPRESSION,
+    RESPONSE_COMPRESSION_MIN_BYTES,
+    RESPONSE_COMPRESSION_LEVEL,
+)
+from app.core.compression import RequestDecompressionMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+
+app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+
+# Compressed request bodies and responses
+app.add_middleware(RequestDecompressionMiddleware, max_size=REQUEST_DECOMPRESSION_MAX_BYTES)
+if RESPONSE_COMPRESSION:
+    app.add_middleware(GZipMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_BYTES, compresslevel=RESPONSE_COMPRESSION_LEVEL)
+
+# Routes
+app.include_router(gateway_router, prefix="/api/v1")
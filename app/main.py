@@ -1,11 +1,23 @@
 from fastapi import FastAPI
 from app.api.routes.application import application_router
 from app.api.routes.gateway import gateway_router
-from app.core.config import SECRET_KEY, ORIGINS
+from app.api.routes.admin import admin_router
+from app.api.routes.fleet import fleet_router
+from app.api.lifespan import lifespan
+from app.core.config import (
+    SECRET_KEY,
+    ORIGINS,
+    REQUEST_DECOMPRESSION_MAX_BYTES,
+    RESPONSE_COMPRESSION,
+    RESPONSE_COMPRESSION_MIN_BYTES,
+    RESPONSE_COMPRESSION_LEVEL,
+)
+from app.core.compression import RequestDecompressionMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
 
@@ -18,6 +30,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compressed request bodies and responses
+app.add_middleware(RequestDecompressionMiddleware, max_size=REQUEST_DECOMPRESSION_MAX_BYTES)
+if RESPONSE_COMPRESSION:
+    app.add_middleware(GZipMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_BYTES, compresslevel=RESPONSE_COMPRESSION_LEVEL)
+
 # Routes
 app.include_router(application_router, prefix="/api/v1")
 app.include_router(gateway_router, prefix="/api/v1")
+app.include_router(admin_router, prefix="/api/v1")
+app.include_router(fleet_router, prefix="/api/v1")
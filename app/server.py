@@ -0,0 +1,125 @@
+"""
+Production entry point of the cloud API.
+
+    python -m app.server [--app full|ingest] [--workers N] [--host HOST] [--port PORT]
+
+`--app full` (default) serves every route (`app.main`), `--app ingest` serves
+the lean gateway-only app (`app.ingest`).
+
+Runs uvicorn with one worker process by default (`--workers N` for more, see
+below), using uvloop and httptools when they are installed. Before spawning the
+workers the launcher imports the application once as a check, so configuration
+and import errors fail fast instead of crash-looping every worker. It is only a check: the
+workers are spawned processes that import the application again, and share no
+state with the launcher.
+
+On SIGTERM/SIGINT uvicorn stops accepting connections and waits up to
+`--graceful-timeout` seconds for in-flight requests (e.g. exports waiting on
+cloud inference) to finish; each worker then runs the app's shutdown, which
+drains background tasks and pending inference batches and flushes the ingest
+journal.
+
+Multi-worker operation: every worker is a separate process with its own event
+loop, so process-local state is per worker. The launcher refuses more than one
+worker while AGGREGATES, GATEWAY_CHANNEL or DEVICE_REGISTRY is enabled, since
+those features would silently serve partial state; otherwise:
+    - HTTP connections and executors (background tasks, inference batcher, local
+      inference pool) are created per worker; size them per worker.
+    - A model uploaded for local inference is loaded by the worker that handled the
+      upload and saved to LOCAL_INFERENCE_MODEL_PATH; the other workers load it
+      within LOCAL_INFERENCE_MODEL_POLL_S. With the path unset, only the uploading
+      worker has the model and the others answer 503.
+    - In-memory caches (export idempotency, ...) only see the requests their worker
+      handled: a gateway retry landing on another worker is not deduplicated by it.
+    - The export rate limit is enforced by each worker on its own, so a gateway
+      spreading its exports over N workers is admitted up to N times the rate.
+    - The entity (ETag) cache is invalidated only in the worker that handled the
+      change: the others keep serving the stale body, and answering 304 to it,
+      until ENTITY_CACHE_TTL_S expires.
+    - Event-loop diagnostics (lag, slow callbacks, profiles) describe the worker
+      that served the admin request.
+    - The ingest journal gives each worker its own `slot-<n>` directory under
+      INGEST_JOURNAL_DIR; slots left behind by a smaller worker count are drained
+      by the live workers. INGEST_JOURNAL_SLOT_MAX_BYTES bounds each slot, so N
+      workers may use up to N times it on disk.
+
+Use `--reload` for development only: it runs a single worker and watches files.
+"""
+
+import argparse
+import importlib
+import importlib.util
+
+import uvicorn
+
+from app.core.config import (
+    AGGREGATES,
+    GATEWAY_CHANNEL,
+    DEVICE_REGISTRY,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_WORKERS,
+    SERVER_GRACEFUL_SHUTDOWN_TIMEOUT_S,
+    SERVER_APP,
+)
+
+APPS = {
+    "full": "app.main:app",
+    "ingest": "app.ingest:app",
+}
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _check_import(app: str):
+    """
+    Imports `app` ("module:attribute") to surface its errors in the launcher.
+    """
+    module, _, attribute = app.partition(":")
+    getattr(importlib.import_module(module), attribute)
+
+
+def _single_worker_features() -> list[str]:
+    """
+    Enabled features whose state lives in one worker: the fleet query fields of the
+    device registry, rolling aggregates and channel sessions would each reflect
+    only the traffic their worker handled.
+    """
+    features = {"AGGREGATES": AGGREGATES, "GATEWAY_CHANNEL": GATEWAY_CHANNEL, "DEVICE_REGISTRY": DEVICE_REGISTRY}
+    return [name for name, enabled in features.items() if enabled]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ESN cloud API")
+    parser.add_argument("--app", choices=APPS, default=SERVER_APP)
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--graceful-timeout", type=int, default=SERVER_GRACEFUL_SHUTDOWN_TIMEOUT_S)
+    parser.add_argument("--reload", action="store_true", help="single worker with auto-reload, development only")
+    args = parser.parse_args()
+
+    workers = 1 if args.reload else max(args.workers, 1)
+    single_worker_features = _single_worker_features()
+    if workers > 1 and single_worker_features:
+        parser.error(f"--workers {workers} requires {', '.join(single_worker_features)} disabled")
+
+    app = APPS[args.app]
+    _check_import(app)
+
+    uvicorn.run(
+        app,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        reload=args.reload,
+        loop="uvloop" if _available("uvloop") else "asyncio",
+        http="httptools" if _available("httptools") else "h11",
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    main()
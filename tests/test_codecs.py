@@ -0,0 +1,28 @@
+import pytest
+
+from app.core.codecs import ReadingCodec, decode_values, zstandard
+
+# Exactly representable in float32, so the lossy codec decodes them unchanged
+VALUES = [[0.5, -1.25], [3.0, 0.0], [0.125, 2.5]]
+
+
+@pytest.mark.parametrize("codec_id", ["json", "delta+zlib", "delta+none", "f32+zlib"])
+def test_values_round_trip(codec_id):
+    assert decode_values(ReadingCodec(codec_id, level=3).encode(VALUES)) == VALUES
+
+
+def test_ragged_values_are_stored_as_json():
+    ragged = [[1.0, 2.0], [3.0]]
+    assert ReadingCodec("f32+zlib", level=3).encode(ragged) == "[[1.0, 2.0], [3.0]]"
+
+
+@pytest.mark.parametrize("codec_id", ["bogus", "f32+lz4", "f64+zlib"])
+def test_unknown_codec_is_rejected(codec_id):
+    with pytest.raises(ValueError, match="Unsupported reading codec"):
+        ReadingCodec(codec_id, level=3)
+
+
+@pytest.mark.skipif(zstandard is not None, reason="zstandard is installed")
+def test_zstd_codec_requires_zstandard():
+    with pytest.raises(ValueError, match="requires the zstandard package"):
+        ReadingCodec("f32+zstd", level=3)
@@ -0,0 +1,215 @@
+import asyncio
+import os
+import struct
+
+import pytest
+
+from app.core.journal import Journal, JournalFullError, JournalReplayer
+
+HEADER_SIZE = struct.calcsize("<IIQ")
+SEGMENT_BYTES = 4096
+
+
+def open_journal(directory, segment_bytes=SEGMENT_BYTES, max_bytes=16 * SEGMENT_BYTES, fsync_policy="never", slotted=False):
+    journal = Journal(str(directory), segment_bytes, max_bytes, fsync_policy, slotted=slotted)
+    journal.open()
+    return journal
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".seg"))
+
+
+def payloads(journal, max_records=1000):
+    return [payload for _, payload in journal.read_batch(max_records)]
+
+
+def corrupt_tail(directory, data: bytes):
+    """
+    Writes `data` right after the last record of the last segment, as a crash
+    in the middle of an append would leave it.
+    """
+    journal = open_journal(directory)
+    segment = journal._segments[-1]
+    path, offset = segment.path, segment.write_offset
+    journal.close()
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+    return path, offset
+
+
+def test_records_survive_reopen(tmp_path):
+    journal = open_journal(tmp_path)
+    for i in range(3):
+        assert journal.append(b"record-%d" % i) == i + 1
+    journal.close()
+
+    journal = open_journal(tmp_path)
+    assert journal.pending == 3
+    assert payloads(journal) == [b"record-0", b"record-1", b"record-2"]
+    journal.close()
+
+
+@pytest.mark.parametrize("torn", [
+    # Payload written, header with a bad checksum
+    struct.pack("<IIQ", 8, 12345, 3) + b"partial!",
+    # Header cut in the middle
+    b"\x08\x00\x00\x00\x39\x30",
+])
+def test_torn_record_is_truncated_on_reopen(tmp_path, torn):
+    journal = open_journal(tmp_path)
+    journal.append(b"record-0")
+    journal.append(b"record-1")
+    journal.close()
+    path, offset = corrupt_tail(tmp_path, torn)
+
+    journal = open_journal(tmp_path)
+    assert journal.pending == 2
+    assert payloads(journal) == [b"record-0", b"record-1"]
+    with open(path, "rb") as f:
+        f.seek(offset)
+        assert not any(f.read(HEADER_SIZE))
+
+    # Appends continue where the valid part ends
+    assert journal.append(b"record-2") == 3
+    journal.close()
+    journal = open_journal(tmp_path)
+    assert payloads(journal) == [b"record-0", b"record-1", b"record-2"]
+    journal.close()
+
+
+def test_replay_resumes_after_reopen(tmp_path):
+    journal = open_journal(tmp_path)
+    for i in range(5):
+        journal.append(b"record-%d" % i)
+    batch = journal.read_batch(2)
+    journal.commit(batch[-1][0])
+    journal.close()
+
+    journal = open_journal(tmp_path)
+    assert journal.pending == 3
+    assert payloads(journal) == [b"record-2", b"record-3", b"record-4"]
+    journal.commit(5)
+    journal.close()
+
+    # Numbering continues after the checkpoint
+    journal = open_journal(tmp_path)
+    assert journal.pending == 0
+    assert journal.append(b"record-5") == 6
+    journal.close()
+
+
+def test_segments_rotate_and_are_dropped_once_replayed(tmp_path):
+    journal = open_journal(tmp_path, segment_bytes=256)
+    records = [b"x" * 100 + b"%03d" % i for i in range(10)]
+    for record in records:
+        journal.append(record)
+    assert len(segment_files(tmp_path)) == 5
+    journal.close()
+
+    journal = open_journal(tmp_path, segment_bytes=256)
+    assert payloads(journal) == records
+    journal.commit(6)
+    assert len(segment_files(tmp_path)) == 2
+    assert payloads(journal) == records[6:]
+    journal.commit(10)
+    # The active segment is kept
+    assert len(segment_files(tmp_path)) == 1
+    journal.close()
+
+
+def test_append_fails_when_budget_is_exhausted(tmp_path):
+    journal = open_journal(tmp_path, segment_bytes=256, max_bytes=512)
+    record = b"x" * 100
+    for _ in range(4):
+        journal.append(record)
+    with pytest.raises(JournalFullError):
+        journal.append(record)
+    assert journal.stats["rejected"] == 1
+
+    # Replaying frees the budget
+    journal.commit(4)
+    journal.append(record)
+    journal.close()
+
+
+def test_adopt_orphan_skips_slots_without_segments(tmp_path):
+    orphan = open_journal(tmp_path / "slot-1")
+    orphan.append(b"orphaned")
+    orphan.close()
+    os.makedirs(tmp_path / "slot-2")
+
+    journal = open_journal(tmp_path, slotted=True)
+    assert journal.directory == str(tmp_path / "slot-0")
+    adopted = journal.adopt_orphan()
+    assert adopted.directory == str(tmp_path / "slot-1")
+    assert payloads(adopted) == [b"orphaned"]
+    adopted.close()
+    assert segment_files(tmp_path / "slot-2") == []
+    journal.close()
+
+
+def run_replayer(journal, replay, until, fsync_interval_ms=1000):
+    async def main():
+        replayer = JournalReplayer(
+            journal, replay, batch_size=2, interval_ms=5, max_backoff_ms=20, fsync_interval_ms=fsync_interval_ms,
+        )
+        replayer.start()
+        try:
+            for _ in range(200):
+                if until(replayer):
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await replayer.stop()
+        return replayer
+
+    return asyncio.run(main())
+
+
+def test_failed_batch_is_retried(tmp_path):
+    journal = open_journal(tmp_path)
+    for i in range(3):
+        journal.append(b"record-%d" % i)
+    replayed, failures = [], [ConnectionError("data ms down")] * 2
+
+    async def replay(batch):
+        if failures:
+            raise failures.pop()
+        replayed.extend(batch)
+        return []
+
+    replayer = run_replayer(journal, replay, until=lambda _: journal.pending == 0)
+    assert replayed == [b"record-0", b"record-1", b"record-2"]
+    assert replayer.stats["failed_batches"] == 2
+    assert replayer.healthy
+    journal.close()
+
+
+def test_rejected_records_are_dead_lettered(tmp_path):
+    journal = open_journal(tmp_path)
+    for i in range(3):
+        journal.append(b"record-%d" % i)
+
+    async def replay(batch):
+        return [(index, ValueError("rejected")) for index, payload in enumerate(batch) if payload == b"record-1"]
+
+    replayer = run_replayer(journal, replay, until=lambda _: journal.pending == 0)
+    assert journal.pending == 0
+    assert [entry["record"] for entry in replayer.dead_letters] == ["record-1"]
+    assert replayer.stats["replayed_records"] == 2
+    journal.close()
+
+
+def test_interval_fsync_runs_during_backoff(tmp_path):
+    journal = open_journal(tmp_path, fsync_policy="interval")
+    journal.append(b"record-0")
+
+    async def replay(batch):
+        raise ConnectionError("data ms down")
+
+    run_replayer(journal, replay, until=lambda _: not journal._dirty, fsync_interval_ms=10)
+    assert not journal._dirty
+    assert journal.pending == 1
+    journal.close()
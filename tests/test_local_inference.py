@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from app.core.local_inference import LocalInferenceEngine, ModelNotLoadedError
+
+
+@pytest.mark.parametrize("executor_kind", ["thread", "process"])
+def test_stand_in_predictions(tmp_path, executor_kind):
+    engine = LocalInferenceEngine("stand-in", executor_kind, workers=2, model_path=str(tmp_path / "model.bin"))
+
+    async def main():
+        with pytest.raises(ModelNotLoadedError):
+            await engine.predict([[0.1]])
+        engine.load(b"")
+        return await asyncio.gather(
+            engine.predict([[0.1, -0.2], [0.3, 0.1]]),
+            engine.predict([[2.0, -3.0], [4.0, 1.5]]),
+            engine.predict([]),
+        )
+
+    try:
+        normal, anomalous, empty = asyncio.run(main())
+    finally:
+        engine.shutdown()
+    assert normal == {"prediction_result": 0, "heuristic_result": None}
+    assert anomalous == {"prediction_result": 1, "heuristic_result": None}
+    assert empty == {"prediction_result": 0, "heuristic_result": None}
+
+
+def test_uploaded_model_reaches_other_engines(tmp_path):
+    model_path = str(tmp_path / "model.bin")
+    uploader = LocalInferenceEngine("stand-in", "thread", workers=1, model_path=model_path, poll_interval_s=0.01)
+    other = LocalInferenceEngine("stand-in", "thread", workers=1, model_path=model_path, poll_interval_s=0.01)
+
+    async def main():
+        await other.start()
+        assert not other.loaded
+        # base64 of zlib.compress(b"model")
+        await uploader.load_payload("eJzLzU9JzQEABkQCEg==")
+        for _ in range(100):
+            if other.loaded:
+                break
+            await asyncio.sleep(0.01)
+        return await other.predict([[0.5]])
+
+    try:
+        assert asyncio.run(main()) == {"prediction_result": 0, "heuristic_result": None}
+    finally:
+        uploader.shutdown()
+        other.shutdown()
@@ -0,0 +1,68 @@
+"""
+Benchmark of the reading codecs (app.core.codecs) against the plain JSON
+encoding of the values, over synthetic vibration windows: a few harmonics of a
+rotating machine plus noise, 3 axes, rounded to the accelerometer's resolution.
+
+Reports the stored size per sample, the compression ratio against JSON, encode
+and decode throughput, and the maximum decoding error (non-zero for f16 only).
+
+Usage: python bench_codecs.py [samples] [readings]
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.core.codecs import ARRAY_ENCODINGS, COMPRESSIONS, JSON_CODEC, ReadingCodec, decode_values  # noqa: E402
+
+
+def vibration_windows(samples: int, readings: int, rate_hz: float = 1000, resolution: float = 1 / 4096) -> list:
+    rng = np.random.default_rng(0)
+    t = np.arange(samples)[:, np.newaxis] / rate_hz
+    windows = []
+    for _ in range(readings):
+        shaft_hz = rng.uniform(20, 60)
+        signal = sum(
+            rng.uniform(0.05, 1) / harmonic * np.sin(2 * np.pi * harmonic * shaft_hz * t + rng.uniform(0, 2 * np.pi, 3))
+            for harmonic in range(1, 5)
+        )
+        signal = signal + rng.normal(0, 0.02, (samples, 3)) + np.array([0, 0, 1])    # gravity on z
+        windows.append((np.round(signal / resolution) * resolution).tolist())
+    return windows
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    readings = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    windows = vibration_windows(samples, readings)
+    total_samples = samples * readings
+
+    codecs = [JSON_CODEC] + [
+        f"{encoding}+{compression}" for encoding in ARRAY_ENCODINGS for compression in COMPRESSIONS
+    ]
+    json_size = None
+
+    print(f"{readings} readings of {samples}x3 samples")
+    print(f"{'codec':<12} {'B/sample':>9} {'ratio':>7} {'enc MS/s':>9} {'dec MS/s':>9} {'max error':>10}")
+    for codec_id in codecs:
+        codec = ReadingCodec(codec_id, level=3)
+        encoded = [codec.encode(values) for values in windows]
+        size = sum(len(value) for value in encoded)
+        json_size = json_size or size
+        encode_s = min(timeit.repeat(lambda: [codec.encode(values) for values in windows], number=1, repeat=3))
+        decode_s = min(timeit.repeat(lambda: [decode_values(value) for value in encoded], number=1, repeat=3))
+        error = max(
+            float(np.max(np.abs(np.asarray(decode_values(value)) - np.asarray(values))))
+            for value, values in zip(encoded, windows)
+        )
+        print(
+            f"{codec_id:<12} {size / total_samples:>9.2f} {json_size / size:>7.2f} "
+            f"{total_samples / encode_s / 1e6:>9.2f} {total_samples / decode_s / 1e6:>9.2f} {error:>10.2g}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark of HTTP body compression (app.core.compression): bytes saved against
+CPU time, for the payloads that travel between gateways, the cloud API and the
+microservices: a small command, sensor data exports of several sizes and a
+SetSensorModel command carrying a base64 model.
+
+For every payload and encoding/level it reports the compressed size, the ratio,
+the compression and decompression time, and the bytes saved per millisecond of
+compression CPU. Payloads whose ratio stays close to 1 (tiny bodies, random
+base64 models) are where the size thresholds pay off.
+
+Usage: python bench_compression.py [model_megabytes]
+"""
+
+import base64
+import os
+import random
+import sys
+import timeit
+
+from pydantic_core import to_json
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.core.compression import COMPRESSORS, DECOMPRESSORS, compress  # noqa: E402
+
+LEVELS = {"gzip": (1, 5, 9), "deflate": (5,), "zstd": (1, 3, 9)}
+
+
+def export_body(samples: int) -> bytes:
+    return to_json({
+        "metadata": {"gateway_name": "gateway_1", "sensor_name": "ESP32_AABBCC"},
+        "export_value": {
+            "reading": {"values": [[round(random.gauss(0, 1), 4) for _ in range(3)] for _ in range(samples)]},
+            "low_battery": False,
+            "inference_descriptor": {"inference_layer": 2, "send_timestamp": 1700000000000},
+        },
+    })
+
+
+def model_body(megabytes: float) -> bytes:
+    tf_model_b64 = base64.b64encode(os.urandom(int(megabytes * 2**20))).decode()
+    return to_json({
+        "target": {"gateway_name": "gateway_1", "url": "http://gateway_1", "target_sensors": ["ESP32_AABBCC"]},
+        "property_value": {"tf_model_b64": tf_model_b64, "tf_model_bytesize": len(tf_model_b64)},
+    })
+
+
+def measure(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e3
+
+
+def main():
+    model_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    random.seed(0)
+    payloads = {
+        "command": to_json({"target": {"gateway_name": "gateway_1", "target_sensors": ["ESP32_AABBCC"]}, "property_value": "locked"}),
+        "export 16x3": export_body(16),
+        "export 256x3": export_body(256),
+        "export 4096x3": export_body(4096),
+        f"model {model_mb:g} MB": model_body(model_mb),
+    }
+
+    print(f"{'payload':<16} {'encoding':<10} {'bytes':>10} {'ratio':>6} {'comp ms':>8} {'decomp ms':>9} {'saved B/ms':>11}")
+    for name, body in payloads.items():
+        number = max(1, int(2**20 / len(body)))
+        print(f"{name:<16} {'identity':<10} {len(body):>10}")
+        for encoding in COMPRESSORS:
+            for level in LEVELS[encoding]:
+                compressed = compress(body, encoding, level)
+                compress_ms = measure(lambda: compress(body, encoding, level), number)
+
+                def inflate():
+                    decompressor = DECOMPRESSORS[encoding](len(body))
+                    return decompressor.decompress(compressed) + decompressor.flush()
+
+                assert inflate() == body
+                decompress_ms = measure(inflate, number)
+                print(
+                    f"{'':<16} {f'{encoding}-{level}':<10} {len(compressed):>10} {len(body) / len(compressed):>6.2f} "
+                    f"{compress_ms:>8.3f} {decompress_ms:>9.3f} {(len(body) - len(compressed)) / compress_ms:>11.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Compares reading ID schemes: generation cost and insert locality.
+
+Insert locality is measured by inserting the IDs, in generation order, into a
+sorted list standing in for a B-tree index: with random IDs (uuid4) inserts land
+anywhere in the index, with time-ordered IDs (uuid7) they are appended at its end.
+
+Usage: python bench_ids.py [num_ids]
+"""
+
+import bisect
+import os
+import sys
+import timeit
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.core.ids import uuid7  # noqa: E402
+
+PAGE_SIZE = 128     # index entries per leaf page
+
+
+def generation_cost(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9
+
+
+def insert_locality(ids):
+    index, appends, pages = [], 0, set()
+    for i, _id in enumerate(ids):
+        position = bisect.bisect_left(index, _id)
+        appends += position == len(index)
+        index.insert(position, _id)
+        if i >= len(ids) - 1000:    # leaf pages touched by the last 1000 inserts
+            pages.add(position // PAGE_SIZE)
+    return appends / len(ids) * 100, len(pages)
+
+
+def main():
+    num_ids = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    schemes = {
+        "uuid4": lambda: str(uuid.uuid4()),
+        "uuid7": uuid7,
+    }
+
+    print(f"{'scheme':<8} {'ns/id':>8} {'appends %':>10} {'pages/1000 inserts':>20}")
+    for name, func in schemes.items():
+        cost = generation_cost(func, 20_000)
+        appends, pages = insert_locality([func() for _ in range(num_ids)])
+        print(f"{name:<8} {cost:>8.0f} {appends:>10.1f} {pages:>20}")
+
+
+if __name__ == "__main__":
+    main()
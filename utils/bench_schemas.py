@@ -0,0 +1,66 @@
+"""
+Measures the schema work done per /export/sensor-data request: validating the
+gateway's body and converting it to the inference microservice's request, either
+by dumping and re-validating it or with the shared-schema conversion.
+
+Usage: python bench_schemas.py [samples_per_reading] [channels]
+"""
+
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.api.schemas.cloud_api import gateway as gw_schemas  # noqa: E402
+from app.api.schemas.command_ms import gateway_cmd as gw_cmd_schemas  # noqa: E402
+from app.api.schemas.inference_ms import inference as inf_schemas  # noqa: E402
+from app.api.schemas import conversions  # noqa: E402
+
+
+def export_body(samples, channels):
+    return json.dumps({
+        "metadata": {"gateway_name": "gateway_1", "sensor_name": "ESP32_AABBCC"},
+        "export_value": {
+            "reading": {
+                "uuid": "01a15183-2749-76ca-b6db-f77433308c08",
+                "values": [[random.uniform(-2, 2) for _ in range(channels)] for _ in range(samples)],
+            },
+            "low_battery": False,
+            "inference_descriptor": {"inference_layer": 2, "send_timestamp": 1700000000000},
+        },
+    }).encode()
+
+
+def timed(func, number=200):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 128
+    channels = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    body = export_body(samples, channels)
+    sensor_data = gw_schemas.SensorDataExport.model_validate_json(body)
+
+    results = {
+        "validate export body": lambda: gw_schemas.SensorDataExport.model_validate_json(body),
+        "convert: dump + re-validate": lambda: inf_schemas.PredictionRequestExport.model_validate(sensor_data.model_dump()),
+        "convert: shared schemas": lambda: conversions.to_prediction_request(sensor_data),
+    }
+
+    devices_body = json.dumps([
+        {"device_name": f"ESP32_{i:06X}", "device_address": str(i)} for i in range(100)
+    ]).encode()
+    results.update({
+        "100 BLEDevices: json + per-item": lambda: [gw_cmd_schemas.BLEDevice(**device) for device in json.loads(devices_body)],
+        "100 BLEDevices: TypeAdapter": lambda: gw_cmd_schemas.BLEDeviceList.validate_json(devices_body),
+    })
+
+    print(f"export body: {samples}x{channels} values, {len(body)} bytes")
+    for name, func in results.items():
+        print(f"{name:<36} {timed(func):>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
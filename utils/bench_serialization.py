@@ -0,0 +1,77 @@
+"""
+Regression benchmark for the serialization of payloads forwarded to the
+microservices: `json.dumps(model.model_dump())` (what httpx's `json=` did with
+the dumped dict) against pydantic-core's direct model-to-bytes serialization.
+
+Reports time and peak memory for a SetSensorModel command carrying a large
+`tf_model_b64` and for a reading with a large `values` matrix.
+
+Usage: python bench_serialization.py [model_megabytes] [reading_samples]
+"""
+
+import base64
+import json
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+from pydantic_core import to_json
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.api.schemas.command_ms import sensor_cmd as s_cmd_schemas  # noqa: E402
+from app.api.schemas.cloud_api import gateway as gw_schemas  # noqa: E402
+
+
+def legacy(model):
+    return json.dumps(model.model_dump()).encode()
+
+
+def direct(model):
+    return to_json(model)
+
+
+def measure(func, model, number):
+    seconds = min(timeit.repeat(lambda: func(model), number=number, repeat=3)) / number
+    tracemalloc.start()
+    func(model)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds * 1e3, peak / 2**20
+
+
+def main():
+    model_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+
+    tf_model_b64 = base64.b64encode(os.urandom(int(model_mb * 2**20))).decode()
+    payloads = {
+        f"SetSensorModel ({model_mb:g} MB model)": s_cmd_schemas.SetSensorModel(
+            target=s_cmd_schemas.GatewayAPIWithSensors(
+                gateway_name="gateway_1", url="http://gateway_1", target_sensors=["ESP32_AABBCC"]
+            ),
+            property_value=s_cmd_schemas.SensorModel(
+                tf_model_b64=tf_model_b64, tf_model_bytesize=len(tf_model_b64)
+            ),
+        ),
+        f"SensorDataExport ({samples}x3 values)": gw_schemas.SensorDataExport(
+            metadata={"gateway_name": "gateway_1", "sensor_name": "ESP32_AABBCC"},
+            export_value={
+                "reading": {"values": [[random.uniform(-2, 2) for _ in range(3)] for _ in range(samples)]},
+                "low_battery": False,
+                "inference_descriptor": {"inference_layer": 2},
+            },
+        ),
+    }
+
+    print(f"{'payload':<36} {'method':<8} {'ms':>8} {'peak MB':>8}")
+    for name, model in payloads.items():
+        assert json.loads(legacy(model)) == json.loads(direct(model))
+        for method, func in (("legacy", legacy), ("direct", direct)):
+            ms, peak = measure(func, model, number=5)
+            print(f"{name:<36} {method:<8} {ms:>8.2f} {peak:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
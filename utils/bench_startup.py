@@ -0,0 +1,57 @@
+"""
+Compares the full app (`app.main`) with the lean ingest app (`app.ingest`):
+cold import time, measured in fresh interpreters, and per-request overhead of
+the middleware stack, measured in-process on a route served by both apps.
+
+Usage: python bench_startup.py [imports] [requests]
+"""
+
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+APPS = {"full": "app.main", "ingest": "app.ingest"}
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def import_time(module: str, runs: int) -> float:
+    samples = [
+        float(subprocess.check_output(
+            [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)], cwd=ROOT, text=True
+        ))
+        for _ in range(runs)
+    ]
+    return statistics.median(samples) * 1e3
+
+
+async def request_time(module: str, requests: int) -> float:
+    app = __import__(module, fromlist=["app"]).app
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://cloud-api") as client:
+        for _ in range(50):  # warm up
+            await client.get("/api/v1/admin/tasks")
+        start = time.perf_counter()
+        for _ in range(requests):
+            await client.get("/api/v1/admin/tasks")
+        return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    imports = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    os.environ.setdefault("SECRET_KEY", "bench")
+
+    print(f"{'app':<8} {'import ms':>10} {'us/request':>11}")
+    for name, module in APPS.items():
+        print(f"{name:<8} {import_time(module, imports):>10.0f} {asyncio.run(request_time(module, requests)):>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
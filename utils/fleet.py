@@ -0,0 +1,258 @@
+"""
+Fleet CLI: issues gateway and sensor commands to a whole fleet through the cloud API.
+
+Reads a fleet inventory, groups its sensors per gateway and splits each group
+into batches of `--batch-size` sensors. Every batch is one API call. Batches
+run concurrently, at most `--concurrency` at a time, and failed batches
+(connection errors, 5xx) are retried with exponential backoff.
+
+Usage:
+    python fleet.py register
+    python fleet.py state working [--limit 10]
+    python fleet.py layer cloud
+    python fleet.py config --sleep-interval-ms 1000
+    python fleet.py model ../gateway_model.tflite
+
+Common options: --inventory ../devices.json, --gateway gateway_1 (gateways to
+target, repeatable), --api-url, --concurrency, --batch-size, --retries,
+--progress-file, --resume.
+
+Inventory: either a JSON list of sensor names (sent to `--gateway`, gateway_1 by
+default, as in devices.json), or a JSON object mapping gateway names to lists of
+sensor names or of {"device_name", "device_address"} objects. Sensors given by
+name get their index in the list as device address.
+
+Resumable runs: every completed batch is appended to the progress file
+(`.fleet-progress.jsonl` by default). With `--resume`, batches already recorded
+for the same command and arguments are skipped, so an interrupted run can be
+restarted without sending them again.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+
+import httpx
+
+INFERENCE_LAYERS = {"cloud": 2, "gateway": 1, "sensor": 0}
+SENSOR_STATES = ("initial", "unlocked", "locked", "working", "idle", "error")
+RETRY_STATUSES = (502, 503, 504)
+
+
+# --- Inventory ---
+def load_inventory(path: str, gateways: list[str]) -> dict[str, list[dict]]:
+    with open(path) as f:
+        inventory = json.load(f)
+
+    if isinstance(inventory, list):
+        inventory = {gateway: inventory for gateway in gateways or ["gateway_1"]}
+    elif gateways:
+        missing = set(gateways) - set(inventory)
+        if missing:
+            raise SystemExit(f"gateways not in inventory: {', '.join(sorted(missing))}")
+        inventory = {gateway: inventory[gateway] for gateway in gateways}
+
+    return {
+        gateway: [
+            sensor if isinstance(sensor, dict) else {"device_name": sensor, "device_address": str(i)}
+            for i, sensor in enumerate(sensors)
+        ]
+        for gateway, sensors in inventory.items()
+    }
+
+
+# --- Commands ---
+# Each command builds the request for one batch of sensors of a gateway.
+def register_request(args, gateway: str, sensors: list[dict]) -> dict:
+    return {
+        "url": "/gateway/command/add/registered-sensors",
+        "params": {"gateway_name": gateway},
+        "json": sensors,
+    }
+
+
+def state_request(args, gateway: str, sensors: list[dict]) -> dict:
+    return {
+        "url": f"/sensor/command/set/sensor-state/{args.state}",
+        "params": {"gateway_name": gateway},
+        "json": [sensor["device_name"] for sensor in sensors],
+    }
+
+
+def layer_request(args, gateway: str, sensors: list[dict]) -> dict:
+    return {
+        "url": f"/sensor/command/set/inference-layer/{INFERENCE_LAYERS[args.layer]}",
+        "params": {"gateway_name": gateway},
+        "json": [sensor["device_name"] for sensor in sensors],
+    }
+
+
+def config_request(args, gateway: str, sensors: list[dict]) -> dict:
+    return {
+        "url": "/sensor/command/set/sensor-config",
+        "params": {"gateway_name": gateway},
+        "json": {
+            "sensors": [sensor["device_name"] for sensor in sensors],
+            "config": {"sleep_interval_ms": args.sleep_interval_ms},
+        },
+    }
+
+
+def model_request(args, gateway: str, sensors: list[dict]) -> dict:
+    return {
+        "url": "/sensor/command/set/sensor-model",
+        "params": {"gateway_name": gateway},
+        "data": {"device_names": [sensor["device_name"] for sensor in sensors]},
+        "files": {"tf_model_file": (os.path.basename(args.model_file), args.model)},
+    }
+
+
+COMMANDS = {
+    "register": register_request,
+    "state": state_request,
+    "layer": layer_request,
+    "config": config_request,
+    "model": model_request,
+}
+
+
+# --- Runner ---
+class Progress:
+    """
+    Completed batches, persisted as JSON lines so that a run can be resumed.
+    """
+
+    def __init__(self, path: str, resume: bool):
+        self.done = set()
+        if resume and os.path.exists(path):
+            with open(path) as f:
+                self.done = {json.loads(line)["key"] for line in f if line.strip()}
+        self._file = open(path, "a" if resume else "w")
+
+    def record(self, key: str, gateway: str, sensors: int):
+        self._file.write(json.dumps({"key": key, "gateway": gateway, "sensors": sensors}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def batch_key(args, gateway: str, sensors: list[dict]) -> str:
+    signature = [args.command, getattr(args, "state", None), getattr(args, "layer", None),
+                 getattr(args, "sleep_interval_ms", None), getattr(args, "model_digest", None),
+                 gateway, [sensor["device_name"] for sensor in sensors]]
+    return hashlib.sha256(json.dumps(signature).encode()).hexdigest()
+
+
+async def send_batch(client: httpx.AsyncClient, request: dict, retries: int) -> httpx.Response:
+    for attempt in range(retries + 1):
+        try:
+            response = await client.post(**request)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+        if attempt < retries:
+            await asyncio.sleep(0.5 * 2 ** attempt)
+    return response
+
+
+async def run(args, inventory: dict[str, list[dict]]) -> int:
+    build_request = COMMANDS[args.command]
+    batches = [
+        (gateway, sensors[i:i + args.batch_size])
+        for gateway, sensors in inventory.items()
+        for i in range(0, len(sensors), args.batch_size)
+    ]
+    progress = Progress(args.progress_file, args.resume)
+    pending = [
+        (gateway, sensors, key) for gateway, sensors in batches
+        if (key := batch_key(args, gateway, sensors)) not in progress.done
+    ]
+    skipped = len(batches) - len(pending)
+    total_sensors = sum(len(sensors) for sensors in inventory.values())
+    print(f"{args.command}: {total_sensors} sensors on {len(inventory)} gateways, "
+          f"{len(batches)} batches ({skipped} already done)")
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    counts = {"ok": 0, "failed": 0}
+    start = time.monotonic()
+
+    async def run_batch(client, gateway, sensors, key):
+        async with semaphore:
+            try:
+                response = await send_batch(client, build_request(args, gateway, sensors), args.retries)
+                error = None if response.is_success else f"{response.status_code} {response.text[:200]}"
+            except httpx.HTTPError as exc:
+                error = f"{type(exc).__name__}: {exc}"
+
+        if error is None:
+            counts["ok"] += 1
+            progress.record(key, gateway, len(sensors))
+        else:
+            counts["failed"] += 1
+        done = counts["ok"] + counts["failed"]
+        status = "ok" if error is None else f"FAILED {error}"
+        print(f"[{done}/{len(pending)}] {gateway} ({len(sensors)} sensors): {status}", flush=True)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=args.api_url, limits=limits, timeout=args.timeout) as client:
+            await asyncio.gather(*(run_batch(client, *batch) for batch in pending))
+    finally:
+        progress.close()
+
+    print(f"{counts['ok']} batches ok, {counts['failed']} failed in {time.monotonic() - start:.1f}s")
+    if counts["failed"]:
+        print("rerun with --resume to retry the failed batches")
+    return 1 if counts["failed"] else 0
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--inventory", default=os.path.join(os.path.dirname(__file__), "..", "devices.json"))
+    common.add_argument("--gateway", dest="gateways", action="append", default=[],
+                        help="target gateway (repeatable), all gateways of the inventory by default")
+    common.add_argument("--limit", type=int, help="only the first N sensors of each gateway")
+    common.add_argument("--api-url", default=os.environ.get("CLOUD_API_URL", "http://localhost:8000/api/v1"))
+    common.add_argument("--concurrency", type=int, default=8, help="batches in flight")
+    common.add_argument("--batch-size", type=int, default=50, help="sensors per API call")
+    common.add_argument("--retries", type=int, default=3)
+    common.add_argument("--timeout", type=float, default=60)
+    common.add_argument("--progress-file", default=".fleet-progress.jsonl")
+    common.add_argument("--resume", action="store_true", help="skip batches completed by a previous run")
+
+    parser = argparse.ArgumentParser(description="Send commands to a fleet of ESN sensors")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("register", parents=[common], help="register the sensors on their gateways")
+    state = commands.add_parser("state", parents=[common], help="set the sensor state")
+    state.add_argument("state", choices=SENSOR_STATES)
+    layer = commands.add_parser("layer", parents=[common], help="set the inference layer")
+    layer.add_argument("layer", choices=INFERENCE_LAYERS)
+    config = commands.add_parser("config", parents=[common], help="set the sensor config")
+    config.add_argument("--sleep-interval-ms", type=int, required=True)
+    model = commands.add_parser("model", parents=[common], help="send a TFLite model to the sensors")
+    model.add_argument("model_file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.command == "model":
+        with open(args.model_file, "rb") as f:
+            args.model = f.read()
+        args.model_digest = hashlib.sha256(args.model).hexdigest()
+
+    inventory = load_inventory(args.inventory, args.gateways)
+    if args.limit is not None:
+        inventory = {gateway: sensors[:args.limit] for gateway, sensors in inventory.items()}
+    return asyncio.run(run(args, inventory))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""
+Load generator for the cloud API.
+
+Simulates `gateways` x `sensors` sensors, each posting a SensorDataExport to
+/export/sensor-data at `rate` exports per second (open loop: a slow response
+doesn't delay the next export). Each sensor is assigned an inference layer
+according to the layer mix. For every scenario it reports throughput, latency
+percentiles and the number of calls each upstream microservice received.
+
+By default it runs everything offline: the stub microservices
+(stub_microservices.py) and the cloud API (`python -m app.server`) are started
+as subprocesses. Pass --api-url (and --stub-url) to target running instances.
+
+Usage:
+    python load_generator.py --gateways 4 --sensors 25 --rate 2 --duration 20 \\
+        --layers cloud=0.2,gateway=0.4,sensor=0.4
+    python load_generator.py --scenarios scenarios.json
+
+A scenarios file is a JSON list of objects with any of the keys: name, gateways,
+sensors, rate, duration, layers, samples, api_env (extra environment for the API).
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+UTILS = os.path.dirname(os.path.abspath(__file__))
+LAYERS = {"cloud": 2, "gateway": 1, "sensor": 0}
+STUB_SERVICES = ("data", "command", "inference")
+
+
+def parse_layers(layers: str) -> dict[int, float]:
+    mix = {}
+    for item in layers.split(","):
+        name, _, weight = item.partition("=")
+        mix[LAYERS[name.strip()]] = float(weight)
+    return mix
+
+
+def export_body(gateway: str, sensor: str, layer: int, samples: int) -> dict:
+    now_ms = int(time.time() * 1000)
+    descriptor = {"inference_layer": layer, "send_timestamp": now_ms - 5, "recv_timestamp": now_ms}
+    if layer != LAYERS["cloud"]:
+        descriptor["prediction"] = 0
+    return {
+        "metadata": {"gateway_name": gateway, "sensor_name": sensor},
+        "export_value": {
+            "reading": {"values": [[random.gauss(0, 1) for _ in range(3)] for _ in range(samples)]},
+            "low_battery": random.random() < 0.05,
+            "inference_descriptor": descriptor,
+        },
+    }
+
+
+class Results:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = collections.Counter()
+
+
+async def simulate_sensor(client, url, gateway, sensor, layer, scenario, results, deadline):
+    interval = 1 / scenario["rate"]
+    inflight = set()
+    await asyncio.sleep(random.uniform(0, interval))  # don't start every sensor at once
+
+    async def send():
+        body = export_body(gateway, sensor, layer, scenario["samples"])
+        start = time.perf_counter()
+        try:
+            response = await client.post(url, json=body)
+            results.statuses[response.status_code] += 1
+        except httpx.HTTPError as exc:
+            results.statuses[type(exc).__name__] += 1
+            return
+        results.latencies.append(time.perf_counter() - start)
+
+    next_send = time.monotonic()
+    while next_send < deadline:
+        task = asyncio.create_task(send())
+        inflight.add(task)
+        task.add_done_callback(inflight.discard)
+        next_send += interval
+        await asyncio.sleep(max(0, next_send - time.monotonic()))
+    if inflight:
+        await asyncio.gather(*inflight)
+
+
+async def stub_stats(stub_url: str, stub_base_port: int, reset: bool = False) -> dict:
+    stats = {}
+    async with httpx.AsyncClient(timeout=10) as client:
+        for i, service in enumerate(STUB_SERVICES):
+            url = f"{stub_url}:{stub_base_port + i}/_stats"
+            if reset:
+                await client.delete(url)
+            else:
+                stats[service] = (await client.get(url)).json()
+    return stats
+
+
+async def run_scenario(scenario: dict, api_url: str, stub_url: str, stub_base_port: int) -> dict:
+    await stub_stats(stub_url, stub_base_port, reset=True)
+    mix = parse_layers(scenario["layers"])
+    sensors = [
+        (f"gateway_{g}", f"sensor_{g}_{s}", random.choices(list(mix), weights=list(mix.values()))[0])
+        for g in range(scenario["gateways"])
+        for s in range(scenario["sensors"])
+    ]
+    results = Results()
+    url = f"{api_url}/api/v1/export/sensor-data"
+    limits = httpx.Limits(max_connections=scenario.get("connections", 256))
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        start = time.monotonic()
+        deadline = start + scenario["duration"]
+        await asyncio.gather(*(
+            simulate_sensor(client, url, gateway, sensor, layer, scenario, results, deadline)
+            for gateway, sensor, layer in sensors
+        ))
+        elapsed = time.monotonic() - start
+
+    upstream = await stub_stats(stub_url, stub_base_port)
+    sent = sum(results.statuses.values())
+    report = {
+        "name": scenario["name"],
+        "sensors": len(sensors),
+        "sent": sent,
+        "ok": results.statuses.get(201, 0),
+        "statuses": {str(code): count for code, count in results.statuses.items()},
+        "throughput": results.statuses.get(201, 0) / elapsed,
+        "upstream_calls": {service: stats["total"] for service, stats in upstream.items()},
+        "upstream_routes": {service: stats["calls"] for service, stats in upstream.items()},
+    }
+    if len(results.latencies) >= 2:
+        quantiles = statistics.quantiles(results.latencies, n=100, method="inclusive")
+        report.update({
+            "p50_ms": quantiles[49] * 1e3,
+            "p90_ms": quantiles[89] * 1e3,
+            "p99_ms": quantiles[98] * 1e3,
+            "max_ms": max(results.latencies) * 1e3,
+        })
+    return report
+
+
+def print_report(report: dict):
+    per_export = {
+        service: calls / report["sent"] if report["sent"] else 0
+        for service, calls in report["upstream_calls"].items()
+    }
+    print(f"\n== {report['name']} ({report['sensors']} sensors)")
+    print(f"  sent {report['sent']}, ok {report['ok']}, statuses {report['statuses']}")
+    print(f"  throughput {report['throughput']:.1f} exports/s")
+    if "p50_ms" in report:
+        print(
+            f"  latency p50 {report['p50_ms']:.1f} ms, p90 {report['p90_ms']:.1f} ms, "
+            f"p99 {report['p99_ms']:.1f} ms, max {report['max_ms']:.1f} ms"
+        )
+    print("  upstream calls " + ", ".join(
+        f"{service} {calls} ({per_export[service]:.2f}/export)" for service, calls in report["upstream_calls"].items()
+    ))
+
+
+async def wait_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def start_api(port: int, workers: int, stub_base_port: int, extra_env: dict) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DATA_MICROSERVICE_URL": f"http://127.0.0.1:{stub_base_port}",
+        "COMMAND_MICROSERVICE_URL": f"http://127.0.0.1:{stub_base_port + 1}",
+        "INFERENCE_MICROSERVICE_URL": f"http://127.0.0.1:{stub_base_port + 2}",
+        "SECRET_KEY": "load-generator",
+        **{key: str(value) for key, value in extra_env.items()},
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--port", str(port), "--workers", str(workers)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cloud API load generator")
+    parser.add_argument("--gateways", type=int, default=2)
+    parser.add_argument("--sensors", type=int, default=10, help="sensors per gateway")
+    parser.add_argument("--rate", type=float, default=1, help="exports per second per sensor")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--layers", default="cloud=0.34,gateway=0.33,sensor=0.33")
+    parser.add_argument("--samples", type=int, default=64, help="samples per reading (3 channels)")
+    parser.add_argument("--scenarios", help="JSON file with a list of scenarios")
+    parser.add_argument("--api-url", help="target a running cloud API instead of starting one")
+    parser.add_argument("--api-port", type=int, default=8110)
+    parser.add_argument("--api-workers", type=int, default=1)
+    parser.add_argument("--stub-url", default="http://127.0.0.1", help="host of the stub microservices")
+    parser.add_argument("--stub-base-port", type=int, default=8101)
+    parser.add_argument("--stub-args", default="", help="extra arguments for stub_microservices.py")
+    parser.add_argument("--output", help="write the reports as JSON to this file")
+    args = parser.parse_args()
+
+    defaults = {
+        "name": "default", "gateways": args.gateways, "sensors": args.sensors, "rate": args.rate,
+        "duration": args.duration, "layers": args.layers, "samples": args.samples, "api_env": {},
+    }
+    if args.scenarios:
+        with open(args.scenarios) as f:
+            scenarios = [{**defaults, **scenario} for scenario in json.load(f)]
+    else:
+        scenarios = [defaults]
+
+    processes = []
+    if args.api_url is None:
+        processes.append(subprocess.Popen(
+            [sys.executable, "stub_microservices.py", "--base-port", str(args.stub_base_port), *args.stub_args.split()],
+            cwd=UTILS,
+        ))
+    reports = []
+    try:
+        for i in range(len(STUB_SERVICES)):
+            asyncio.run(wait_ready(f"{args.stub_url}:{args.stub_base_port + i}/_stats"))
+        for scenario in scenarios:
+            api, api_url = None, args.api_url
+            if api_url is None:
+                api = start_api(args.api_port, args.api_workers, args.stub_base_port, scenario["api_env"])
+                api_url = f"http://127.0.0.1:{args.api_port}"
+                asyncio.run(wait_ready(f"{api_url}/api/v1/admin/tasks"))
+            try:
+                report = asyncio.run(run_scenario(scenario, api_url, args.stub_url, args.stub_base_port))
+            finally:
+                if api is not None:
+                    api.terminate()
+                    api.wait()
+            print_report(report)
+            reports.append(report)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Load test showing how the cloud API scales with its worker count.
+
+For each worker count, starts `python -m app.server --workers N` against the
+stub Data Microservice and posts sensor-layer exports from `concurrency`
+concurrent clients for `duration` seconds, then reports throughput and latency.
+
+Usage: python load_test.py [--workers 1 2 4] [--concurrency 64] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+UTILS = os.path.dirname(os.path.abspath(__file__))
+STUB_PORT, API_PORT = 8101, 8110
+
+
+def export_body(i: int) -> dict:
+    return {
+        "metadata": {"gateway_name": "gateway_1", "sensor_name": f"sensor_{i % 25}"},
+        "export_value": {
+            "reading": {"values": [[0.1 * j, 0.2 * j, 0.3 * j] for j in range(64)]},
+            "low_battery": False,
+            "inference_descriptor": {"inference_layer": 0, "prediction": 0},
+        },
+    }
+
+
+async def wait_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+async def run_load(concurrency: int, duration: float) -> list[float]:
+    url = f"http://127.0.0.1:{API_PORT}/api/v1/export/sensor-data"
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def worker(worker_id: int):
+            nonlocal errors
+            i = worker_id
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                response = await client.post(url, json=export_body(i))
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 201
+                i += concurrency
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    if errors:
+        print(f"  {errors} requests failed")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    stub = subprocess.Popen(
+        [sys.executable, "stub_microservices.py", "--base-port", str(STUB_PORT), "--data-latency-ms", "0"],
+        cwd=UTILS,
+    )
+    env = {
+        **os.environ,
+        "DATA_MICROSERVICE_URL": f"http://127.0.0.1:{STUB_PORT}",
+        "COMMAND_MICROSERVICE_URL": f"http://127.0.0.1:{STUB_PORT + 1}",
+        "INFERENCE_MICROSERVICE_URL": f"http://127.0.0.1:{STUB_PORT + 2}",
+        "SECRET_KEY": "load-test",
+    }
+    try:
+        asyncio.run(wait_ready(f"http://127.0.0.1:{STUB_PORT}/_stats"))
+        print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for workers in args.workers:
+            server = subprocess.Popen(
+                [sys.executable, "-m", "app.server", "--port", str(API_PORT), "--workers", str(workers)],
+                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                asyncio.run(wait_ready(f"http://127.0.0.1:{API_PORT}/api/v1/admin/tasks"))
+                latencies = asyncio.run(run_load(args.concurrency, args.duration))
+                quantiles = statistics.quantiles(latencies, n=100)
+                print(f"{workers:>7} {len(latencies) / args.duration:>9.0f} {quantiles[49] * 1e3:>8.1f} {quantiles[98] * 1e3:>8.1f}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Stub Data, Command and Inference microservices for offline benchmarks.
+
+Each stub implements the routes the cloud API calls, answers after a
+configurable latency (with jitter) and fails a configurable fraction of calls
+with a 503. Calls are counted per route; `GET /_stats` returns the counts and
+`DELETE /_stats` resets them.
+
+The inference stub behaves like the real task queue: prediction requests return
+a task id and results stay PENDING for `--inference-ms` milliseconds.
+
+Usage: python stub_microservices.py [--base-port 8101] [--data-latency-ms 2]
+       [--command-latency-ms 5] [--inference-latency-ms 2] [--inference-ms 20]
+       [--error-rate 0]
+
+Data MS on base-port, Command MS on base-port + 1, Inference MS on base-port + 2.
+"""
+
+import argparse
+import asyncio
+import collections
+import random
+import signal
+import time
+import uuid
+from datetime import datetime, timezone
+
+import uvicorn
+from fastapi import FastAPI, Request, Response, status
+from starlette.routing import Match
+
+_REGISTERED_AT = datetime.now(timezone.utc).isoformat()
+
+
+def _route_name(app: FastAPI, request: Request) -> str:
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.name
+    return request.url.path
+
+
+def _stub_app(name: str, latency_ms: float, error_rate: float) -> FastAPI:
+    app = FastAPI(title=f"stub {name}")
+    calls = collections.Counter()
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        if request.url.path == "/_stats":
+            return await call_next(request)
+        calls[_route_name(app, request)] += 1
+        if latency_ms:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * latency_ms / 1000)
+        if error_rate and random.random() < error_rate:
+            return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=b'"stub error"')
+        return await call_next(request)
+
+    @app.get("/_stats")
+    async def get_stats():
+        return {"service": name, "calls": dict(calls), "total": sum(calls.values())}
+
+    @app.delete("/_stats")
+    async def reset_stats():
+        calls.clear()
+
+    return app
+
+
+# --- Data Microservice ---
+
+def create_data_ms(latency_ms: float = 0, error_rate: float = 0) -> FastAPI:
+    app = _stub_app("data", latency_ms, error_rate)
+
+    def gateway(gateway_name: str) -> dict:
+        return {
+            "device_name": gateway_name, "uuid": str(uuid.uuid5(uuid.NAMESPACE_DNS, gateway_name)),
+            "device_address": "00:00:00:00:00:00", "url": f"http://{gateway_name}.local",
+            "registered_at": _REGISTERED_AT,
+        }
+
+    def sensor(sensor_name: str) -> dict:
+        return {
+            "device_name": sensor_name, "uuid": str(uuid.uuid5(uuid.NAMESPACE_DNS, sensor_name)),
+            "device_address": "0", "registered_at": _REGISTERED_AT,
+        }
+
+    @app.get("/gateway")
+    async def read_gateways():
+        return []
+
+    @app.post("/gateway", status_code=status.HTTP_201_CREATED)
+    async def create_gateway():
+        return {}
+
+    @app.get("/gateway/{gateway_name}")
+    async def read_gateway(gateway_name: str):
+        return gateway(gateway_name)
+
+    @app.get("/gateway/{gateway_name}/sensor")
+    async def read_sensors(gateway_name: str):
+        return []
+
+    @app.post("/gateway/{gateway_name}/sensor", status_code=status.HTTP_201_CREATED)
+    async def create_sensor(gateway_name: str):
+        return {}
+
+    @app.get("/gateway/{gateway_name}/sensor/{sensor_name}")
+    async def read_sensor(gateway_name: str, sensor_name: str):
+        return sensor(sensor_name)
+
+    @app.put("/gateway/{gateway_name}/sensor/{sensor_name}")
+    async def update_sensor(gateway_name: str, sensor_name: str):
+        return sensor(sensor_name)
+
+    @app.post("/gateway/{gateway_name}/sensor/{sensor_name}/config", status_code=status.HTTP_201_CREATED)
+    async def create_config(gateway_name: str, sensor_name: str):
+        return {}
+
+    @app.post("/gateway/{gateway_name}/sensor/{sensor_name}/reading", status_code=status.HTTP_201_CREATED)
+    async def create_reading(gateway_name: str, sensor_name: str):
+        return {}
+
+    @app.post("/gateway/{gateway_name}/sensor/{sensor_name}/reading/{reading_uuid}/prediction", status_code=status.HTTP_201_CREATED)
+    async def create_prediction(gateway_name: str, sensor_name: str, reading_uuid: str):
+        return {}
+
+    @app.post("/gateway/{gateway_name}/sensor/{sensor_name}/inference/latency", status_code=status.HTTP_201_CREATED)
+    async def create_latency(gateway_name: str, sensor_name: str):
+        return {}
+
+    return app
+
+
+# --- Command Microservice ---
+
+def create_command_ms(latency_ms: float = 0, error_rate: float = 0) -> FastAPI:
+    app = _stub_app("command", latency_ms, error_rate)
+
+    @app.post("/{command_path:path}", status_code=status.HTTP_202_ACCEPTED)
+    async def command(command_path: str):
+        if command_path.startswith("store/"):
+            return Response(status_code=status.HTTP_201_CREATED, content=b"{}")
+        if command_path.startswith("retrieve/"):
+            return Response(status_code=status.HTTP_200_OK, content=b"[]")
+        if command_path.endswith(("available-sensors", "provisioned-sensors")) and "/get/" in command_path:
+            return []
+        return {"command_uuids": [str(uuid.uuid4())]}
+
+    return app
+
+
+# --- Inference Microservice ---
+
+def create_inference_ms(latency_ms: float = 0, error_rate: float = 0, inference_ms: float = 20) -> FastAPI:
+    app = _stub_app("inference", latency_ms, error_rate)
+    tasks: dict[str, tuple[float, object]] = {}
+
+    def prediction(request: dict) -> dict:
+        values = request["export_value"]["reading"]["values"]
+        count = sum(len(row) for row in values) or 1
+        mean_abs = sum(abs(value) for row in values for value in row) / count
+        return {"prediction_result": int(mean_abs > 1.0), "heuristic_result": None}
+
+    def submit(result) -> dict:
+        task_id = str(uuid.uuid4())
+        tasks[task_id] = (time.monotonic() + inference_ms / 1000, result)
+        return {"task_id": task_id}
+
+    @app.post("/model/upload", status_code=status.HTTP_202_ACCEPTED)
+    async def upload_model():
+        return {}
+
+    @app.put("/model/prediction/request", status_code=status.HTTP_202_ACCEPTED)
+    async def prediction_request(request: dict):
+        return submit(prediction(request))
+
+    @app.put("/model/prediction/batch/request", status_code=status.HTTP_202_ACCEPTED)
+    async def batch_prediction_request(requests: list[dict]):
+        return submit([prediction(request) for request in requests])
+
+    @app.get("/model/prediction/result/{task_id}")
+    async def prediction_result(task_id: str):
+        ready_at, result = tasks[task_id]
+        if time.monotonic() < ready_at:
+            return {"status": "PENDING"}
+        del tasks[task_id]
+        return {"status": "SUCCESS", "result": result}
+
+    return app
+
+
+class _Server(uvicorn.Server):
+    def install_signal_handlers(self):
+        # Several servers share the loop, `serve` stops all of them at once
+        pass
+
+
+async def serve(base_port: int, args: argparse.Namespace):
+    apps = [
+        create_data_ms(args.data_latency_ms, args.error_rate),
+        create_command_ms(args.command_latency_ms, args.error_rate),
+        create_inference_ms(args.inference_latency_ms, args.error_rate, args.inference_ms),
+    ]
+    servers = [
+        _Server(uvicorn.Config(app, port=base_port + i, log_level="warning"))
+        for i, app in enumerate(apps)
+    ]
+
+    def stop():
+        for server in servers:
+            server.should_exit = True
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop)
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stub ESN microservices")
+    parser.add_argument("--base-port", type=int, default=8101)
+    parser.add_argument("--data-latency-ms", type=float, default=2)
+    parser.add_argument("--command-latency-ms", type=float, default=5)
+    parser.add_argument("--inference-latency-ms", type=float, default=2)
+    parser.add_argument("--inference-ms", type=float, default=20, help="time a prediction task stays PENDING")
+    parser.add_argument("--error-rate", type=float, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(serve(args.base_port, args))